@@ -0,0 +1,229 @@
+import argparse
+import configparser
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from queue import Empty
+
+if "SUMO_HOME" in os.environ:
+    tools = os.path.join(os.environ["SUMO_HOME"], "tools")
+    sys.path.append(tools)
+else:
+    sys.exit("Please declare the environment variable 'SUMO_HOME'")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+
+# name -> (net file, route file); "port" scenarios run the port environment with a truck fleet
+SCENARIOS = {
+    "single-intersection": ("nets/single-intersection/single-intersection.net.xml", "nets/single-intersection/single-intersection.rou.xml"),
+    "2way-single-intersection": ("nets/2way-single-intersection/single-intersection.net.xml", "nets/2way-single-intersection/single-intersection-vhvh.rou.xml"),
+    "big-intersection": ("nets/big-intersection/big-intersection.net.xml", "nets/big-intersection/routes.rou.xml"),
+    "double": ("nets/double/network.net.xml", "nets/double/flow.rou.xml"),
+    "4x4-Lucas": ("nets/4x4-Lucas/4x4.net.xml", "nets/4x4-Lucas/4x4c1c2c1c2.rou.xml"),
+    "4x4loop": ("nets/4x4loop/4x4loop.net.xml", "nets/4x4loop/4x4loop.rou.xml"),
+    "port1": ("nets/port1/port.net.xml", "nets/port1/port.rou.xml"),
+    "port2": ("nets/port2/port.net.xml", "nets/port2/port.rou.xml"),
+}
+PORT_SCENARIOS = ("port1", "port2")
+# metric -> direction in which a change is a regression
+REGRESSION_METRICS = {
+    "steps_per_sec": "lower",
+    "traci_calls_per_step": "higher",
+    "python_peak_rss_mb": "higher",
+    "sumo_peak_rss_mb": "higher",
+}
+
+
+def port_config(scenario: str, base_config: str, steps: int, delta_time: int) -> str:
+    """Write a headless copy of ``base_config`` pointing at the scenario's net and return its path."""
+    cf = configparser.ConfigParser()
+    cf.optionxform = str
+    cf.read(base_config, "utf-8")
+    net, route = SCENARIOS[scenario]
+    cf.set("SUMO", "nets", os.path.join(ROOT, net))
+    cf.set("SUMO", "route", os.path.join(ROOT, route))
+    cf.set("SUMO", "num_seconds", str(steps * delta_time))
+    cf.set("SUMO", "delta_time", str(delta_time))
+    if not cf.has_section("RENDER"):
+        cf.add_section("RENDER")
+    cf.set("RENDER", "gui", "False")
+    fd, path = tempfile.mkstemp(prefix=f"benchmark_{scenario}_", suffix=".ini")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        cf.write(f)
+    return path
+
+
+def run_scenario(scenario: str, backend: str, fleet: int, steps: int, delta_time: int, base_config: str, queue):
+    """Run one scenario headless for ``steps`` environment steps and put its measures in ``queue``.
+
+    Runs in its own process, so the peak RSS is the scenario's own and libsumo can be started once. The peak RSS
+    of the python process includes SUMO with libsumo; with traci SUMO is a child process, measured separately.
+    """
+    config_path = None
+    try:
+        if scenario in PORT_SCENARIOS:
+            from sumo_rl.environment.port_env import SumoEnvironment
+
+            config_path = port_config(scenario, base_config, steps, delta_time)
+            env = SumoEnvironment(config_path=config_path, sumo_backend=backend, sumo_warnings=False, profile=True)
+        else:
+            from sumo_rl.environment.env import SumoEnvironment
+
+            net, route = SCENARIOS[scenario]
+            env = SumoEnvironment(
+                net_file=os.path.join(ROOT, net),
+                route_file=os.path.join(ROOT, route),
+                num_seconds=steps * delta_time,
+                delta_time=delta_time,
+                fixed_ts=True,
+                sumo_seed=42,
+                sumo_warnings=False,
+                sumo_backend=backend,
+                profile=True,
+            )
+
+        start_time = time.perf_counter()
+        env.reset()
+        reset_time = time.perf_counter() - start_time
+        if fleet:
+            env.add_trucks(fleet, prefix="benchmark_truck")
+
+        start_time = time.perf_counter()
+        for _ in range(steps):
+            env.step({})
+        elapsed = time.perf_counter() - start_time
+        report = env.profiler.end_episode()
+        env.close()
+
+        traci_calls = sum(stats["calls"] for stats in report["traci"].values())
+        queue.put(
+            {
+                "scenario": scenario,
+                "backend": backend,
+                "fleet": fleet,
+                "steps": steps,
+                "reset_sec": reset_time,
+                "steps_per_sec": steps / elapsed,
+                "sim_seconds_per_sec": steps * delta_time / elapsed,
+                "traci_calls_per_step": traci_calls / steps,
+                "phases_ms_per_step": {name: seconds / steps * 1000 for name, seconds in report["phases"].items()},
+                # KiB on Linux; the SUMO child of traci is reaped by env.close(), so its peak is counted
+                "python_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "sumo_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+            }
+        )
+    except Exception as ex:
+        logging.warning(f"Benchmark {scenario} ({backend}, fleet {fleet}) failed: {ex}")
+        queue.put({"scenario": scenario, "backend": backend, "fleet": fleet, "error": repr(ex)})
+    finally:
+        if config_path is not None:
+            os.remove(config_path)
+
+
+def run_key(result: dict) -> str:
+    return f"{result['scenario']}/{result['backend']}/fleet{result['fleet']}"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return the regressions of ``results`` against ``baseline``, as readable lines."""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get("results", {}).get(key)
+        if reference is None or "error" in result or "error" in reference:
+            continue
+        for metric, direction in REGRESSION_METRICS.items():
+            if metric not in reference or metric not in result:  # baselines of older versions
+                continue
+            old, new = reference[metric], result[metric]
+            if old <= 0:
+                continue
+            change = (new - old) / old
+            if (direction == "lower" and change < -tolerance) or (direction == "higher" and change > tolerance):
+                regressions.append(f"{key} {metric}: {old:.2f} -> {new:.2f} ({change:+.1%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    prs = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="""Benchmark the bundled networks: steps/sec, TraCI calls per step and peak RSS (python and SUMO) per backend""",
+    )
+    prs.add_argument("-scenarios", dest="scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS), help="Scenarios to run.\n")
+    prs.add_argument("-backends", dest="backends", nargs="+", default=["traci", "libsumo"], choices=["traci", "libsumo"], help="SUMO backends.\n")
+    prs.add_argument("-fleet", dest="fleet", type=int, nargs="+", default=[0, 50, 200], help="Truck fleet sizes of the port scenarios.\n")
+    prs.add_argument("-steps", dest="steps", type=int, default=500, help="Environment steps per run.\n")
+    prs.add_argument("-delta", dest="delta_time", type=int, default=5, help="Simulation seconds per environment step.\n")
+    prs.add_argument("-config", dest="confpath", type=str, default=os.path.join(ROOT, "config/port.ini"), help="Base config of the port scenarios.\n")
+    prs.add_argument("-baseline", dest="baseline", type=str, default=os.path.join(ROOT, "outputs/benchmark/baseline.json"), help="Baseline JSON file.\n")
+    prs.add_argument("-save", action="store_true", default=False, help="Write the results as the new baseline.\n")
+    prs.add_argument("-tolerance", dest="tolerance", type=float, default=0.1, help="Relative change tolerated before a regression is reported.\n")
+    prs.add_argument("-out", dest="out", type=str, default=None, help="Also write the results to this JSON file.\n")
+    args = prs.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    results = {}
+    for scenario in args.scenarios:
+        for backend in args.backends:
+            for fleet in args.fleet if scenario in PORT_SCENARIOS else [0]:
+                process = ctx.Process(
+                    target=run_scenario,
+                    args=(scenario, backend, fleet, args.steps, args.delta_time, args.confpath, queue),
+                )
+                process.start()
+                result = None
+                while result is None:
+                    try:
+                        result = queue.get(timeout=1)
+                    except Empty:
+                        if not process.is_alive():  # crashed without reporting, e.g. inside SUMO
+                            result = {"scenario": scenario, "backend": backend, "fleet": fleet, "error": f"exit code {process.exitcode}"}
+                process.join()
+                results[run_key(result)] = result
+                if "error" in result:
+                    print(f"{run_key(result):<45} error: {result['error']}")
+                else:
+                    print(
+                        f"{run_key(result):<45} {result['steps_per_sec']:9.1f} steps/s "
+                        f"{result['traci_calls_per_step']:8.1f} calls/step {result['python_peak_rss_mb']:8.1f} MB python "
+                        f"{result['sumo_peak_rss_mb']:8.1f} MB sumo"
+                    )
+
+    output = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "steps": args.steps,
+        "delta_time": args.delta_time,
+        "results": results,
+    }
+    if args.out is not None:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+    exit_code = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"No regression beyond {args.tolerance:.0%} against {args.baseline}")
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    sys.exit(exit_code)
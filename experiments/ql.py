@@ -12,8 +12,83 @@ else:
 
 
 from sumo_rl import SumoEnvironment
-from sumo_rl.agents import QLAgent
+from sumo_rl.agents import QLAgentGroup, QTable
 from sumo_rl.exploration import EpsilonGreedy
+from sumo_rl.exploration.epsilon_greedy import rng_state, set_rng_state
+
+
+def train(
+    env,
+    runs=1,
+    alpha=0.1,
+    gamma=0.99,
+    epsilon=0.05,
+    min_epsilon=0.005,
+    decay=1.0,
+    fixed=False,
+    checkpoint=None,
+    checkpoint_every=1000,
+    warmstart=None,
+):
+    """Run ``runs`` Q-learning episodes of ``env``, one agent per traffic signal, and close it.
+
+    With ``checkpoint``, the agents are saved there every ``checkpoint_every`` steps and a run found there on start
+    is resumed: the simulation restarts, the agents continue learning where the checkpoint left them. At the end of
+    every run a checkpoint at step 0 of the next run marks it finished; the next run starts from fresh agents, as
+    it would without interruption, the exploration draws continuing from the generator state saved with it.
+    ``warmstart`` is a checkpoint whose Q-table starts every run.
+    """
+    first_run, resume = 1, None
+    if checkpoint is not None and os.path.exists(os.path.join(checkpoint, "meta.json")):
+        meta = QTable.read_meta(checkpoint)
+        first_run = meta["run"]
+        if meta["step"] > 0:
+            resume = checkpoint
+        elif "rng" in meta["exploration"]:
+            set_rng_state(meta["exploration"]["rng"])
+        env.episode = first_run - 1  # the metrics files of the earlier runs keep their episode numbers
+
+    for run in range(first_run, runs + 1):
+        initial_states = env.reset()
+        # one Q-learning agent per traffic signal, acting and learning in single vectorized calls
+        ql_agents = QLAgentGroup(
+            starting_states=env.encode_all({ts: initial_states[ts] for ts in env.ts_ids}),
+            action_spaces={ts: env.action_spaces(ts) for ts in env.ts_ids},
+            alpha=alpha,
+            gamma=gamma,
+            exploration_strategy=EpsilonGreedy(initial_epsilon=epsilon, min_epsilon=min_epsilon, decay=decay),
+        )
+
+        if resume is not None:
+            ql_agents.restore(resume)
+            resume = None
+        elif warmstart is not None:
+            state = rng_state()
+            ql_agents.restore(warmstart)
+            set_rng_state(state)  # the warm start gives the Q-table, not the exploration draws
+
+        done = {"__all__": False}
+        step = 0
+        if fixed:
+            while not done["__all__"]:
+                _, _, done, _ = env.step({})
+        else:
+            while not done["__all__"]:
+                actions = ql_agents.act_all()
+
+                s, r, done, _ = env.step(action=actions)
+
+                ql_agents.learn_all(
+                    next_states=env.encode_all({ts: s[ts] for ts in ql_agents.agent_ids}),
+                    rewards={ts: r[ts] for ts in ql_agents.agent_ids},
+                )
+                step += 1
+                if checkpoint is not None and step % checkpoint_every == 0:
+                    ql_agents.save(checkpoint, run=run, step=step)
+            if checkpoint is not None:
+                ql_agents.save(checkpoint, run=run + 1, step=0)
+        env.save_csv(env.out_csv_name, run)
+    env.close()
 
 
 if __name__ == "__main__":
@@ -43,6 +118,9 @@ if __name__ == "__main__":
     prs.add_argument("-s", dest="seconds", type=int, default=100000, required=False, help="Number of simulation seconds.\n")
     prs.add_argument("-v", action="store_true", default=False, help="Print experience tuple.\n")
     prs.add_argument("-runs", dest="runs", type=int, default=1, help="Number of runs.\n")
+    prs.add_argument("-checkpoint", dest="checkpoint", type=str, default=None, help="Checkpoint directory; a run found there is resumed.\n")
+    prs.add_argument("-checkpoint_every", dest="checkpoint_every", type=int, default=1000, help="Environment steps between checkpoints.\n")
+    prs.add_argument("-warmstart", dest="warmstart", type=str, default=None, help="Checkpoint whose Q-table starts every run.\n")
     args = prs.parse_args()
     experiment_time = str(datetime.now()).split(".")[0]
     import re
@@ -61,38 +139,16 @@ if __name__ == "__main__":
         max_green=args.max_green,
     )
 
-    for run in range(1, args.runs + 1):
-        initial_states = env.reset()
-        ql_agents = {
-            ts: QLAgent(
-                starting_state=env.encode(initial_states[ts], ts),
-                state_space=env.observation_space,
-                action_space=env.action_space,
-                alpha=args.alpha,
-                gamma=args.gamma,
-                exploration_strategy=EpsilonGreedy(
-                    initial_epsilon=args.epsilon, min_epsilon=args.min_epsilon, decay=args.decay
-                ),
-            )
-            for ts in env.ts_ids
-        }
-
-        done = {"__all__": False}
-        infos = []
-        if args.fixed:
-            while not done["__all__"]:
-                _, _, done, _ = env.step({})
-        else:
-            while not done["__all__"]:
-                actions = {ts: ql_agents[ts].act() for ts in ql_agents.keys()}
-
-                s, r, done, _ = env.step(action=actions)
-
-                for agent_id in ql_agents.keys():
-                    ql_agents[agent_id].learn(next_state=env.encode(s[agent_id], agent_id), reward=r[agent_id])
-        env.save_csv(out_csv, run)
-        env.close()
-
-
-
-
+    train(
+        env,
+        runs=args.runs,
+        alpha=args.alpha,
+        gamma=args.gamma,
+        epsilon=args.epsilon,
+        min_epsilon=args.min_epsilon,
+        decay=args.decay,
+        fixed=args.fixed,
+        checkpoint=args.checkpoint,
+        checkpoint_every=args.checkpoint_every,
+        warmstart=args.warmstart,
+    )
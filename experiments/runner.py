@@ -0,0 +1,202 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import time
+import traceback
+from datetime import datetime
+from multiprocessing.connection import wait
+
+if "SUMO_HOME" in os.environ:
+    tools = os.path.join(os.environ["SUMO_HOME"], "tools")
+    sys.path.append(tools)
+else:
+    sys.exit("Please declare the environment variable 'SUMO_HOME'")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+
+from benchmark import PORT_SCENARIOS, SCENARIOS  # noqa: E402
+
+NETWORKS = [name for name in SCENARIOS if name not in PORT_SCENARIOS]
+# parameter -> (type, default values) of the swept Q-learning and environment parameters
+PARAMETERS = {
+    "alpha": (float, [0.1]),
+    "gamma": (float, [0.99]),
+    "epsilon": (float, [0.05]),
+    "min_epsilon": (float, [0.005]),
+    "decay": (float, [1.0]),
+    "min_green": (int, [10]),
+    "max_green": (int, [50]),
+    "delta_time": (int, [5]),
+}
+DONE, FAILED, RUNNING = "done", "failed", "running"
+
+
+def parse_grid(items) -> dict:
+    """Parse ``name=v1,v2`` items into the grid of every parameter, unlisted ones keep their default."""
+    grid = {name: list(default) for name, (_, default) in PARAMETERS.items()}
+    for item in items:
+        name, _, values = item.partition("=")
+        if name not in PARAMETERS or not values:
+            raise ValueError(f"Invalid grid item {item}, expected name=v1,v2 with name in {list(PARAMETERS)}")
+        grid[name] = [PARAMETERS[name][0](value) for value in values.split(",")]
+    return grid
+
+
+def expand(grid: dict, seeds, networks) -> list:
+    """Return the jobs of the grid x seeds x networks, each a dict with its ``id``, network, seed and parameters."""
+    jobs = []
+    names = list(grid)
+    for network in networks:
+        for values in itertools.product(*(grid[name] for name in names)):
+            for seed in seeds:
+                params = dict(zip(names, values))
+                job_id = "_".join([network] + [f"{name}{value}" for name, value in params.items()] + [f"seed{seed}"])
+                jobs.append(dict(params, id=job_id, network=network, seed=seed))
+    return jobs
+
+
+def read_status(job_dir: str) -> dict:
+    path = os.path.join(job_dir, "status.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_status(job_dir: str, status: dict):
+    """Replace the status of a job atomically, so a killed runner never leaves a truncated file."""
+    path = os.path.join(job_dir, "status.json")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(status, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def run_job(job: dict, label: int, job_dir: str, seconds: int, backend: str, checkpoint_every: int):
+    """Train Q-learning agents for one job in its own process, writing metrics, checkpoint and status to ``job_dir``."""
+    start_time = time.time()
+    status = {"job": job, "state": RUNNING, "pid": os.getpid(), "started": datetime.now().isoformat(timespec="seconds")}
+    write_status(job_dir, status)
+    try:
+        import numpy as np
+
+        from ql import train
+        from sumo_rl import SumoEnvironment
+
+        np.random.seed(job["seed"])  # exploration draws
+        # the label counter restarts in every worker; a sweep-wide label keeps connections and files apart
+        SumoEnvironment.CONNECTION_LABEL = label
+        net, route = SCENARIOS[job["network"]]
+        env = SumoEnvironment(
+            net_file=os.path.join(ROOT, net),
+            route_file=os.path.join(ROOT, route),
+            out_csv_name=os.path.join(job_dir, "metrics"),
+            use_gui=False,
+            num_seconds=seconds,
+            delta_time=job["delta_time"],
+            min_green=job["min_green"],
+            max_green=job["max_green"],
+            sumo_seed=job["seed"],
+            sumo_warnings=False,
+            sumo_backend=backend,
+        )
+        train(
+            env,
+            alpha=job["alpha"],
+            gamma=job["gamma"],
+            epsilon=job["epsilon"],
+            min_epsilon=job["min_epsilon"],
+            decay=job["decay"],
+            checkpoint=os.path.join(job_dir, "checkpoint"),
+            checkpoint_every=checkpoint_every,
+        )
+        status.update(state=DONE)
+    except Exception as ex:
+        logging.warning(f"Job {job['id']} failed: {ex}")
+        status.update(state=FAILED, error=traceback.format_exc())
+    status.update(finished=datetime.now().isoformat(timespec="seconds"), elapsed=time.time() - start_time)
+    write_status(job_dir, status)
+
+
+def write_summary(result_dir: str, jobs: list):
+    """Write ``summary.csv``: one row per job with its parameters, state, duration and metrics files."""
+    import pandas as pd
+
+    rows = []
+    for job in jobs:
+        job_dir = os.path.join(result_dir, "jobs", job["id"])
+        status = read_status(job_dir)
+        metrics = []
+        if os.path.isdir(job_dir):
+            metrics = sorted(name for name in os.listdir(job_dir) if name.startswith("metrics"))
+        rows.append(
+            dict(job, state=status.get("state", "pending"), elapsed=status.get("elapsed"), metrics=";".join(metrics))
+        )
+    pd.DataFrame(rows).to_csv(os.path.join(result_dir, "summary.csv"), index=False)
+
+
+if __name__ == "__main__":
+    prs = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="""Run Q-learning sweeps (parameter grid x seeds x networks) in parallel, resumable""",
+    )
+    prs.add_argument("-grid", dest="grid", nargs="*", default=[], help=f"Swept values as name=v1,v2, names: {', '.join(PARAMETERS)}.\n")
+    prs.add_argument("-seeds", dest="seeds", type=int, nargs="+", default=[1], help="Seeds of SUMO and of the exploration.\n")
+    prs.add_argument("-nets", dest="networks", nargs="+", default=["double"], choices=NETWORKS, help="Networks.\n")
+    prs.add_argument("-s", dest="seconds", type=int, default=100000, help="Number of simulation seconds per job.\n")
+    prs.add_argument("-workers", dest="workers", type=int, default=os.cpu_count(), help="Jobs run at the same time.\n")
+    prs.add_argument("-backend", dest="backend", type=str, default=None, choices=["traci", "libsumo"], help="SUMO backend.\n")
+    prs.add_argument("-checkpoint_every", dest="checkpoint_every", type=int, default=1000, help="Environment steps between checkpoints.\n")
+    prs.add_argument("-out", dest="out", type=str, default=os.path.join(ROOT, "outputs/sweeps/default"), help="Result directory; finished jobs found there are skipped.\n")
+    prs.add_argument("-retry_failed", action="store_true", default=False, help="Run failed jobs again.\n")
+    args = prs.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    jobs = expand(parse_grid(args.grid), args.seeds, args.networks)
+    os.makedirs(os.path.join(args.out, "jobs"), exist_ok=True)
+    with open(os.path.join(args.out, "sweep.json"), "w", encoding="utf-8") as f:
+        json.dump({"created": datetime.now().isoformat(timespec="seconds"), "args": vars(args), "jobs": jobs}, f, indent=2)
+
+    pending = []
+    for label, job in enumerate(jobs):
+        state = read_status(os.path.join(args.out, "jobs", job["id"])).get("state")
+        if state == DONE or (state == FAILED and not args.retry_failed):
+            print(f"{job['id']:<80} skipped ({state})")
+        else:
+            pending.append((label, job))
+    print(f"{len(pending)} of {len(jobs)} jobs to run on {args.workers} workers")
+
+    # one process per job: every job gets a fresh SUMO instance (libsumo runs one per process) and a crash inside
+    # SUMO only loses its own job
+    ctx = mp.get_context("spawn")
+    running = {}
+    failures = 0
+    while pending or running:
+        while pending and len(running) < args.workers:
+            label, job = pending.pop(0)
+            job_dir = os.path.join(args.out, "jobs", job["id"])
+            os.makedirs(job_dir, exist_ok=True)
+            process = ctx.Process(
+                target=run_job,
+                name=f"runner-{job['id']}",
+                args=(job, label, job_dir, args.seconds, args.backend, args.checkpoint_every),
+            )
+            process.start()
+            running[process.sentinel] = (process, job, job_dir)
+        for sentinel in wait(list(running)):
+            process, job, job_dir = running.pop(sentinel)
+            process.join()
+            status = read_status(job_dir)
+            if status.get("state") != DONE and process.exitcode != 0:  # died without reporting, e.g. inside SUMO
+                status.update(job=job, state=FAILED, error=f"exit code {process.exitcode}")
+                write_status(job_dir, status)
+            failures += status.get("state") != DONE
+            print(f"{job['id']:<80} {status.get('state')} {status.get('elapsed', 0):8.1f}s")
+
+    write_summary(args.out, jobs)
+    print(f"Summary written to {os.path.join(args.out, 'summary.csv')}")
+    sys.exit(1 if failures else 0)
@@ -32,10 +32,10 @@ if __name__ == "__main__":
     done = {"__all__": False}
     step = 0
     start_time = time.time()
+    # 按插入边排队, 路口有空间时才插入, 避免SUMO在同一车道上积压等待插入的车辆
+    env.add_trucks(50, prefix="v")
     while not done["__all__"]:
         # time.sleep(0.1)
-        if step < 50: # todo: 车道上没有足够的空间来容纳新车（堵车），SUMO会等待直到有足够的空间可供其进入车道
-            env._add_truck("v_"+str(step), task = None)
         step += 1
         s, r, done, _ = env.step({})
         if step % 5 ==0:
@@ -0,0 +1,119 @@
+"""Load the metrics files of many episodes into one table, with a consolidated Parquet cache."""
+import glob
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_SUFFIX = ".consolidated.parquet"
+CACHE_VERSION = 1
+FILE_COLUMN = "file_index"
+
+
+def metrics_files(prefix: str) -> List[str]:
+    """Return the metrics files (``.csv`` or ``.parquet``) starting with ``prefix``, sorted, caches excluded."""
+    return sorted(
+        path
+        for path in glob.glob(prefix + "*")
+        if os.path.isfile(path) and not path.endswith((CACHE_SUFFIX, ".tmp"))
+    )
+
+
+def _signature(files: Sequence[str]) -> list:
+    stats = [os.stat(path) for path in files]
+    return [[os.path.basename(path), stat.st_size, stat.st_mtime_ns] for path, stat in zip(files, stats)]
+
+
+def _read(path: str, sep: str, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, sep=sep, usecols=columns)
+
+
+def _read_cache(path: str, signature: list, columns: Optional[Sequence[str]]) -> Optional[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    try:
+        schema = pq.read_schema(path)
+        meta = json.loads((schema.metadata or {}).get(b"metrics_store", b"{}"))
+        if meta.get("version") != CACHE_VERSION or meta.get("files") != signature:
+            return None
+        if columns is not None and not set(columns) <= set(schema.names):
+            return None
+        return pq.read_table(path, columns=None if columns is None else [*columns, FILE_COLUMN]).to_pandas()
+    except Exception as ex:
+        logging.warning(f"Ignore the unreadable metrics cache {path}: {ex}")
+        return None
+
+
+def _write_cache(path: str, df: pd.DataFrame, signature: list):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = json.dumps({"version": CACHE_VERSION, "files": signature}).encode()
+    table = table.replace_schema_metadata(dict(table.schema.metadata or {}, metrics_store=meta))
+    pq.write_table(table, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def load_metrics(
+    prefix: str,
+    sep: str = ",",
+    columns: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+    cache: bool = True,
+) -> pd.DataFrame:
+    """Read every metrics file of ``prefix`` into one DataFrame.
+
+    Files are read concurrently and concatenated once. The column ``file_index`` tells the file (episode) of every
+    row, in sorted file name order. With ``cache``, all columns of all files are also written to
+    ``prefix + ".consolidated.parquet"``, reused by later calls as long as no file was added, removed or modified.
+
+    Args:
+        prefix (str): Path prefix of the files, e.g. the ``out_csv_name`` of an experiment.
+        sep (str): Values separator of the CSV files.
+        columns (Optional[Sequence[str]]): Columns to load. Default: all.
+        workers (Optional[int]): Number of reading threads. Default: chosen by ThreadPoolExecutor.
+        cache (bool): Read and write the consolidated Parquet cache (requires pyarrow, skipped without it).
+
+    Raises:
+        FileNotFoundError: If no file starts with ``prefix``.
+    """
+    files = metrics_files(prefix)
+    if not files:
+        raise FileNotFoundError(f"No metrics file starts with {prefix}")
+    if cache:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logging.warning("Metrics cache disabled: it requires the pyarrow package (pip install pyarrow)")
+            cache = False
+
+    cache_path = prefix + CACHE_SUFFIX
+    signature = _signature(files)
+    if cache and os.path.exists(cache_path):
+        df = _read_cache(cache_path, signature, columns)
+        if df is not None:
+            return df
+
+    # the cache holds every column, so it can serve later calls asking for other ones
+    read_columns = None if cache else columns
+    with ThreadPoolExecutor(workers) as executor:
+        frames = list(executor.map(lambda path: _read(path, sep, read_columns), files))
+    for i, frame in enumerate(frames):
+        frame[FILE_COLUMN] = np.full(len(frame), i, dtype=np.int32)
+    df = pd.concat(frames, ignore_index=True)
+    if cache:
+        try:
+            _write_cache(cache_path, df, signature)
+        except Exception as ex:
+            logging.warning(f"Fail to write the metrics cache {cache_path}: {ex}")
+    if columns is not None:
+        df = df[[*columns, FILE_COLUMN]]
+    return df
@@ -1,11 +1,11 @@
 import argparse
-import glob
 from itertools import cycle
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
+from metrics_store import load_metrics
 
 
 sns.set(
@@ -39,16 +39,48 @@ def moving_average(interval, window_size):
     return np.convolve(interval, window, "same")
 
 
-def plot_df(df, color, xaxis, yaxis, ma=1, label=""):
-    df[yaxis] = pd.to_numeric(df[yaxis], errors="coerce")  # convert NaN string to NaN value
-
-    mean = df.groupby(xaxis).mean()[yaxis]
-    std = df.groupby(xaxis).std()[yaxis]
+def aggregate(df, xaxis, yaxis):
+    """Return the sorted x values and the mean and std (ddof=1, NaN ignored) of ``yaxis`` at each of them.
+
+    Vectorized bincounts over the rows instead of a full groupby of the DataFrame; the variance sums the squared
+    deviations from the mean, which stays accurate for large values unlike the sum of squares.
+    """
+    y = pd.to_numeric(df[yaxis], errors="coerce").to_numpy(dtype=np.float64)  # convert NaN string to NaN value
+    codes, x = pd.factorize(df[xaxis], sort=True)
+    valid = ~np.isnan(y)
+    y = np.where(valid, y, 0.0)
+    count = np.bincount(codes, weights=valid, minlength=len(x))
+    total = np.bincount(codes, weights=y, minlength=len(x))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        deviations = np.where(valid, y - mean[codes], 0.0)
+        std = np.sqrt(np.bincount(codes, weights=deviations * deviations, minlength=len(x)) / (count - 1))
+    std[count < 2] = np.nan
+    return np.asarray(x), mean, std
+
+
+def downsample(x, max_points, *series):
+    """Average ``x`` and ``series`` over consecutive blocks so at most ``max_points`` points remain."""
+    if max_points is None or len(x) <= max_points:
+        return (x, *series)
+    size = int(np.ceil(len(x) / max_points))
+    starts = np.arange(0, len(x), size)
+    result = []
+    for values in (x, *series):
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result.append(np.add.reduceat(np.where(valid, values, 0.0), starts) / np.add.reduceat(valid, starts))
+    return tuple(result)
+
+
+def plot_df(df, color, xaxis, yaxis, ma=1, label="", max_points=None):
+    x, mean, std = aggregate(df, xaxis, yaxis)
     if ma > 1:
         mean = moving_average(mean, ma)
         std = moving_average(std, ma)
+    x, mean, std = downsample(x, max_points, mean, std)
 
-    x = df.groupby(xaxis)[xaxis].mean().keys().values
     plt.plot(x, mean, label=label, color=color, linestyle=next(dashes_styles))
     plt.fill_between(x, mean + std, mean - std, alpha=0.25, color=color, rasterized=True)
 
@@ -69,6 +101,9 @@ if __name__ == "__main__":
     prs.add_argument("-sep", type=str, default=",", help="Values separator on file.\n")
     prs.add_argument("-xlabel", type=str, default="Time step (seconds)", help="X axis label.\n")
     prs.add_argument("-ylabel", type=str, default="Total waiting time (s)", help="Y axis label.\n")
+    prs.add_argument("-max_points", type=int, default=None, help="Average consecutive steps down to this many points.\n")
+    prs.add_argument("-workers", type=int, default=None, help="Threads reading the files.\n")
+    prs.add_argument("-no_cache", action="store_true", default=False, help="Do not read or write the Parquet cache.\n")
     prs.add_argument("-output", type=str, default=None, help="PDF output filename.\n")
 
     args = prs.parse_args()
@@ -78,16 +113,20 @@ if __name__ == "__main__":
 
     # File reading and grouping
     for file in args.f:
-        main_df = pd.DataFrame()
-        for f in glob.glob(file + "*"):
-            df = pd.read_csv(f, sep=args.sep)
-            if main_df.empty:
-                main_df = df
-            else:
-                main_df = pd.concat((main_df, df))
+        main_df = load_metrics(
+            file, sep=args.sep, columns=[args.xaxis, args.yaxis], workers=args.workers, cache=not args.no_cache
+        )
 
         # Plot DataFrame
-        plot_df(main_df, xaxis=args.xaxis, yaxis=args.yaxis, label=next(labels), color=next(colors), ma=args.ma)
+        plot_df(
+            main_df,
+            xaxis=args.xaxis,
+            yaxis=args.yaxis,
+            label=next(labels),
+            color=next(colors),
+            ma=args.ma,
+            max_points=args.max_points,
+        )
 
     plt.title(args.t)
     plt.ylabel(args.ylabel)
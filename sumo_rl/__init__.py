@@ -5,4 +5,5 @@ from sumo_rl.environment.env import (
     SumoEnvironment,
     TrafficSignal
 )
+from sumo_rl.environment.vector_env import LibsumoPool, SumoVectorEnv
 __version__ = "1.4.3"
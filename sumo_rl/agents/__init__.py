@@ -1,2 +1,3 @@
 """This module contains example of agents that can be used to interact with the environment."""
-from sumo_rl.agents.ql_agent import QLAgent
+from sumo_rl.agents.ql_agent import QLAgent, QLAgentGroup
+from sumo_rl.agents.q_table import QTable
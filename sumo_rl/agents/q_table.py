@@ -0,0 +1,195 @@
+"""Q-table storing the action values of every state in the rows of a growable NumPy array."""
+import json
+import numbers
+import os
+import shutil
+import struct
+from typing import Dict, Hashable, Iterator, List, Optional
+
+import numpy as np
+
+
+CHECKPOINT_VERSION = 1
+
+
+def _key_bytes(key) -> bytes:
+    """Serialize a state key (int, bytes, or tuple of those) to bytes; equal keys give equal bytes."""
+    if isinstance(key, numbers.Integral):
+        return b"i" + struct.pack(">q", int(key))
+    if isinstance(key, bytes):
+        return b"b" + struct.pack(">H", len(key)) + key
+    if isinstance(key, tuple):
+        return b"t" + struct.pack(">H", len(key)) + b"".join(_key_bytes(item) for item in key)
+    raise TypeError(f"Cannot checkpoint state key {key!r} of type {type(key).__name__}, expected int, bytes or tuple")
+
+
+def _key_from_bytes(data: bytes, offset: int = 0):
+    kind = data[offset : offset + 1]
+    if kind == b"i":
+        return struct.unpack_from(">q", data, offset + 1)[0], offset + 9
+    (size,) = struct.unpack_from(">H", data, offset + 1)
+    offset += 3
+    if kind == b"b":
+        return data[offset : offset + size], offset + size
+    items = []
+    for _ in range(size):
+        item, offset = _key_from_bytes(data, offset)
+        items.append(item)
+    return tuple(items), offset
+
+
+class QTable:
+    """Mapping from states to action values backed by one 2D array.
+
+    Every new state gets the next row of :attr:`values` (initialised to 0), so a table with millions of states is a
+    single contiguous array plus a dict of row numbers, instead of millions of small lists. The array doubles its
+    capacity when full.
+
+    The dict interface of the former list-based table is kept: ``q_table[state]`` returns the row of a known state
+    (a view, valid until the table grows) and ``q_table[state] = values`` sets it.
+
+    Tables are checkpointed with :meth:`save` as a float32 value matrix plus the sorted serialized state keys.
+    :meth:`load` memory-maps both: states of the checkpoint are found by binary search in the key array instead of
+    being loaded into the dict, which only holds the states added since.
+    """
+
+    def __init__(self, n_actions: int, capacity: int = 1024, dtype=np.float64):
+        """Initialize an empty table.
+
+        Args:
+            n_actions (int): Number of actions, i.e. columns.
+            capacity (int): Initial number of preallocated rows. Grows automatically.
+            dtype: dtype of the action values.
+        """
+        self.n_actions = int(n_actions)
+        self.index: Dict[Hashable, int] = {}
+        self.values = np.zeros((capacity, n_actions), dtype=dtype)
+        self._size = 0
+        # states of a loaded checkpoint: sorted serialized keys and their rows
+        self._frozen_keys: Optional[np.ndarray] = None
+        self._frozen_rows: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, state) -> bool:
+        return self.find(state) is not None
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.keys())
+
+    def __getitem__(self, state) -> np.ndarray:
+        row = self.find(state)
+        if row is None:
+            raise KeyError(state)
+        return self.values[row]
+
+    def __setitem__(self, state, values):
+        row = self.row(state)  # may grow the array, so index it afterwards
+        self.values[row] = values
+
+    def find(self, state) -> Optional[int]:
+        """Return the row of a state, or None if the state is unknown."""
+        row = self.index.get(state)
+        if row is None and self._frozen_keys is not None:
+            key = _key_bytes(state)
+            i = int(np.searchsorted(self._frozen_keys, key))
+            # numpy strips trailing null bytes; serialized keys are prefix-free, so this stays unambiguous
+            if i < len(self._frozen_keys) and self._frozen_keys[i] == key.rstrip(b"\x00"):
+                row = int(self._frozen_rows[i])
+        return row
+
+    def keys(self) -> List[Hashable]:
+        """Return the known states."""
+        keys = list(self.index.keys())
+        if self._frozen_keys is not None:
+            width = self._frozen_keys.dtype.itemsize
+            keys += [_key_from_bytes(key.ljust(width, b"\x00"))[0] for key in self._frozen_keys.tolist()]
+        return keys
+
+    def row(self, state) -> int:
+        """Return the row of a state, adding a zero row if the state is new."""
+        row = self.find(state)
+        if row is None:
+            row = self._size
+            if row == len(self.values):
+                self._grow(2 * len(self.values))
+            self.index[state] = row
+            self._size += 1
+        return row
+
+    def rows(self, states) -> np.ndarray:
+        """Return the rows of several states (adding the new ones) as an int64 array."""
+        return np.fromiter((self.row(state) for state in states), dtype=np.int64)
+
+    def _grow(self, capacity: int):
+        values = np.zeros((max(capacity, 1), self.n_actions), dtype=self.values.dtype)
+        values[: len(self.values)] = self.values
+        self.values = values
+
+    def to_dict(self) -> dict:
+        """Return the table as a dict of lists, the format of the former list-based table."""
+        return {state: self.values[self.find(state)].tolist() for state in self.keys()}
+
+    def save(self, path: str, meta: Optional[dict] = None):
+        """Write the table to the directory ``path``, replacing a previous checkpoint only once complete.
+
+        Files: ``values.npy`` (float32, one row per state), ``keys.npy`` (sorted serialized state keys),
+        ``rows.npy`` (row of every key) and ``meta.json`` (``meta`` plus the table shape).
+
+        Raises:
+            TypeError: If a state key is not an int, bytes or a tuple of those (e.g. contains floats).
+        """
+        keys = [_key_bytes(state) for state in self.index]
+        rows = list(self.index.values())
+        if self._frozen_keys is not None:
+            keys += self._frozen_keys.tolist()
+            rows += self._frozen_rows.tolist()
+        keys = np.asarray(keys, dtype=bytes) if keys else np.zeros(0, dtype="S1")
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        sorted_rows = np.asarray(rows, dtype=np.int64)[order]
+
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "values.npy"), np.asarray(self.values[: self._size], dtype=np.float32))
+        np.save(os.path.join(tmp, "keys.npy"), sorted_keys)
+        np.save(os.path.join(tmp, "rows.npy"), sorted_rows)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(meta or {}, version=CHECKPOINT_VERSION, n_actions=self.n_actions, size=self._size), f)
+        old = f"{path}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "QTable":
+        """Load a table written by :meth:`save`.
+
+        Args:
+            path (str): Checkpoint directory.
+            mmap (bool): Memory-map the values and keys (copy-on-write: updates stay in memory and never touch the
+                files), so only the rows actually visited are read from disk.
+        """
+        meta = cls.read_meta(path)
+        mode = "c" if mmap else None
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode=mode)
+        table = cls(meta["n_actions"], capacity=1, dtype=np.float32)
+        table.values = values if len(values) else table.values
+        table._size = meta["size"]
+        if meta["size"]:
+            table._frozen_keys = np.load(os.path.join(path, "keys.npy"), mmap_mode="r" if mmap else None)
+            table._frozen_rows = np.load(os.path.join(path, "rows.npy"), mmap_mode="r" if mmap else None)
+        return table
+
+    @staticmethod
+    def read_meta(path: str) -> dict:
+        """Return the ``meta.json`` of a checkpoint directory."""
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported Q-table checkpoint version {meta.get('version')} in {path}")
+        return meta
@@ -1,4 +1,9 @@
 """Q-learning Agent class."""
+from typing import Dict, Hashable
+
+import numpy as np
+
+from sumo_rl.agents.q_table import QTable
 from sumo_rl.exploration.epsilon_greedy import EpsilonGreedy
 
 
@@ -13,7 +18,8 @@ class QLAgent:
         self.action = None
         self.alpha = alpha
         self.gamma = gamma
-        self.q_table = {self.state: [0 for _ in range(action_space.n)]}
+        self.q_table = QTable(action_space.n)
+        self.q_table.row(self.state)
         self.exploration = exploration_strategy
         self.acc_reward = 0
 
@@ -24,14 +30,129 @@ class QLAgent:
 
     def learn(self, next_state, reward, done=False):
         """Update Q-table with new experience."""
-        if next_state not in self.q_table:
-            self.q_table[next_state] = [0 for _ in range(self.action_space.n)]
-
-        s = self.state
-        s1 = next_state
+        s1 = self.q_table.row(next_state)
+        s = self.q_table.row(self.state)
         a = self.action
-        self.q_table[s][a] = self.q_table[s][a] + self.alpha * (
-            reward + self.gamma * max(self.q_table[s1]) - self.q_table[s][a]
-        )
-        self.state = s1
+        q = self.q_table.values
+        q[s, a] = q[s, a] + self.alpha * (reward + self.gamma * q[s1].max() - q[s, a])
+        self.state = next_state
         self.acc_reward += reward
+
+    def save(self, path, **meta):
+        """Checkpoint the Q-table and the exploration state to the directory ``path`` (see :meth:`QTable.save`).
+
+        Extra keyword arguments (e.g. the run and step) are stored in the checkpoint metadata.
+        """
+        self.q_table.save(path, dict(meta, exploration=self.exploration.state_dict(), acc_reward=float(self.acc_reward)))
+
+    def restore(self, path, mmap=True):
+        """Continue from a checkpoint written by :meth:`save` and return its metadata.
+
+        The current state is kept, so a checkpoint can also warm-start an agent on a new episode.
+        """
+        meta = QTable.read_meta(path)
+        if meta["n_actions"] != self.action_space.n:
+            raise ValueError(f"Checkpoint {path} has {meta['n_actions']} actions, the agent {self.action_space.n}")
+        self.q_table = QTable.load(path, mmap=mmap)
+        self.q_table.row(self.state)
+        self.exploration.load_state_dict(meta["exploration"])
+        self.acc_reward = meta["acc_reward"]
+        return meta
+
+
+class QLAgentGroup:
+    """Independent Q-learning agents (e.g. one per traffic signal) acting and learning in single vectorized calls.
+
+    The agents keep separate Q-values but share one :class:`QTable` keyed by ``(agent index, state)``, so
+    :meth:`act_all` is one gather, one exploration draw and one argmax over every agent, and :meth:`learn_all` one
+    TD update. Agents with fewer actions than the largest action space have their extra columns masked out.
+    Equivalent to one :class:`QLAgent` per agent, each with its own copy of ``exploration_strategy``.
+    """
+
+    def __init__(self, starting_states: Dict[str, Hashable], action_spaces: Dict, alpha=0.5, gamma=0.95, exploration_strategy=None):
+        """Initialize the agents.
+
+        Args:
+            starting_states (Dict[str, Hashable]): Encoded starting state of every agent, keyed by agent id.
+            action_spaces (Dict): Discrete action space of every agent, keyed by agent id.
+            alpha (float): Learning rate.
+            gamma (float): Discount rate.
+            exploration_strategy (EpsilonGreedy): Exploration shared by the agents, decayed once per :meth:`act_all`.
+        """
+        self.agent_ids = list(starting_states.keys())
+        self.alpha = alpha
+        self.gamma = gamma
+        self.exploration = exploration_strategy if exploration_strategy is not None else EpsilonGreedy()
+        self.n_actions = np.asarray([action_spaces[agent_id].n for agent_id in self.agent_ids], dtype=np.int64)
+        self.q_table = QTable(int(self.n_actions.max()))
+        self.valid = np.arange(self.q_table.n_actions)[None, :] < self.n_actions[:, None]
+        self.states = dict(starting_states)
+        self.rows = self._rows(self.states)
+        self.actions = np.zeros(len(self.agent_ids), dtype=np.int64)
+        self.acc_rewards = np.zeros(len(self.agent_ids), dtype=np.float64)
+
+    def _rows(self, states: Dict[str, Hashable]) -> np.ndarray:
+        return self.q_table.rows((i, states[agent_id]) for i, agent_id in enumerate(self.agent_ids))
+
+    def q_values(self, agent_id: str, state) -> np.ndarray:
+        """Return the action values of an agent in a state (zeros if the state was never visited)."""
+        i = self.agent_ids.index(agent_id)
+        row = self.q_table.find((i, state))
+        if row is None:
+            return np.zeros(self.n_actions[i])
+        return self.q_table.values[row, : self.n_actions[i]]
+
+    def act_all(self) -> Dict[str, int]:
+        """Choose the action of every agent with one exploration draw and one argmax."""
+        q = np.where(self.valid, self.q_table.values[self.rows], -np.inf)
+        self.actions = self.exploration.choose_batch(q, self.n_actions)
+        return dict(zip(self.agent_ids, self.actions.tolist()))
+
+    def learn_all(self, next_states: Dict[str, Hashable], rewards: Dict[str, float], done=False):
+        """Update every agent with its new experience in one TD update.
+
+        Args:
+            next_states (Dict[str, Hashable]): Encoded next state of every agent.
+            rewards (Dict[str, float]): Reward of every agent.
+        """
+        next_rows = self._rows(next_states)  # may grow the table, so gather afterwards
+        reward = np.fromiter((rewards[agent_id] for agent_id in self.agent_ids), dtype=np.float64)
+        values = self.q_table.values
+        next_max = np.where(self.valid, values[next_rows], -np.inf).max(axis=1)
+        q = values[self.rows, self.actions]
+        values[self.rows, self.actions] = q + self.alpha * (reward + self.gamma * next_max - q)
+        self.states = dict(next_states)
+        self.rows = next_rows
+        self.acc_rewards += reward
+
+    def save(self, path, **meta):
+        """Checkpoint the shared Q-table and the exploration state to the directory ``path``.
+
+        Extra keyword arguments (e.g. the run and step) are stored in the checkpoint metadata.
+        """
+        self.q_table.save(
+            path,
+            dict(
+                meta,
+                agent_ids=self.agent_ids,
+                exploration=self.exploration.state_dict(),
+                acc_rewards=self.acc_rewards.tolist(),
+            ),
+        )
+
+    def restore(self, path, mmap=True):
+        """Continue from a checkpoint written by :meth:`save` and return its metadata.
+
+        The current states are kept, so a checkpoint can also warm-start the agents on a new episode.
+
+        Raises:
+            ValueError: If the checkpoint was written for other agents.
+        """
+        meta = QTable.read_meta(path)
+        if meta["agent_ids"] != self.agent_ids or meta["n_actions"] != self.q_table.n_actions:
+            raise ValueError(f"Checkpoint {path} was written for agents {meta['agent_ids']}, not {self.agent_ids}")
+        self.q_table = QTable.load(path, mmap=mmap)
+        self.rows = self._rows(self.states)
+        self.exploration.load_state_dict(meta["exploration"])
+        self.acc_rewards = np.asarray(meta["acc_rewards"], dtype=np.float64)
+        return meta
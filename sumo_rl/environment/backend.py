@@ -0,0 +1,120 @@
+"""SUMO backends: TraCI over a socket, or libsumo in process."""
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+
+LIBSUMO_AS_TRACI = "LIBSUMO_AS_TRACI" in os.environ
+BACKENDS = ("traci", "libsumo")
+
+
+def default_backend() -> str:
+    """Backend used when none is given: "libsumo" if ``LIBSUMO_AS_TRACI`` is set, "traci" otherwise."""
+    return "libsumo" if LIBSUMO_AS_TRACI else "traci"
+
+
+class SumoBackend(ABC):
+    """Starts and stops the simulation of one environment instance.
+
+    The object returned by :meth:`start` exposes the TraCI API (``vehicle``, ``lane``, ``simulation``, ...) for
+    both backends, so the rest of the environment does not depend on the backend.
+    """
+
+    name = None
+
+    def __init__(self, label: str):
+        """Initialize the backend of the simulation identified by ``label``."""
+        self.label = label
+        self.connection = None
+
+    @abstractmethod
+    def start(self, sumo_cmd: List[str], label: Optional[str] = None):
+        """Start a simulation and return its connection. ``label`` defaults to the backend label."""
+
+    @abstractmethod
+    def close(self):
+        """Stop the simulation started last, if any."""
+
+
+class TraciBackend(SumoBackend):
+    """One SUMO process per simulation, driven over a TraCI socket. Any number of them can run per process."""
+
+    name = "traci"
+
+    def __init__(self, label: str):
+        """Initialize the backend of the simulation identified by ``label``."""
+        if LIBSUMO_AS_TRACI:
+            raise ValueError("The traci backend is unavailable when LIBSUMO_AS_TRACI is set")
+        super().__init__(label)
+        self._connection_label = label
+
+    def start(self, sumo_cmd: List[str], label: Optional[str] = None):
+        """Start a simulation and return its connection. ``label`` defaults to the backend label."""
+        import traci
+
+        label = label or self.label
+        traci.start(sumo_cmd, label=label)
+        self._connection_label = label
+        self.connection = traci.getConnection(label)
+        return self.connection
+
+    def close(self):
+        """Stop the simulation started last, if any."""
+        import traci
+
+        if self.connection is None:
+            return
+        traci.switch(self._connection_label)
+        traci.close()
+        self.connection = None
+
+
+class LibsumoBackend(SumoBackend):
+    """SUMO linked into the python process: much faster calls, but a single simulation per process.
+
+    Use one worker process per simulation (see :class:`~sumo_rl.environment.vector_env.LibsumoPool`) to run
+    several of them in parallel.
+    """
+
+    name = "libsumo"
+    _active_label: Optional[str] = None  # label of the simulation running in this process
+
+    def start(self, sumo_cmd: List[str], label: Optional[str] = None):
+        """Start a simulation and return the libsumo module.
+
+        Raises:
+            RuntimeError: If another simulation already runs with libsumo in this process.
+        """
+        try:
+            import libsumo
+        except ImportError as ex:
+            raise ImportError("The libsumo backend requires the libsumo package (pip install libsumo)") from ex
+
+        label = label or self.label
+        if LibsumoBackend._active_label is not None:
+            raise RuntimeError(
+                f"libsumo already runs simulation {LibsumoBackend._active_label} in this process; "
+                f"use one worker process per simulation, e.g. LibsumoPool"
+            )
+        libsumo.start(sumo_cmd)
+        LibsumoBackend._active_label = label
+        self.connection = libsumo
+        return self.connection
+
+    def close(self):
+        """Stop the simulation started last, if any."""
+        if self.connection is None:
+            return
+        self.connection.close()
+        self.connection = None
+        LibsumoBackend._active_label = None
+
+
+def make_backend(name: Optional[str], label: str) -> SumoBackend:
+    """Return the backend called ``name`` ("traci" or "libsumo"), or the :func:`default_backend` if None."""
+    name = name or default_backend()
+    if name == "traci":
+        return TraciBackend(label)
+    if name == "libsumo":
+        return LibsumoBackend(label)
+    raise ValueError(f"Unknown SUMO backend {name}, expected one of {BACKENDS}")
@@ -3,7 +3,6 @@ import logging
 import os
 import time
 import sys
-from pathlib import Path
 from typing import Callable, Optional, Tuple, Union
 
 if "SUMO_HOME" in os.environ:
@@ -13,19 +12,26 @@ else:
     raise ImportError("Please declare the environment variable 'SUMO_HOME'")
 import gymnasium as gym
 import numpy as np
-import pandas as pd
 import sumolib
 import traci
 
 from .observations import DefaultObservationFunction, ObservationFunction
 from .traffic_signal import TrafficSignal
+from .network_index import NetworkIndex
+from .backend import LIBSUMO_AS_TRACI, make_backend
+from .vehicle_state import VehicleStateTable
+from .lane_snapshot import LaneSnapshot
+from .waiting_time import WaitingTimeTracker
+from .metrics import MetricsMixin
+from .profiler import StepProfiler
+from .simulation import SimulationMixin
 from .vehicle import *
 
-LIBSUMO = "LIBSUMO_AS_TRACI" in os.environ
+LIBSUMO = LIBSUMO_AS_TRACI  # process-wide default, the backend itself is chosen per instance
 
 
 # class SumoEnvironment():
-class SumoEnvironment(gym.Env):
+class SumoEnvironment(MetricsMixin, SimulationMixin, gym.Env):
     """
     Args:
         net_file (str): SUMO .net.xml file
@@ -52,6 +58,11 @@ class SumoEnvironment(gym.Env):
         sumo_warnings (bool): If true, it will print SUMO warnings.
         additional_sumo_cmd (str): Additional SUMO command line arguments.
         render_mode (str): Mode of rendering. Can be 'human' or 'rgb_array'. Default: None
+        sumo_backend (Optional[str]): 'traci' or 'libsumo', chosen per instance. Only one libsumo simulation can run per process, see :class:`~sumo_rl.environment.vector_env.LibsumoPool`. Default: 'libsumo' if LIBSUMO_AS_TRACI is set, else 'traci'
+        reset_mode (Optional[str]): How :meth:`reset` starts a new episode. 'restart' closes SUMO and launches a new process, 'reload' reloads the simulation inside the running SUMO, 'snapshot' restores the state saved at the start of the first episode (the seed of the first episode is kept). With 'reload' and 'snapshot' the traffic signals are re-initialised instead of rebuilt. Default: 'restart'
+        metrics_format (str): 'csv' or 'parquet' (requires pyarrow), format of the per-episode metrics file, which is written in chunks while the episode runs. Default: 'csv'
+        profile (bool): If true, the phases of every step and the TraCI calls are timed; the step breakdown is added to the info dict and the report of every episode is logged and kept in ``profiler.last_report``. Default: False
+        slow_step_threshold (Optional[float]): With ``profile``, steps longer than this many wall clock seconds are logged with their breakdown. Default: None
     """
 
     metadata = {
@@ -59,6 +70,7 @@ class SumoEnvironment(gym.Env):
     }
 
     CONNECTION_LABEL = 0  # For traci multi-client support
+    RESET_MODES = ("restart", "reload", "snapshot")
 
     def __init__(
         self,
@@ -86,6 +98,11 @@ class SumoEnvironment(gym.Env):
         sumo_warnings: bool = True,
         additional_sumo_cmd: Optional[str] = None,
         render_mode: Optional[str] = None,
+        sumo_backend: Optional[str] = None,
+        reset_mode: Optional[str] = None,
+        metrics_format: str = "csv",
+        profile: bool = False,
+        slow_step_threshold: Optional[float] = None,
     ) -> None:
         """Initialize the environment."""
         assert render_mode is None or render_mode in self.metadata["render_modes"], "Invalid render mode."
@@ -123,149 +140,89 @@ class SumoEnvironment(gym.Env):
         self.label = str(SumoEnvironment.CONNECTION_LABEL)
         SumoEnvironment.CONNECTION_LABEL += 1
         self.sumo = None
-
-        if LIBSUMO:
-            traci.start([sumolib.checkBinary("sumo"), "-n", self._net])  # Start only to retrieve traffic light information
-            conn = traci
-        else:
-            traci.start([sumolib.checkBinary("sumo"), "-n", self._net], label="init_connection" + self.label)
-            conn = traci.getConnection("init_connection" + self.label)
-
-        self.ts_ids = list(conn.trafficlight.getIDList())
+        self.backend = make_backend(sumo_backend, self.label)
+        if self.backend.name == "libsumo" and (self.use_gui or self.render_mode is not None):
+            raise ValueError("sumo-gui and rendering are not available with the libsumo backend")
+        self.reset_mode = reset_mode or "restart"
+        if self.reset_mode not in self.RESET_MODES:
+            raise ValueError(f"Unknown reset mode {self.reset_mode}, expected one of {self.RESET_MODES}")
+        self._snapshot_file = None
+        self.network_index = NetworkIndex.load(self._net)
+
+        self.ts_ids = list(self.network_index.tls_ids)
         self.observation_class = observation_class
 
-        if isinstance(self.reward_fn, dict):
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn[ts],
-                    conn,
-                )
-                for ts in self.reward_fn.keys()
-            }
-        else:
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn,
-                    conn,
-                )
-                for ts in self.ts_ids
-            }
-
-        conn.close()
-
-        self.vehicles = dict()
+        # traffic lights are read from the net file, the simulation is only started on reset
+        self.traffic_signals = self._build_traffic_signals(None)
+
+        self.waiting_time_tracker = None
         self.reward_range = (-float("inf"), float("inf"))
         self.episode = 0
-        self.metrics = []
         self.out_csv_name = out_csv_name
+        self.metrics_format = metrics_format
+        self.metrics_writer = None
+        self.profiler = StepProfiler(profile, slow_step_threshold)
+        self._state_encoders = {}  # ts id and (phases, observation size) -> shared StateEncoder
+        # fixed info schema, so the metrics are streamed to fixed columns and the per-signal keys are built once
+        self._agent_info_keys = {
+            ts: (f"{ts}_stopped", f"{ts}_accumulated_waiting_time", f"{ts}_average_speed") for ts in self.ts_ids
+        }
+        self.info_columns = ["step"]
+        if self.add_system_info:
+            self.info_columns += [
+                "system_total_stopped",
+                "system_total_waiting_time",
+                "system_mean_waiting_time",
+                "system_mean_speed",
+            ]
+        if self.add_per_agent_info:
+            self.info_columns += [key for ts in self.ts_ids for key in self._agent_info_keys[ts]]
+            self.info_columns += ["agents_total_stopped", "agents_total_accumulated_waiting_time"]
         self.observations = {ts: None for ts in self.ts_ids}
         self.rewards = {ts: None for ts in self.ts_ids}
+        self.vehicle_state = None
+        self.lane_snapshot = None
 
-    def _start_simulation(self):
-        sumo_cmd = [
-            self._sumo_binary,
-            "-n",
-            self._net,
-            "-r",
-            self._route,
-            "--max-depart-delay",
-            str(self.max_depart_delay),
-            "--waiting-time-memory",
-            str(self.waiting_time_memory),
-            "--time-to-teleport",
-            str(self.time_to_teleport),
-        ]
-        if self.begin_time > 0:
-            sumo_cmd.append(f"-b {self.begin_time}")
-        if self.sumo_seed == "random":
-            sumo_cmd.append("--random")
-        else:
-            sumo_cmd.extend(["--seed", str(self.sumo_seed)])
-        if not self.sumo_warnings:
-            sumo_cmd.append("--no-warnings")
-        if self.additional_sumo_cmd is not None:
-            sumo_cmd.extend(self.additional_sumo_cmd.split())
-        if self.use_gui or self.render_mode is not None:
-            sumo_cmd.extend(["--start", "--quit-on-end"])
-            if self.render_mode == "rgb_array":
-                sumo_cmd.extend(["--window-size", f"{self.virtual_display[0]},{self.virtual_display[1]}"])
-                from pyvirtualdisplay.smartdisplay import SmartDisplay
-
-                print("Creating a virtual display.")
-                self.disp = SmartDisplay(size=self.virtual_display)
-                self.disp.start()
-                print("Virtual display started.")
-
-        if LIBSUMO:
-            traci.start(sumo_cmd)
-            self.sumo = traci
-        else:
-            traci.start(sumo_cmd, label=self.label)
-            self.sumo = traci.getConnection(self.label)
-
-        if self.use_gui or self.render_mode is not None:
-            self.sumo.gui.setSchema(traci.gui.DEFAULT_VIEW, "real world")
+    def _setup_episode(self):
+        """Create the per-episode objects and reset the traffic signals (built once from the network index)."""
+        self.vehicle_state = VehicleStateTable(
+            self.sumo, road_ids=self.network_index.edge_ids, lane_ids=self.network_index.lane_ids
+        )
+        for ts in self.traffic_signals.values():
+            ts.reset(self.sumo)
+        self.lane_snapshot = LaneSnapshot(
+            self.sumo,
+            self.network_index,
+            [lane for ts in self.traffic_signals.values() for lane in ts.lanes + ts.out_lanes],
+        )
+        self.waiting_time_tracker = WaitingTimeTracker(self.vehicle_state)
+        self.vehicle_state.subscribe(self.sumo.vehicle.getIDList())  # vehicles restored from a snapshot
+        self.vehicle_state.update()
+        self.waiting_time_tracker.update()
+        self.lane_snapshot.update()
 
     def reset(self, seed: Optional[int] = None, **kwargs):
         """Reset the environment."""
         super().reset(seed=seed, **kwargs)
 
         if self.episode != 0:
-            self.close()
+            if self.reset_mode == "restart":
+                self.close()
             self.save_csv(self.out_csv_name, self.episode)
+            self.profiler.end_episode()
         self.episode += 1
-        self.metrics = []
+        self._open_metrics_writer()
 
         if seed is not None:
             self.sumo_seed = seed
-        self._start_simulation()
-
-        if isinstance(self.reward_fn, dict):
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn[ts],
-                    self.sumo,
-                )
-                for ts in self.reward_fn.keys()
-            }
+        if self.sumo is None:
+            self._start_simulation()
+            self._setup_episode()
+            if self.reset_mode == "snapshot":
+                self._save_snapshot()
         else:
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn,
-                    self.sumo,
-                )
-                for ts in self.ts_ids
-            }
-
-        self.vehicles = dict()
+            self._restore_simulation()
+            self._setup_episode()
 
         if self.single_agent:
             return self._compute_observations()[self.ts_ids[0]], self._compute_info()
@@ -306,21 +263,28 @@ class SumoEnvironment(gym.Env):
             action (Union[dict, int]): action(s) to be applied to the environment.
             If single_agent is True, action is an int, otherwise it expects a dict with keys corresponding to traffic signal ids.
         """
+        self.profiler.begin_step()
         # No action, follow fixed TL defined in self.phases
-
         if action is None or action == {}:
-            for _ in range(self.delta_time):
-                self._sumo_step()
+            with self.profiler.phase("simulate"):
+                for _ in range(self.delta_time):
+                    self._sumo_step()
         else:
-            self._apply_actions(action)
-            self._run_steps()
-
-        observations = self._compute_observations()
-        rewards = self._compute_rewards()
+            with self.profiler.phase("act"):
+                self._apply_actions(action)
+            with self.profiler.phase("simulate"):
+                self._run_steps()
+
+        with self.profiler.phase("observe"):
+            observations = self._compute_observations()
+        with self.profiler.phase("reward"):
+            rewards = self._compute_rewards()
         dones = self._compute_dones()
         terminated = False  # there are no 'terminal' states in this environment
         truncated = dones["__all__"]  # episode ends when sim_step >= max_steps
-        info = self._compute_info()
+        with self.profiler.phase("info"):
+            info = self._compute_info()
+        info.update(self.profiler.end_step(self.sim_step))
 
         if self.single_agent:
             return observations[self.ts_ids[0]], rewards[self.ts_ids[0]], terminated, truncated, info
@@ -361,7 +325,8 @@ class SumoEnvironment(gym.Env):
             info.update(self._get_system_info())
         if self.add_per_agent_info:
             info.update(self._get_per_agent_info())
-        self.metrics.append(info.copy())
+        if self.metrics_writer is not None:
+            self.metrics_writer.append(info)
         return info
 
     def _compute_observations(self):
@@ -402,18 +367,20 @@ class SumoEnvironment(gym.Env):
 
     def _sumo_step(self):
         self.sumo.simulationStep()
+        self.vehicle_state.update()
+        self.waiting_time_tracker.update()
+        self.lane_snapshot.update()
 
 
     def _get_system_info(self):
-        vehicles = self.sumo.vehicle.getIDList()
-        speeds = [self.sumo.vehicle.getSpeed(vehicle) for vehicle in vehicles]
-        waiting_times = [self.sumo.vehicle.getWaitingTime(vehicle) for vehicle in vehicles]
+        speeds = self.vehicle_state.speeds
+        waiting_times = self.vehicle_state.waiting_times
         return {
             # In SUMO, a vehicle is considered halting if its speed is below 0.1 m/s
-            "system_total_stopped": sum(int(speed < 0.1) for speed in speeds),
-            "system_total_waiting_time": sum(waiting_times),
-            "system_mean_waiting_time": 0.0 if len(vehicles) == 0 else np.mean(waiting_times),
-            "system_mean_speed": 0.0 if len(vehicles) == 0 else np.mean(speeds),
+            "system_total_stopped": int(np.sum(speeds < 0.1)),
+            "system_total_waiting_time": float(np.sum(waiting_times)),
+            "system_mean_waiting_time": 0.0 if len(speeds) == 0 else float(np.mean(waiting_times)),
+            "system_mean_speed": 0.0 if len(speeds) == 0 else float(np.mean(speeds)),
         }
 
     def _get_per_agent_info(self):
@@ -424,32 +391,14 @@ class SumoEnvironment(gym.Env):
         average_speed = [self.traffic_signals[ts].get_average_speed() for ts in self.ts_ids]
         info = {}
         for i, ts in enumerate(self.ts_ids):
-            info[f"{ts}_stopped"] = stopped[i]
-            info[f"{ts}_accumulated_waiting_time"] = accumulated_waiting_time[i]
-            info[f"{ts}_average_speed"] = average_speed[i]
+            stopped_key, waiting_time_key, speed_key = self._agent_info_keys[ts]
+            info[stopped_key] = stopped[i]
+            info[waiting_time_key] = accumulated_waiting_time[i]
+            info[speed_key] = average_speed[i]
         info["agents_total_stopped"] = sum(stopped)
         info["agents_total_accumulated_waiting_time"] = sum(accumulated_waiting_time)
         return info
 
-    def close(self):
-        """Close the environment and stop the SUMO simulation."""
-        if self.sumo is None:
-            return
-
-        if not LIBSUMO:
-            traci.switch(self.label)
-        traci.close()
-
-        if self.disp is not None:
-            self.disp.stop()
-            self.disp = None
-
-        self.sumo = None
-
-    def __del__(self):
-        """Close the environment and stop the SUMO simulation."""
-        self.close()
-
     def render(self):
         """Render the environment.
 
@@ -464,28 +413,3 @@ class SumoEnvironment(gym.Env):
             #                          height=self.virtual_display[1])
             img = self.disp.grab()
             return np.array(img)
-
-    def save_csv(self, out_csv_name, episode):
-        """Save metrics of the simulation to a .csv file.
-
-        Args:
-            out_csv_name (str): Path to the output .csv file. E.g.: "results/my_results
-            episode (int): Episode number to be appended to the output file name.
-        """
-        if out_csv_name is not None:
-            df = pd.DataFrame(self.metrics)
-            Path(Path(out_csv_name).parent).mkdir(parents=True, exist_ok=True)
-            df.to_csv(out_csv_name + f"_conn{self.label}_ep{episode}" + ".csv", index=False)
-
-    # Below functions are for discrete state space
-
-    def encode(self, state, ts_id):
-        """Encode the state of the traffic signal into a hashable object."""
-        phase = int(np.where(state[: self.traffic_signals[ts_id].num_green_phases] == 1)[0])
-        min_green = state[self.traffic_signals[ts_id].num_green_phases]
-        density_queue = [self._discretize_density(d) for d in state[self.traffic_signals[ts_id].num_green_phases + 1 :]]
-        # tuples are hashable and can be used as key in python dictionary
-        return tuple([phase, min_green] + density_queue)
-
-    def _discretize_density(self, density):
-        return min(int(density * 10), 9)
\ No newline at end of file
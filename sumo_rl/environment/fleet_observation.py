@@ -0,0 +1,169 @@
+"""Fleet-level observation builder for the port trucks."""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class FleetObservation:
+    """Builds the observation of every truck at once into a preallocated ``(capacity, n_features)`` array.
+
+    Row ``i`` of :attr:`observation` belongs to ``vehicle_ids[i]``; :attr:`mask` tells which rows hold a valid
+    truck in the current step. Quantities shared by the whole fleet (bridge occupancy, vehicles per edge/lane,
+    vehicles per destination) are computed once per :meth:`build` instead of once per truck.
+
+    # Features
+    - ```cargo_precedence``` priority of the truck
+    - ```target_waiting``` seconds since the target destination last finished a service
+    - ```target_type``` destination type, crane / gantry / other -> [0, 1, 2]
+    - ```target_related_vehicles``` number of trucks heading to the same destination
+    - ```crane_related_in_bridge``` trucks heading to the same crane that are on the bridge (0 if target is not a crane)
+    - ```lane_length``` length of the current lane
+    - ```road_vehicle_num``` number of vehicles on the current edge
+    - ```is_valid``` 1 for a valid row
+    - ```is_arrived_target``` whether the truck has arrived at its destination
+    - ```is_in_junction``` whether the truck is less than 2m away from the end of its lane
+    - ```waiting_time``` seconds the truck has been standing still
+    - ```speed``` current speed
+    - ```distance_to_junction``` distance to the end of the current lane
+    - ```lane_vehicle_num``` number of vehicles on the current lane
+    - ```lane_max_speed``` speed limit of the current lane
+    - ```road_length``` length of the current road (same as lane_length)
+    """
+
+    FEATURES = (
+        "cargo_precedence",
+        "target_waiting",
+        "target_type",
+        "target_related_vehicles",
+        "crane_related_in_bridge",
+        "lane_length",
+        "road_vehicle_num",
+        "is_valid",
+        "is_arrived_target",
+        "is_in_junction",
+        "waiting_time",
+        "speed",
+        "distance_to_junction",
+        "lane_vehicle_num",
+        "lane_max_speed",
+        "road_length",
+    )
+    DESTINATION_TYPES = {"crane": 0, "gantry": 1, "other": 2}
+
+    def __init__(self, env, capacity: int = 256):
+        """Initialize the builder.
+
+        Args:
+            env (SumoEnvironment): The port environment, providing ``vehicle_state``, ``network_index``, ``trucks``
+                and ``Scheduler``.
+            capacity (int): Initial number of rows. Doubles whenever the fleet outgrows it.
+        """
+        self.env = env
+        self.n_features = len(self.FEATURES)
+        self.vehicle_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._allocate(capacity)
+
+        # static lane data, indexed like VehicleStateTable.lane_ids
+        self._lane_length = np.zeros(0, dtype=np.float32)
+        self._lane_max_speed = np.zeros(0, dtype=np.float32)
+        self._lane_end = np.zeros((0, 2), dtype=np.float64)
+
+    def _allocate(self, capacity: int):
+        self.capacity = capacity
+        self.observation = np.zeros((capacity, self.n_features), dtype=np.float32)
+        self.mask = np.zeros(capacity, dtype=bool)
+
+    def _update_lane_static(self):
+        lane_ids = self.env.vehicle_state.lane_ids
+        known = len(self._lane_length)
+        if known == len(lane_ids):
+            return
+        index = self.env.network_index
+        # lanes unknown to the network index (e.g. "" for vehicles that are not on the road) get zeros
+        new_idx = np.asarray([index.lane_index.get(lane_id, -1) for lane_id in lane_ids[known:]], dtype=np.int64)
+        found = new_idx >= 0
+        lengths = np.zeros(len(new_idx), dtype=np.float32)
+        max_speeds = np.zeros(len(new_idx), dtype=np.float32)
+        ends = np.zeros((len(new_idx), 2), dtype=np.float64)
+        lengths[found] = index.lane_length[new_idx[found]]
+        max_speeds[found] = index.lane_max_speed[new_idx[found]]
+        ends[found] = index.lane_end[new_idx[found]]
+        self._lane_length = np.concatenate((self._lane_length, lengths))
+        self._lane_max_speed = np.concatenate((self._lane_max_speed, max_speeds))
+        self._lane_end = np.concatenate((self._lane_end, ends))
+
+    def build(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute the observation of the whole fleet for the current step.
+
+        Returns:
+            observation (np.ndarray): float32 array of shape (capacity, n_features).
+            mask (np.ndarray): bool array of shape (capacity,), True for rows holding a truck.
+        """
+        state = self.env.vehicle_state
+        scheduler = self.env.Scheduler
+        trucks = self.env.trucks
+        n = len(state)
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+        self._update_lane_static()
+
+        self.vehicle_ids = list(state.ids)
+        self._rows = dict(state.rows)
+        self.observation.fill(0.0)
+        self.mask.fill(False)
+        if n == 0:
+            return self.observation, self.mask
+
+        road_idx = state.road_idx[:n]
+        lane_idx = state.lane_idx[:n]
+        road_counts = np.bincount(road_idx, minlength=len(state.road_ids))
+        lane_counts = np.bincount(lane_idx, minlength=len(state.lane_ids))
+
+        # ======== shared per-step quantities
+        bridge_idx = [state.road_index(edge) for edge in scheduler.bridge_edge]
+        in_bridge = np.isin(road_idx, bridge_idx)
+        vehicle_in_bridge = {self.vehicle_ids[i] for i in np.flatnonzero(in_bridge)}
+        related = {}  # (type, des_id) -> (number of trucks, number of trucks on the bridge)
+        for des_type, tasks in scheduler.tasks_ongoing.items():
+            for des_id, vehicle_list in tasks.items():
+                related[(des_type, des_id)] = (len(vehicle_list), len(vehicle_in_bridge.intersection(vehicle_list)))
+        now = self.env.sim_step
+
+        # ======== per-truck bookkeeping kept on the python side
+        obs = self.observation
+        for row, vehicle_id in enumerate(self.vehicle_ids):
+            truck = trucks.get(vehicle_id)
+            if truck is None or not truck.destination:
+                continue
+            destination = truck.destination
+            key = (destination["type"], destination["des_id"])
+            related_num, related_in_bridge = related.get(key, (0, 0))
+            obs[row, 0] = truck.priority
+            obs[row, 1] = now - scheduler.destination[key[0]][key[1]]["serlog"][0]
+            obs[row, 2] = self.DESTINATION_TYPES[key[0]]
+            obs[row, 3] = related_num
+            obs[row, 4] = related_in_bridge if key[0] == "crane" else 0
+            obs[row, 8] = truck.start_task
+            self.mask[row] = True
+
+        # ======== vectorized vehicle/road/lane features
+        valid = self.mask[:n]
+        lane_length = self._lane_length[lane_idx]
+        distance_to_junction = np.linalg.norm(state.position[:n] - self._lane_end[lane_idx], axis=1)
+        obs[:n, 5] = lane_length
+        obs[:n, 6] = road_counts[road_idx]
+        obs[:n, 7] = 1
+        obs[:n, 9] = distance_to_junction < 2
+        obs[:n, 10] = state.waiting_times
+        obs[:n, 11] = state.speeds
+        obs[:n, 12] = distance_to_junction
+        obs[:n, 13] = lane_counts[lane_idx]
+        obs[:n, 14] = self._lane_max_speed[lane_idx]
+        obs[:n, 15] = lane_length
+        obs[:n][~valid] = 0.0
+        return self.observation, self.mask
+
+    def get(self, vehicle_id: str) -> np.ndarray:
+        """Return the last built observation row of a truck."""
+        return self.observation[self._rows[vehicle_id]]
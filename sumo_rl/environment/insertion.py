@@ -0,0 +1,85 @@
+"""Staggered, capacity-aware insertion of trucks at their depots."""
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+class InsertionQueue:
+    """Trucks waiting to enter the network, one FIFO per depot (origin edge).
+
+    SUMO only inserts a vehicle when the start of its departure lane is free, and keeps retrying every step
+    otherwise; adding hundreds of vehicles on the same edge at once makes every step pay for that backlog. Here a
+    truck is only handed to SUMO when its release time has come, the entry of its depot is clear (no running
+    vehicle within ``clearance`` meters of the edge start) and fewer trucks than the depot has lanes are already
+    waiting for insertion in SUMO.
+    """
+
+    def __init__(self, network_index, vehicle_state, clearance: float = 15.0):
+        """Initialize an empty queue.
+
+        Args:
+            network_index (NetworkIndex): The static network metadata.
+            vehicle_state (VehicleStateTable): The per-step vehicle table of the episode, seeded with the index ids.
+            clearance (float): Length in meters at the start of a depot edge that must be free to insert a truck.
+        """
+        self.network_index = network_index
+        self.vehicle_state = vehicle_state
+        self.clearance = clearance
+        self.pending: Dict[str, Deque[Tuple[float, str, Optional[dict]]]] = {}  # depot -> (release time, id, task)
+        self.inserting: Dict[str, Set[str]] = {}  # depot -> trucks added to SUMO but not departed yet
+        self._depot_of: Dict[str, str] = {}
+        self._depot_idx: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return sum(len(trucks) for trucks in self.pending.values())
+
+    def push(self, truck_id: str, depot: str, release_time: float, task: Optional[dict] = None):
+        """Queue a truck at ``depot``, to be inserted at ``release_time`` at the earliest."""
+        if depot not in self.pending:
+            self.pending[depot] = deque()
+            self.inserting[depot] = set()
+            self._depot_idx[depot] = self.network_index.edge_index[depot]
+        self.pending[depot].append((release_time, truck_id, task))
+
+    def pop_ready(self, sim_time: float) -> List[Tuple[str, str, Optional[dict]]]:
+        """Return the trucks to add to SUMO now, as (truck id, depot, task), and mark them as inserting."""
+        for truck_id in self.vehicle_state.departed:
+            depot = self._depot_of.pop(truck_id, None)
+            if depot is not None:
+                self.inserting[depot].discard(truck_id)
+        if not any(self.pending.values()):
+            return []
+
+        n = len(self.vehicle_state)
+        near_start = self.vehicle_state.lane_position[:n] < self.clearance
+        occupied = np.bincount(
+            self.vehicle_state.road_idx[:n][near_start], minlength=len(self.network_index.edge_ids)
+        )
+        ready = []
+        for depot, queue in self.pending.items():
+            if not queue or occupied[self._depot_idx[depot]] > 0:
+                continue
+            free = len(self.network_index.lanes_of(depot)) - len(self.inserting[depot])
+            while free > 0 and queue and queue[0][0] <= sim_time:
+                _, truck_id, task = queue.popleft()
+                self.inserting[depot].add(truck_id)
+                self._depot_of[truck_id] = depot
+                ready.append((truck_id, depot, task))
+                free -= 1
+        return ready
+
+    def cancel(self, truck_id: str):
+        """Forget a truck whose insertion failed, so it no longer holds a slot of its depot."""
+        depot = self._depot_of.pop(truck_id, None)
+        if depot is not None:
+            self.inserting[depot].discard(truck_id)
+        else:
+            logging.warning(f"Cancel unknown truck {truck_id} in the insertion queue")
+
+
+def stagger(n: int, depots: Sequence[str], start_time: float, interval: float) -> List[Tuple[str, float]]:
+    """Spread ``n`` trucks round-robin over ``depots``: truck ``i`` gets depot ``i % len(depots)`` and the release
+    time ``start_time + (i // len(depots)) * interval``."""
+    return [(depots[i % len(depots)], start_time + (i // len(depots)) * interval) for i in range(n)]
@@ -1,150 +1,152 @@
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
 class IntersectionController:
-    def __init__(self, sumo):
-        self.sumo = sumo
-        self.edgeIDList = [
-            "D2D3", "E6", "-E6", "D3D4", "D4D3", "-E3", "E3", "D3D2"
-        ]
-        self.edgeID2Idx = {
-            "D2D3": 0, "E6": 1, "-E6": 2, "D3D4": 3, "D4D3": 4, "-E3": 5, "E3": 6, "D3D2": 7
-        }
-        self.conflictIdxList = set()
-        for i in [0, 2, 4, 6]:
-            self.conflictIdxList.add(((0 + i) % 8, (7 + i) % 8, (0 + i) % 8, (7 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (7 + i) % 8, (2 + i) % 8, (7 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (7 + i) % 8, (4 + i) % 8, (7 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (7 + i) % 8, (6 + i) % 8, (7 + i) % 8))
-
-            self.conflictIdxList.add(((0 + i) % 8, (1 + i) % 8, (0 + i) % 8, (1 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (1 + i) % 8, (2 + i) % 8, (1 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (1 + i) % 8, (4 + i) % 8, (1 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (1 + i) % 8, (6 + i) % 8, (1 + i) % 8))
-
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (0 + i) % 8, (3 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (2 + i) % 8, (3 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (2 + i) % 8, (5 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (2 + i) % 8, (7 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (4 + i) % 8, (1 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (4 + i) % 8, (3 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (6 + i) % 8, (1 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (3 + i) % 8, (6 + i) % 8, (3 + i) % 8))
-
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (0 + i) % 8, (5 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (2 + i) % 8, (5 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (2 + i) % 8, (7 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (4 + i) % 8, (5 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (4 + i) % 8, (7 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (6 + i) % 8, (1 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (6 + i) % 8, (3 + i) % 8))
-            self.conflictIdxList.add(((0 + i) % 8, (5 + i) % 8, (6 + i) % 8, (5 + i) % 8))
-
-        self.occupyingIdxpairDict = {}
-        self.priorityIdxpairDict = {}
-
-    def getVehicleIDInCircle(self, x, y, radius):
-        ids = self.sumo.vehicle.getIDList()
-        vehicles = []
-        dis = []
-        for id in ids:
-            pos = self.sumo.vehicle.getPosition(id)
-            speedMode = self.sumo.vehicle.getSpeedMode(id)
-            if (pos[0] - x) ** 2 + (pos[1] - y) ** 2 <= radius ** 2:
-                vehicles.append(id)
-                dis.append((pos[0] - x) ** 2 + (pos[1] - y) ** 2)
+    """Reservation based right of way for every unsignalized junction of the network.
+
+    Movements (incoming edge -> outgoing edge) and their foes are read from the junction requests of the net file
+    (see :meth:`NetworkIndex._index_junctions`). A truck approaching a managed junction is stopped at the end of its
+    lane and queued with the movement given by its route; once per step, queued trucks whose movement is not a foe
+    of a movement currently occupying the junction (nor of one released before them in the same step) are released,
+    first come first served. A truck frees its reservation when it reaches the outgoing edge or leaves the
+    simulation.
+
+    Vehicles are read from the per-step VehicleStateTable, so the cost of a step grows with the number of trucks
+    near a junction, not with the number of junctions.
+    """
+
+    def __init__(self, env, approach_distance: float = 50, junction_ids: Optional[Iterable[str]] = None):
+        """Initialize the controller.
+
+        Args:
+            env (SumoEnvironment): The port environment, providing ``sumo``, ``network_index`` and ``vehicle_state``.
+            approach_distance (float): Distance to the end of the incoming lane from which a truck is managed.
+            junction_ids (Optional[Iterable[str]]): Junctions to manage. Default: every unsignalized junction.
+        """
+        self.sumo = env.sumo
+        self.network_index = env.network_index
+        self.state = env.vehicle_state
+        self.route_index = env.Scheduler.route_index
+        self.approach_distance = approach_distance
+
+        index = self.network_index
+        managed = np.ones(len(index.junction_ids), dtype=bool)
+        if junction_ids is not None:
+            junction_ids = set(junction_ids)
+            managed = np.asarray([junction_id in junction_ids for junction_id in index.junction_ids], dtype=bool)
+        # is_incoming[road_idx]: the edge ends at a managed junction
+        self.is_incoming = np.zeros(len(index.edge_ids), dtype=bool)
+        self.is_incoming[index.edge_junction >= 0] = managed[index.edge_junction[index.edge_junction >= 0]]
+
+        self.priorityMovementDict: Dict[str, int] = {}  # queued vehicle -> movement, in arrival order
+        self.occupyingMovementDict: Dict[str, int] = {}  # released vehicle -> movement, until it reaches the out edge
+        self.releasedEdgeDict: Dict[str, int] = {}  # released vehicle -> incoming edge, so it is not queued again
+        self.stopLaneDict: Dict[str, str] = {}  # queued vehicle -> lane of its junction stop
+        # (vehicle, edge) -> movement of vehicles without a dispatched route, read from SUMO once per edge
+        self.movementCache: Dict[Tuple[str, int], Optional[int]] = {}
+
+    def getMovement(self, vehicleID, edgeIdx) -> Optional[int]:
+        """Return the movement a vehicle takes at the end of edge ``edgeIdx``, or None if its route ends there.
+
+        Trucks are looked up in the routes assigned by the scheduler; other vehicles ask SUMO once per edge.
+        """
+        edgeID = self.network_index.edge_ids[edgeIdx]
+        route = self.route_index.routes.get(vehicleID)
+        if route is not None and edgeID in route:
+            return self._movementOnRoute(route, edgeID, edgeIdx)
+        key = (vehicleID, edgeIdx)
+        if key not in self.movementCache:
+            self.movementCache[key] = self._movementOnRoute(self.sumo.vehicle.getRoute(vehicleID), edgeID, edgeIdx)
+        return self.movementCache[key]
+
+    def _movementOnRoute(self, route, edgeID, edgeIdx) -> Optional[int]:
+        if edgeID not in route or route[-1] == edgeID:
+            return None
+        nextEdgeIdx = self.network_index.edge_index[route[route.index(edgeID) + 1]]
+        return self.network_index.movement_index.get((edgeIdx, nextEdgeIdx))
+
+    def _setStop(self, vehicleID, laneID, duration=None) -> bool:
+        """Stop a vehicle 1m before the end of ``laneID``; with ``duration=0`` the stop is released instead."""
+        edgeID = self.network_index.edge_of(laneID)
+        laneIndex = self.network_index.lanes_of(edgeID).index(laneID)
+        pos = self.network_index.length(laneID) - 1
+        try:
+            if duration is None:
+                self.sumo.vehicle.setStop(vehicleID, edgeID, pos=pos, laneIndex=laneIndex)
             else:
-                assert speedMode == 31
-        vehicles = [x for _, x in sorted(zip(dis, vehicles))]
-        return vehicles
-
-    def getEdgeIdxPair(self, vehicleID):
-        route = self.sumo.vehicle.getRoute(vehicleID)
-        edgeID = self.sumo.vehicle.getRoadID(vehicleID)
-        if edgeID not in route:
-            return None, None
-        assert edgeID in route
-
-        if route[-1] == edgeID:
-            nextEdgeID = None
-        else:
-            nextEdgeID = route[route.index(edgeID) + 1]
-        edgeIdx = self.edgeID2Idx[edgeID]
-        if nextEdgeID is None:
-            nextEdgeIdx = None
-        else:
-            nextEdgeIdx = self.edgeID2Idx[nextEdgeID]
-        return edgeIdx, nextEdgeIdx
+                self.sumo.vehicle.setStop(vehicleID, edgeID, pos=pos, laneIndex=laneIndex, duration=duration)
+            return True
+        except Exception as ex:
+            logging.warning(f"Fail to set junction stop of {vehicleID} on {laneID}: {ex}")
+            return False
 
     def step(self):
-        print("len(self.priorityIdxpairDict):", len(self.priorityIdxpairDict))
-        print("len(self.occupyingIdxpairDict):", len(self.occupyingIdxpairDict))
-        print("self.priorityIdxpairDict:", self.priorityIdxpairDict)
-        print("self.occupyingIdxpairDict:", self.occupyingIdxpairDict)
-
-        ids = self.getVehicleIDInCircle(300, 300, 50)
-        for i in ids:
-            edgeID = self.sumo.vehicle.getRoadID(i)
-            if edgeID not in self.edgeIDList:
+        logging.debug(f"priorityMovementDict: {self.priorityMovementDict}")
+        logging.debug(f"occupyingMovementDict: {self.occupyingMovementDict}")
+        state = self.state
+        index = self.network_index
+        n = len(state)
+
+        # ======== 释放已驶出路口的车辆
+        for i in list(self.occupyingMovementDict.keys()):
+            row = state.row(i)
+            if row is None or state.road_idx[row] == index.movement_to[self.occupyingMovementDict[i]]:
+                self.occupyingMovementDict.pop(i)
+        for i in list(self.releasedEdgeDict.keys()):
+            row = state.row(i)
+            if row is None or state.road_idx[row] != self.releasedEdgeDict[i]:
+                self.releasedEdgeDict.pop(i)
+        for key in list(self.movementCache.keys()):
+            row = state.row(key[0])
+            if row is None or state.road_idx[row] != key[1]:
+                self.movementCache.pop(key)
+
+        # ======== 驶近路口的车辆排队, 先到先得
+        road_idx = state.road_idx[:n]
+        lane_idx = state.lane_idx[:n]
+        on_road = road_idx < len(index.edge_ids)
+        rows = np.flatnonzero(on_road & self.is_incoming[np.where(on_road, road_idx, 0)])
+        lane = lane_idx[rows]
+        known = lane < len(index.lane_ids)
+        rows, lane = rows[known], lane[known]
+        distance = index.lane_length[lane] - state.lane_position[rows]
+        near = distance <= self.approach_distance
+        rows, lane, distance = rows[near], lane[near], distance[near]
+        for k in np.argsort(distance, kind="stable"):
+            i = state.ids[rows[k]]
+            if i in self.priorityMovementDict or i in self.occupyingMovementDict or i in self.releasedEdgeDict:
                 continue
-            edgeIdx = self.edgeID2Idx[edgeID]
-            if edgeIdx % 2 == 0:
-                if i in self.occupyingIdxpairDict.keys():
-                    continue
-                if i in self.priorityIdxpairDict.keys():
-                    continue
-                edgeIdx, nextEdgeIdx = self.getEdgeIdxPair(i)
-                self.priorityIdxpairDict[i] = (edgeIdx, nextEdgeIdx)
-                laneID = self.sumo.vehicle.getLaneID(i)
-                laneLength = self.sumo.lane.getLength(laneID)
-                self.sumo.vehicle.setStop(i, edgeID, pos=laneLength - 1)
-
-        remove_occ = []
-        for i in self.occupyingIdxpairDict.keys():
-            assert i in ids
-            if i not in self.sumo.vehicle.getIDList():
-                remove_occ.append(i)
-            else:
-                edgeID = self.sumo.vehicle.getRoadID(i)
-                if edgeID not in self.edgeIDList:
-                    continue
-                if edgeID == self.edgeIDList[self.occupyingIdxpairDict[i][1]]:
-                    remove_occ.append(i)
-
-
-        for i in remove_occ:
-            self.occupyingIdxpairDict.pop(i)
-
-        candidates = []
-        for i in self.priorityIdxpairDict.keys():
-            assert i not in self.occupyingIdxpairDict.keys()
-
-            edgeIdx, nextEdgeIdx = self.priorityIdxpairDict[i]
-            assert edgeIdx % 2 == 0
-            if nextEdgeIdx is not None:
-                assert nextEdgeIdx % 2 == 1
-
-            conflict = False
-            for j in self.occupyingIdxpairDict.keys():
-                edgeIdx2, nextEdgeIdx2 = self.occupyingIdxpairDict[j]
-                if (edgeIdx, nextEdgeIdx, edgeIdx2, nextEdgeIdx2) in self.conflictIdxList:
-                    conflict = True
-                    break
-            for j in candidates:
-                edgeIdx2, nextEdgeIdx2 = self.getEdgeIdxPair(j)
-                if (edgeIdx, nextEdgeIdx, edgeIdx2, nextEdgeIdx2) in self.conflictIdxList:
-                    conflict = True
-                    break
-
-            if conflict:
+            movement = self.getMovement(i, road_idx[rows[k]])
+            if movement is None:
                 continue
-
-            candidates.append(i)
-
-        for i in candidates:
-            self.priorityIdxpairDict.pop(i)
-            edgeIdx, nextEdgeIdx = self.getEdgeIdxPair(i)
-            if nextEdgeIdx is not None:
-                self.occupyingIdxpairDict[i] = (edgeIdx, nextEdgeIdx)
-            edgeID = self.edgeIDList[edgeIdx]
-            laneLength = self.sumo.lane.getLength(self.sumo.vehicle.getLaneID(i))
-            self.sumo.vehicle.setStop(i, edgeID, pos=laneLength - 1, duration=0)
-
-        return
+            laneID = index.lane_ids[lane[k]]
+            if self._setStop(i, laneID):
+                self.priorityMovementDict[i] = movement
+                self.stopLaneDict[i] = laneID
+
+        # ======== 批量冲突检测: 先一次性排除与已占用路口的车辆冲突的候选, 再在剩余候选之间按排队顺序贪心放行
+        pending = [i for i in self.priorityMovementDict.keys() if i in state]
+        for i in set(self.priorityMovementDict.keys()).difference(pending):
+            self.priorityMovementDict.pop(i)
+            self.stopLaneDict.pop(i)
+        if not pending:
+            return
+        movements = np.asarray([self.priorityMovementDict[i] for i in pending], dtype=np.int64)
+        occupying = np.asarray(list(self.occupyingMovementDict.values()), dtype=np.int64)
+        blocked = index.movement_foes(movements, occupying).any(axis=1)
+        mutual = index.movement_foes(movements, movements)
+
+        accepted = np.zeros(len(pending), dtype=bool)
+        for k in np.flatnonzero(~blocked):
+            if not mutual[k, accepted].any():
+                accepted[k] = True
+
+        for k in np.flatnonzero(accepted):
+            i = pending[k]
+            movement = self.priorityMovementDict.pop(i)
+            self.occupyingMovementDict[i] = movement
+            self.releasedEdgeDict[i] = int(index.movement_from[movement])
+            self._setStop(i, self.stopLaneDict.pop(i), duration=0)
@@ -0,0 +1,70 @@
+"""Per-step lane measurements filled from TraCI lane subscriptions."""
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import traci.constants as tc
+
+
+class LaneSnapshot:
+    """Last-step measurements of a set of lanes, refreshed once per simulation step.
+
+    Every lane is subscribed once, so all traffic signals read their density, queue, pressure and info metrics
+    from these arrays instead of issuing their own per-lane TraCI calls (lanes shared by several signals, and
+    metrics requested both for the observation and the info dict, are only queried once per step).
+
+    Arrays are indexed by the lane numbering of :class:`~sumo_rl.environment.network_index.NetworkIndex`; lanes
+    that are not subscribed stay at zero.
+    """
+
+    VARIABLES = (
+        tc.LAST_STEP_VEHICLE_NUMBER,
+        tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+        tc.LAST_STEP_LENGTH,
+        tc.LAST_STEP_VEHICLE_ID_LIST,
+    )
+
+    def __init__(self, sumo, network_index, lane_ids: Iterable[str]):
+        """Subscribe the lanes and allocate the arrays.
+
+        Args:
+            sumo: The TraCI connection (or libsumo module) of the simulation.
+            network_index (NetworkIndex): The static network metadata, giving the lane numbering.
+            lane_ids (Iterable[str]): Lanes to subscribe. Duplicates are ignored.
+        """
+        self.sumo = sumo
+        self.network_index = network_index
+        self.lane_ids = list(dict.fromkeys(lane_ids))
+        self._rows = {lane_id: network_index.lane_index[lane_id] for lane_id in self.lane_ids}
+
+        n = len(network_index.lane_ids)
+        self.vehicle_number = np.zeros(n, dtype=np.float64)
+        self.halting_number = np.zeros(n, dtype=np.float64)
+        self.mean_vehicle_length = np.zeros(n, dtype=np.float64)
+        self._vehicle_ids: Dict[str, Tuple[str, ...]] = {}
+
+        for lane_id in self.lane_ids:
+            self.sumo.lane.subscribe(lane_id, self.VARIABLES)
+
+    def update(self):
+        """Refresh the arrays from the subscription results of the last simulation step."""
+        results = self.sumo.lane.getAllSubscriptionResults()
+        for lane_id, values in results.items():
+            row = self._rows.get(lane_id)
+            if row is None:
+                continue
+            self.vehicle_number[row] = values[tc.LAST_STEP_VEHICLE_NUMBER]
+            self.halting_number[row] = values[tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+            self.mean_vehicle_length[row] = values[tc.LAST_STEP_LENGTH]
+            self._vehicle_ids[lane_id] = values[tc.LAST_STEP_VEHICLE_ID_LIST]
+
+    def indices(self, lane_ids: Iterable[str]) -> np.ndarray:
+        """Return the array indices of lanes, to gather their measurements at once."""
+        return np.asarray([self.network_index.lane_index[lane_id] for lane_id in lane_ids], dtype=np.int64)
+
+    def capacity(self, lane_idx: np.ndarray, min_gap: float) -> np.ndarray:
+        """Return how many vehicles of the current mean length fit in each lane."""
+        return self.network_index.lane_length[lane_idx] / (min_gap + self.mean_vehicle_length[lane_idx])
+
+    def vehicle_ids(self, lane_id: str) -> Tuple[str, ...]:
+        """Return the vehicles on a lane in the last step."""
+        return self._vehicle_ids.get(lane_id, ())
@@ -0,0 +1,183 @@
+"""Streaming writer of the per-step metrics of an episode."""
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+METRICS_FORMATS = ("csv", "parquet")
+
+
+class MetricsWriter:
+    """Fixed-schema metrics sink flushing chunks of rows to a CSV or Parquet file from a background thread.
+
+    Rows are written into preallocated column buffers of ``chunk_size`` rows. A full chunk is handed to the writer
+    thread and replaced by a fresh one, so the simulation loop never waits for the disk and memory stays bounded by
+    a few chunks whatever the episode length. At most ``max_pending`` chunks wait to be written; beyond that
+    :meth:`append` blocks until the thread catches up.
+
+    CSV files can be read while the episode runs (every flushed chunk is complete); Parquet files get one row group
+    per chunk but are only readable once :meth:`close` wrote their footer.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: Sequence[str],
+        dtypes: Optional[Mapping[str, type]] = None,
+        fmt: str = "csv",
+        chunk_size: int = 1024,
+        max_pending: int = 4,
+    ):
+        """Create the writer and start its thread. The file is created with the first flushed chunk.
+
+        Args:
+            path (str): Output file, its parent directories are created if needed.
+            columns (Sequence[str]): Column names, in file order. Keys of appended rows outside them are ignored.
+            dtypes (Optional[Mapping[str, type]]): dtype per column. Default: float64.
+            fmt (str): "csv" or "parquet" (requires pyarrow).
+            chunk_size (int): Number of rows per flushed chunk.
+            max_pending (int): Number of full chunks that may wait for the writer thread.
+        """
+        if fmt not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format {fmt}, expected one of {METRICS_FORMATS}")
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as ex:
+                raise ImportError("Writing metrics to Parquet requires the pyarrow package (pip install pyarrow)") from ex
+        self.path = path
+        self.columns = list(columns)
+        dtypes = dtypes or {}
+        self.dtypes: Dict[str, np.dtype] = {column: np.dtype(dtypes.get(column, np.float64)) for column in self.columns}
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.rows = 0  # rows appended so far
+        self.closed = False
+        self._error: Optional[BaseException] = None
+        self._chunk = self._new_chunk()
+        self._size = 0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name=f"MetricsWriter-{Path(path).name}", daemon=True)
+        self._thread.start()
+
+    def _new_chunk(self) -> Dict[str, np.ndarray]:
+        return {column: np.zeros(self.chunk_size, dtype=dtype) for column, dtype in self.dtypes.items()}
+
+    def append(self, row: Mapping[str, float]):
+        """Append one row. Missing columns are stored as 0."""
+        if self.closed:
+            raise ValueError(f"Append to the closed metrics writer of {self.path}")
+        i = self._size
+        for column, values in self._chunk.items():
+            values[i] = row.get(column, 0)
+        self._size += 1
+        self.rows += 1
+        if self._size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the rows buffered so far to the writer thread."""
+        if self._size == 0:
+            return
+        self._queue.put((self._chunk, self._size))
+        self._chunk = self._new_chunk()
+        self._size = 0
+
+    def _run(self):
+        parquet_writer = None
+        header = True
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue  # keep draining so append never blocks on a dead writer
+            chunk, size = item
+            try:
+                frame = pd.DataFrame({column: values[:size] for column, values in chunk.items()}, columns=self.columns)
+                if header:
+                    Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                if self.fmt == "csv":
+                    frame.to_csv(self.path, mode="w" if header else "a", header=header, index=False)
+                else:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    if parquet_writer is None:
+                        parquet_writer = pq.ParquetWriter(self.path, table.schema)
+                    parquet_writer.write_table(table)
+                header = False
+            except Exception as ex:
+                logging.warning(f"Fail to write metrics to {self.path}: {ex}")
+                self._error = ex
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    def close(self):
+        """Flush the remaining rows, wait for the writer thread and finish the file.
+
+        Raises:
+            Exception: The error that stopped the writer thread, if any.
+        """
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class MetricsMixin:
+    """Per-episode metrics files of an environment, written by a :class:`MetricsWriter`.
+
+    The environment provides ``out_csv_name``, ``label``, ``episode``, ``info_columns`` and ``metrics_format``.
+    """
+
+    def _open_metrics_writer(self):
+        if self.out_csv_name is None:
+            return
+        self.metrics_writer = MetricsWriter(
+            self._metrics_path(self.out_csv_name, self.episode),
+            self.info_columns,
+            dtypes={column: np.int64 for column in self.info_columns if column.endswith("_stopped")},
+            fmt=self.metrics_format,
+        )
+
+    def _metrics_path(self, out_csv_name, episode) -> str:
+        extension = ".parquet" if self.metrics_format == "parquet" else ".csv"
+        return out_csv_name + f"_conn{self.label}_ep{episode}" + extension
+
+    def save_csv(self, out_csv_name, episode):
+        """Finish the metrics file of the current episode and give it its final name.
+
+        Metrics are streamed to ``self.out_csv_name + f"_conn{label}_ep{self.episode}.csv"`` (or ``.parquet``)
+        while the episode runs. This flushes the remaining rows, closes the file and moves it to
+        ``out_csv_name + f"_conn{label}_ep{episode}.csv"`` when that name differs.
+
+        Args:
+            out_csv_name (str): Path prefix of the output file. E.g.: "results/my_results
+            episode (int): Episode number appended to the output file name.
+
+        Raises:
+            Exception: The error that stopped the metrics writer, if any.
+        """
+        writer = getattr(self, "metrics_writer", None)
+        if writer is None:
+            return
+        self.metrics_writer = None
+        writer.close()
+        if out_csv_name is None:
+            return
+        path = self._metrics_path(out_csv_name, episode)
+        if path != writer.path and os.path.exists(writer.path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            os.replace(writer.path, path)
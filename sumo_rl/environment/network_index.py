@@ -0,0 +1,297 @@
+"""Static road-network metadata read once from the .net.xml file."""
+import hashlib
+import logging
+import os
+import pickle
+import sys
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+if "SUMO_HOME" in os.environ:
+    tools = os.path.join(os.environ["SUMO_HOME"], "tools")
+    sys.path.append(tools)
+else:
+    raise ImportError("Please declare the environment variable 'SUMO_HOME'")
+import numpy as np
+import sumolib
+
+
+PhaseState = namedtuple("PhaseState", ["duration", "state"])
+
+
+def default_cache_dir() -> Path:
+    """Directory of the on-disk network cache, ``$SUMO_RL_CACHE_DIR`` or ``~/.cache/sumo_rl``."""
+    return Path(os.environ.get("SUMO_RL_CACHE_DIR", Path.home() / ".cache" / "sumo_rl"))
+
+
+def file_digest(path: str) -> str:
+    """Return the sha1 hex digest of a file."""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class NetworkIndex:
+    """Static geometry of a SUMO network: lanes, edges and their relations.
+
+    None of these values change during a simulation, so they are read once with sumolib and shared by every
+    module instead of being queried through TraCI. Lanes and edges (internal ones included) are numbered in
+    file order; ``lane_ids[i]`` / ``edge_ids[j]`` give back the string ids and the ``lane_*`` arrays are indexed
+    by lane number.
+
+    Use :meth:`load` rather than the constructor: indexes are memoized per process and cached on disk, keyed by
+    the sha1 of the net file, so a net is only parsed again when it changes.
+    """
+
+    # Bump whenever the pickled layout changes, so stale cache files are rebuilt.
+    CACHE_VERSION = 4
+
+    # junction types whose right of way is not given by a traffic light
+    UNSIGNALIZED_TYPES = ("priority", "priority_stop", "right_before_left", "left_before_right", "allway_stop",
+                          "unregulated", "zipper")
+
+    _instances: Dict[Tuple[str, str], "NetworkIndex"] = {}
+
+    def __init__(self, net_file: str, digest: Optional[str] = None):
+        """Parse ``net_file`` with sumolib and build the index."""
+        self.net_file = net_file
+        self.digest = digest if digest is not None else file_digest(net_file)
+        net = sumolib.net.readNet(net_file, withInternal=True)
+
+        self.edge_ids: List[str] = []
+        self.edge_lanes: Dict[str, List[str]] = {}
+        self.lane_ids: List[str] = []
+        lane_edge, lane_length, lane_max_speed = [], [], []
+        self.lane_shape: List[List[Tuple[float, float]]] = []
+        for edge in net.getEdges(withInternal=True):
+            edge_id = edge.getID()
+            self.edge_lanes[edge_id] = []
+            for lane in edge.getLanes():
+                self.edge_lanes[edge_id].append(lane.getID())
+                self.lane_ids.append(lane.getID())
+                lane_edge.append(len(self.edge_ids))
+                lane_length.append(lane.getLength())
+                lane_max_speed.append(lane.getSpeed())
+                self.lane_shape.append([tuple(point) for point in lane.getShape()])
+            self.edge_ids.append(edge_id)
+
+        self.edge_index = {edge_id: i for i, edge_id in enumerate(self.edge_ids)}
+        self.lane_index = {lane_id: i for i, lane_id in enumerate(self.lane_ids)}
+        self.lane_edge = np.asarray(lane_edge, dtype=np.int32)
+        self.lane_length = np.asarray(lane_length, dtype=np.float64)
+        self.lane_max_speed = np.asarray(lane_max_speed, dtype=np.float64)
+        self.lane_end = np.asarray([shape[-1] for shape in self.lane_shape], dtype=np.float64).reshape(-1, 2)
+
+        # routable (non-internal) edges and their successors, the graph SUMO's router works on
+        self.edge_length = np.zeros(len(self.edge_ids), dtype=np.float64)
+        self.edge_max_speed = np.zeros(len(self.edge_ids), dtype=np.float64)
+        self.edge_successors: Dict[str, List[str]] = {}
+        for edge in net.getEdges(withInternal=False):
+            edge_id = edge.getID()
+            self.edge_length[self.edge_index[edge_id]] = edge.getLength()
+            self.edge_max_speed[self.edge_index[edge_id]] = edge.getSpeed()
+            self.edge_successors[edge_id] = [successor.getID() for successor in edge.getOutgoing().keys()]
+
+        self._index_junctions(net)
+        self._index_traffic_lights(net)
+        self._phase_tables: Dict[Tuple[str, int], tuple] = {}
+
+    def _index_traffic_lights(self, net):
+        """Read the traffic lights: controlled lanes (by link index, as TraCI's getControlledLanes), outgoing lanes
+        and the phases of their first program."""
+        self.tls_ids: List[str] = sorted(tls.getID() for tls in net.getTrafficLights())  # TraCI's getIDList order
+        self.tls_lanes: Dict[str, List[str]] = {}
+        self.tls_out_lanes: Dict[str, List[str]] = {}
+        self.tls_program_id: Dict[str, str] = {}
+        self.tls_phases: Dict[str, List[PhaseState]] = {}
+        for tls in net.getTrafficLights():
+            tls_id = tls.getID()
+            links = {}  # link index -> (in lane, out lane) of its first connection
+            for in_lane, out_lane, link_index in tls.getConnections():
+                links.setdefault(link_index, (in_lane.getID(), out_lane.getID()))
+            links = [links[link_index] for link_index in sorted(links)]
+            self.tls_lanes[tls_id] = list(dict.fromkeys(in_lane for in_lane, _ in links))
+            self.tls_out_lanes[tls_id] = sorted({out_lane for _, out_lane in links})
+            program_id, program = next(iter(tls.getPrograms().items()))
+            self.tls_program_id[tls_id] = program_id
+            self.tls_phases[tls_id] = [PhaseState(phase.duration, phase.state) for phase in program.getPhases()]
+
+    def phase_table(self, tls_id: str, yellow_time: int) -> Tuple[List[PhaseState], List[PhaseState], Dict]:
+        """Return the green phases, all phases and yellow transitions of a traffic light, computed once per net.
+
+        Green phases are the program phases without yellow that are not all red. All phases are the green phases
+        (60s each) followed by one yellow phase per ordered pair of distinct green phases; ``yellow_dict[(i, j)]``
+        is the index in all phases of the transition from green phase ``i`` to ``j``.
+
+        Args:
+            tls_id (str): The traffic light.
+            yellow_time (int): Duration of the yellow phases.
+        """
+        key = (tls_id, yellow_time)
+        if key not in self._phase_tables:
+            green_phases = [
+                PhaseState(60, phase.state)
+                for phase in self.tls_phases[tls_id]
+                if "y" not in phase.state and (phase.state.count("r") + phase.state.count("s") != len(phase.state))
+            ]
+            all_phases = list(green_phases)
+            yellow_dict = {}
+            for i, p1 in enumerate(green_phases):
+                for j, p2 in enumerate(green_phases):
+                    if i == j:
+                        continue
+                    yellow_state = "".join(
+                        "y" if s1 in "Gg" and s2 in "rs" else s1 for s1, s2 in zip(p1.state, p2.state)
+                    )
+                    yellow_dict[(i, j)] = len(all_phases)
+                    all_phases.append(PhaseState(yellow_time, yellow_state))
+            self._phase_tables[key] = (green_phases, all_phases, yellow_dict)
+        return self._phase_tables[key]
+
+    def _index_junctions(self, net):
+        """Index the movements of every unsignalized junction and the foe relation between them.
+
+        A movement is an (incoming edge, outgoing edge) pair through a junction. Two movements of the same junction
+        are foes when any of their connections are foes in the junction's right-of-way requests, or when they merge
+        into the same outgoing edge (which includes a movement and itself). Movements are numbered globally; the
+        foe matrix of junction ``j`` is stored flat in ``junction_foes[junction_foe_offset[j]:]`` with shape
+        ``(junction_size[j], junction_size[j])`` and indexed by ``movement_local``.
+        """
+        self.junction_ids: List[str] = []
+        junction_center = []
+        self.junction_incoming: List[np.ndarray] = []
+        self.junction_outgoing: List[np.ndarray] = []
+        self.edge_junction = np.full(len(self.edge_ids), -1, dtype=np.int32)
+        self.movement_index: Dict[Tuple[int, int], int] = {}
+        movement_junction, movement_from, movement_to, movement_local = [], [], [], []
+        junction_foe_offset, junction_size, junction_foes = [], [], []
+        for node in net.getNodes():
+            if node.getType() not in self.UNSIGNALIZED_TYPES:
+                continue
+            links = {}  # (from edge, to edge) -> link indices of its connections
+            for edge in node.getIncoming():
+                if edge.getFunction() == "internal":
+                    continue
+                for connections in edge.getOutgoing().values():
+                    for conn in connections:
+                        key = (self.edge_index[conn.getFrom().getID()], self.edge_index[conn.getTo().getID()])
+                        links.setdefault(key, []).append(node.getLinkIndex(conn))
+            if len(links) < 2:
+                continue
+
+            j = len(self.junction_ids)
+            self.junction_ids.append(node.getID())
+            junction_center.append(node.getCoord()[:2])
+            movements = list(links.keys())
+            incoming = sorted({from_edge for from_edge, _ in movements})
+            self.junction_incoming.append(np.asarray(incoming, dtype=np.int32))
+            self.junction_outgoing.append(np.asarray(sorted({to_edge for _, to_edge in movements}), dtype=np.int32))
+            self.edge_junction[incoming] = j
+
+            foes = np.zeros((len(movements), len(movements)), dtype=bool)
+            for a, (_, to_a) in enumerate(movements):
+                for b, (_, to_b) in enumerate(movements):
+                    foes[a, b] = to_a == to_b or any(
+                        node.areFoes(link_a, link_b)
+                        for link_a in links[movements[a]]
+                        for link_b in links[movements[b]]
+                        if link_a >= 0 and link_b >= 0
+                    )
+            foes |= foes.T
+            junction_foe_offset.append(len(junction_foes))
+            junction_size.append(len(movements))
+            junction_foes.extend(foes.ravel())
+            for local, (from_edge, to_edge) in enumerate(movements):
+                self.movement_index[(from_edge, to_edge)] = len(movement_junction)
+                movement_junction.append(j)
+                movement_from.append(from_edge)
+                movement_to.append(to_edge)
+                movement_local.append(local)
+
+        self.junction_center = np.asarray(junction_center, dtype=np.float64).reshape(-1, 2)
+        self.junction_foe_offset = np.asarray(junction_foe_offset, dtype=np.int64)
+        self.junction_size = np.asarray(junction_size, dtype=np.int64)
+        self.junction_foes = np.asarray(junction_foes, dtype=bool)
+        self.movement_junction = np.asarray(movement_junction, dtype=np.int32)
+        self.movement_from = np.asarray(movement_from, dtype=np.int32)
+        self.movement_to = np.asarray(movement_to, dtype=np.int32)
+        self.movement_local = np.asarray(movement_local, dtype=np.int64)
+
+    @classmethod
+    def load(cls, net_file: str, cache_dir: Optional[str] = None) -> "NetworkIndex":
+        """Return the index of ``net_file``, from memory, from the disk cache, or freshly parsed.
+
+        Args:
+            net_file (str): SUMO .net.xml file
+            cache_dir (Optional[str]): Directory of the disk cache. Default: :func:`default_cache_dir`
+        """
+        digest = file_digest(net_file)
+        key = (os.path.abspath(net_file), digest)
+        if key in cls._instances:
+            return cls._instances[key]
+
+        cache_file = Path(cache_dir or default_cache_dir()) / f"{Path(net_file).stem}-{digest}.v{cls.CACHE_VERSION}.pkl"
+        index = None
+        if cache_file.exists():
+            try:
+                with open(cache_file, "rb") as f:
+                    index = pickle.load(f)
+                logging.info(f"Load network index of {net_file} from {cache_file}")
+            except Exception as ex:
+                logging.warning(f"Ignore unreadable network cache {cache_file}: {ex}")
+                index = None
+        if index is None:
+            index = cls(net_file, digest)
+            try:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_file, "wb") as f:
+                    pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file, cache_file)
+            except OSError as ex:
+                logging.warning(f"Fail to write network cache {cache_file}: {ex}")
+        index.net_file = net_file
+        cls._instances[key] = index
+        return index
+
+    def edge_of(self, lane_id: str) -> str:
+        """Return the edge a lane belongs to."""
+        return self.edge_ids[self.lane_edge[self.lane_index[lane_id]]]
+
+    def lanes_of(self, edge_id: str) -> List[str]:
+        """Return the lanes of an edge, ordered by lane index."""
+        return self.edge_lanes[edge_id]
+
+    def length(self, lane_id: str) -> float:
+        """Return the length of a lane."""
+        return float(self.lane_length[self.lane_index[lane_id]])
+
+    def max_speed(self, lane_id: str) -> float:
+        """Return the speed limit of a lane."""
+        return float(self.lane_max_speed[self.lane_index[lane_id]])
+
+    def free_flow_time(self, edge_id: str) -> float:
+        """Return the travel time of an edge at its speed limit."""
+        i = self.edge_index[edge_id]
+        return float(self.edge_length[i] / self.edge_max_speed[i])
+
+    def movement_foes(self, movements: np.ndarray, others: np.ndarray) -> np.ndarray:
+        """Return whether ``movements[i]`` and ``others[k]`` are foes, as a ``(len(movements), len(others))`` array.
+
+        Movements through different junctions are never foes.
+        """
+        movements = np.asarray(movements, dtype=np.int64)[:, None]
+        others = np.asarray(others, dtype=np.int64)[None, :]
+        junction = self.movement_junction[movements]
+        same = junction == self.movement_junction[others]
+        flat = self.junction_foe_offset[junction] + self.movement_local[movements] * self.junction_size[junction]
+        flat = flat + self.movement_local[others]
+        return same & self.junction_foes[np.where(same, flat, 0)]
+
+    def shape(self, lane_id: str) -> List[Tuple[float, float]]:
+        """Return the shape (list of 2D points) of a lane."""
+        return self.lane_shape[self.lane_index[lane_id]]
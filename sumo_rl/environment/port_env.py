@@ -3,8 +3,7 @@ import logging
 import os
 import time
 import sys
-from pathlib import Path
-from typing import Callable, Optional, Tuple, Union
+from typing import Callable, List, Optional, Sequence, Tuple, Union
 import configparser
 
 if "SUMO_HOME" in os.environ:
@@ -14,17 +13,26 @@ else:
     raise ImportError("Please declare the environment variable 'SUMO_HOME'")
 import gymnasium as gym
 import numpy as np
-import pandas as pd
 import sumolib
 import traci
 
 from .observations import DefaultObservationFunction, ObservationFunction
 from .traffic_signal import TrafficSignal
+from .network_index import NetworkIndex
+from .backend import LIBSUMO_AS_TRACI, make_backend
 from .vehicle import *
 from .schedule import *
 from .intersection_controller import *
+from .vehicle_state import VehicleStateTable
+from .lane_snapshot import LaneSnapshot
+from .waiting_time import WaitingTimeTracker
+from .metrics import MetricsMixin
+from .profiler import StepProfiler
+from .simulation import SimulationMixin
+from .fleet_observation import FleetObservation
+from .insertion import InsertionQueue, stagger
 
-LIBSUMO = "LIBSUMO_AS_TRACI" in os.environ
+LIBSUMO = LIBSUMO_AS_TRACI  # process-wide default, the backend itself is chosen per instance
 
 
 class myconf(configparser.ConfigParser):
@@ -34,10 +42,11 @@ class myconf(configparser.ConfigParser):
         return optionstr
 
 
-class SumoEnvironment(gym.Env):
+class SumoEnvironment(MetricsMixin, SimulationMixin, gym.Env):
     metadata = { "render_modes": ["human", "rgb_array"], }
 
     CONNECTION_LABEL = 0  # For traci multi-client support
+    RESET_MODES = ("restart", "reload", "snapshot")
 
     def __init__(
         self,
@@ -61,6 +70,11 @@ class SumoEnvironment(gym.Env):
         sumo_warnings: bool = True,
         additional_sumo_cmd: Optional[str] = None,
         render_mode: Optional[str] = None,
+        sumo_backend: Optional[str] = None,
+        reset_mode: Optional[str] = None,
+        metrics_format: str = "csv",
+        profile: bool = False,
+        slow_step_threshold: Optional[float] = None,
     ) -> None:
         """Initialize the environment."""
         assert render_mode is None or render_mode in self.metadata["render_modes"], "Invalid render mode."
@@ -82,6 +96,19 @@ class SumoEnvironment(gym.Env):
 
         assert delta_time > yellow_time, "Time between actions must be at least greater than yellow time."
 
+        self.edges_start_default = [edge.strip() for edge in self.cf.get("SUMO", "edges_start_default").split(",")]
+        self.route_cache_size = self.cf.getint("SCHEDULE", "route_cache_size", fallback=1024)
+        self.precompute_routes = self.cf.getboolean("SCHEDULE", "precompute_routes", fallback=False)
+        self.service_time = self.cf.getfloat("SCHEDULE", "service_time", fallback=10)  # seconds a truck stops at its destination
+        self.router = self.cf.get("SCHEDULE", "router", fallback="local")  # "local" (in-process A*) or "sumo" (findRoute)
+        if self.router not in ("local", "sumo"):
+            raise ValueError(f"Unknown router {self.router}, expected local or sumo")
+        self.router_landmarks = self.cf.getint("SCHEDULE", "router_landmarks", fallback=8)
+        self.router_smoothing = self.cf.getfloat("SCHEDULE", "router_smoothing", fallback=0.1)
+        self.reroute_period = self.cf.getfloat("SCHEDULE", "reroute_period", fallback=30)  # seconds, 0 disables rerouting
+        self.congestion_factor = self.cf.getfloat("SCHEDULE", "congestion_factor", fallback=2.0)
+        # reservation based right of way at unsignalized junctions, see IntersectionController
+        self.intersection_control = self.cf.getboolean("SCHEDULE", "intersection_control", fallback=False)
         self.begin_time = self.cf.getint("SUMO", "begin_time")
         self.sim_max_time = self.begin_time + self.cf.getint("SUMO", "num_seconds")
         self.delta_time = self.cf.getint("SUMO", "delta_time")  # seconds on sumo at each step
@@ -102,166 +129,178 @@ class SumoEnvironment(gym.Env):
         self.label = str(SumoEnvironment.CONNECTION_LABEL)
         SumoEnvironment.CONNECTION_LABEL += 1
         self.sumo = None
-
-        if LIBSUMO:
-            traci.start([sumolib.checkBinary("sumo"), "-n", self._net])  # Start only to retrieve traffic light information
-            conn = traci
-        else:
-            traci.start([sumolib.checkBinary("sumo"), "-n", self._net], label="init_connection" + self.label)
-            conn = traci.getConnection("init_connection" + self.label)
-
-        self.ts_ids = list(conn.trafficlight.getIDList())
+        self.backend = make_backend(sumo_backend or self.cf.get("SUMO", "backend", fallback=None), self.label)
+        if self.backend.name == "libsumo" and (self.use_gui or self.render_mode is not None):
+            raise ValueError("sumo-gui and rendering are not available with the libsumo backend")
+        self.reset_mode = reset_mode or self.cf.get("SUMO", "reset_mode", fallback="restart")
+        if self.reset_mode not in self.RESET_MODES:
+            raise ValueError(f"Unknown reset mode {self.reset_mode}, expected one of {self.RESET_MODES}")
+        self._snapshot_file = None
+        self.network_index = NetworkIndex.load(self._net)
+
+        self.ts_ids = list(self.network_index.tls_ids)
         self.observation_class = observation_class
 
-        if isinstance(self.reward_fn, dict):
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn[ts],
-                    conn,
-                )
-                for ts in self.reward_fn.keys()
-            }
-        else:
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn,
-                    conn,
-                )
-                for ts in self.ts_ids
-            }
-
-        conn.close()
-
-        self.vehicles = dict()
+        # traffic lights are read from the net file, the simulation is only started on reset
+        self.traffic_signals = self._build_traffic_signals(None)
+
+        self.waiting_time_tracker = None
         self.reward_range = (-float("inf"), float("inf"))
         self.episode = 0
-        self.metrics = []
         self.out_csv_name = out_csv_name
+        self.metrics_format = metrics_format
+        self.metrics_writer = None
+        self.profiler = StepProfiler(profile, slow_step_threshold)
+        self._state_encoders = {}  # ts id and (phases, observation size) -> shared StateEncoder
+        # fixed info schema, so the metrics are streamed to fixed columns and the per-signal keys are built once
+        self._agent_info_keys = {
+            ts: (f"{ts}_stopped", f"{ts}_accumulated_waiting_time", f"{ts}_average_speed") for ts in self.ts_ids
+        }
+        self.info_columns = ["step"]
+        if self.add_system_info:
+            self.info_columns += [
+                "system_total_stopped",
+                "system_total_waiting_time",
+                "system_mean_waiting_time",
+                "system_mean_speed",
+            ]
+        if self.add_per_agent_info:
+            self.info_columns += [key for ts in self.ts_ids for key in self._agent_info_keys[ts]]
+            self.info_columns += ["agents_total_stopped", "agents_total_accumulated_waiting_time"]
         self.observations = {ts: None for ts in self.ts_ids}
         self.rewards = {ts: None for ts in self.ts_ids}
         self.intersection_controller = None
+        self.vehicle_state = None
+        self.fleet_observation = None
+        self.lane_snapshot = None
 
 
-    def _start_simulation(self):
-        sumo_cmd = [
-            self._sumo_binary,
-            "-n",
-            self._net,
-            "-r",
-            self._route,
-            "--max-depart-delay",
-            str(self.max_depart_delay),
-            "--waiting-time-memory",
-            str(self.waiting_time_memory),
-            "--time-to-teleport",
-            str(self.time_to_teleport),
-        ]
-        if self.begin_time > 0:
-            sumo_cmd.append(f"-b {self.begin_time}")
-        if self.sumo_seed == "random":
-            sumo_cmd.append("--random")
-        else:
-            sumo_cmd.extend(["--seed", str(self.sumo_seed)])
-        if not self.sumo_warnings:
-            sumo_cmd.append("--no-warnings")
-        if self.additional_sumo_cmd is not None:
-            sumo_cmd.extend(self.additional_sumo_cmd.split())
-        if self.use_gui or self.render_mode is not None:
-            sumo_cmd.extend(["--start", "--quit-on-end"])
-            if self.render_mode == "rgb_array":
-                sumo_cmd.extend(["--window-size", f"{self.virtual_display[0]},{self.virtual_display[1]}"])
-                from pyvirtualdisplay.smartdisplay import SmartDisplay
-
-                print("Creating a virtual display.")
-                self.disp = SmartDisplay(size=self.virtual_display)
-                self.disp.start()
-                print("Virtual display started.")
-
-        if LIBSUMO:
-            traci.start(sumo_cmd)
-            self.sumo = traci
-        else:
-            traci.start(sumo_cmd, label=self.label)
-            self.sumo = traci.getConnection(self.label)
-        self.Scheduler = Scheduler(self)
-
-        if self.use_gui or self.render_mode is not None:
-            self.sumo.gui.setSchema(traci.gui.DEFAULT_VIEW, "real world")
-        self.intersection_controller = IntersectionController(self.sumo)
+    def _setup_episode(self, rebuild: bool):
+        """Create the per-episode objects, or re-initialise them when the simulation was reset in place.
 
+        The scheduler (whose route precomputation is expensive) is only built when ``rebuild`` is True; otherwise
+        it keeps its destinations and route cache and only has its tasks reset. Traffic signals are built once from
+        the network index and reset for every episode.
+        """
+        self.vehicle_state = VehicleStateTable(
+            self.sumo, road_ids=self.network_index.edge_ids, lane_ids=self.network_index.lane_ids
+        )
+        for ts in self.traffic_signals.values():
+            ts.reset(self.sumo)
+        if rebuild:
+            self.Scheduler = Scheduler(self)
+        else:
+            self.Scheduler.reset(self.sumo)
+        self.fleet_observation = FleetObservation(self)
+        self.intersection_controller = IntersectionController(self) if self.intersection_control else None
+        self.trucks = dict()
+        self._idle_trucks = set()  # trucks without a task (failed dispatch), retried at every simulation step
+        self.insertion_queue = InsertionQueue(self.network_index, self.vehicle_state)
+        self._depot_routes = {}  # depot edge -> id of the single-edge route trucks are added on
+        self._queued_trucks = 0
+        self._next_reroute = self.sim_step + self.reroute_period
+        self.lane_snapshot = LaneSnapshot(
+            self.sumo,
+            self.network_index,
+            [lane for ts in self.traffic_signals.values() for lane in ts.lanes + ts.out_lanes],
+        )
+        self.waiting_time_tracker = WaitingTimeTracker(self.vehicle_state)
+        self.vehicle_state.subscribe(self.sumo.vehicle.getIDList())  # vehicles restored from a snapshot
+        self.vehicle_state.update()
+        self.waiting_time_tracker.update()
+        self.lane_snapshot.update()
 
     def reset(self, seed: Optional[int] = None, **kwargs):
         """Reset the environment."""
         super().reset(seed=seed, **kwargs)
 
         if self.episode != 0:
-            self.close()
+            if self.reset_mode == "restart":
+                self.close()
             self.save_csv(self.out_csv_name, self.episode)
+            self.profiler.end_episode()
         self.episode += 1
-        self.metrics = []
+        self._open_metrics_writer()
 
         if seed is not None:
             self.sumo_seed = seed
-        self._start_simulation()
-
-        if isinstance(self.reward_fn, dict):
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn[ts],
-                    self.sumo,
-                )
-                for ts in self.reward_fn.keys()
-            }
+        if self.sumo is None:
+            self._start_simulation()
+            self._setup_episode(rebuild=True)
+            if self.reset_mode == "snapshot":
+                self._save_snapshot()
         else:
-            self.traffic_signals = {
-                ts: TrafficSignal(
-                    self,
-                    ts,
-                    self.delta_time,
-                    self.yellow_time,
-                    self.min_green,
-                    self.max_green,
-                    self.begin_time,
-                    self.reward_fn,
-                    self.sumo,
-                )
-                for ts in self.ts_ids
-            }
-
-        self.vehicles = dict()
+            self._restore_simulation()
+            self._setup_episode(rebuild=False)
 
         if self.single_agent:
             return self._compute_observations()[self.ts_ids[0]], self._compute_info()
         else:
             return self._compute_observations()
 
-    def _add_truck(self, truck_id, task: Union[str, list, None]):
-        truck = Truck(self, truck_id, task)
+    def _add_truck(self, truck_id, task: Union[str, list, None], depot: Optional[str] = None):
+        truck = Truck(self, truck_id, task, depot)
         # info = truck._get_info()
         self.trucks[truck_id] = truck
+        if truck.idle:
+            self._idle_trucks.add(truck_id)
         logging.info(f"add new truck {truck_id} in sumoenv and apply task")
 
+    def depot_route(self, depot: str) -> str:
+        """Return the id of a single-edge route starting at ``depot``, adding it to the simulation on first use."""
+        route_id = self._depot_routes.get(depot)
+        if route_id is None:
+            route_id = f"depot_{depot}"
+            self.sumo.route.add(route_id, [depot])
+            self._depot_routes[depot] = route_id
+        return route_id
+
+    def add_trucks(
+        self, n: int, depots: Optional[Sequence[str]] = None, interval: float = 1.0, prefix: str = "truck"
+    ) -> List[str]:
+        """Queue ``n`` trucks to enter the network, spread over several depots and insertion times.
+
+        Truck ``i`` starts at ``depots[i % len(depots)]`` and is released ``(i // len(depots)) * interval`` seconds
+        from now; it is only added to SUMO once its depot has room for it (see
+        :class:`~sumo_rl.environment.insertion.InsertionQueue`), and gets its task and route when added. With the
+        default ``router = local`` each route is planned then by A* over the live travel times; the routes between
+        the depots and the task edges are only precomputed for ``router = sumo`` with ``precompute_routes`` on.
+
+        Args:
+            n (int): Number of trucks.
+            depots (Optional[Sequence[str]]): Origin edges. Default: ``edges_start_default`` of the config.
+            interval (float): Seconds between two releases at the same depot.
+            prefix (str): Prefix of the truck ids, followed by a counter unique in the episode.
+
+        Returns:
+            List[str]: The ids of the queued trucks.
+        """
+        depots = list(dict.fromkeys(depots or self.edges_start_default))
+        unknown = [depot for depot in depots if depot not in self.network_index.edge_successors]
+        if unknown:
+            logging.warning(f"Ignore unknown depot edges {unknown}")
+            depots = [depot for depot in depots if depot not in unknown]
+        if not depots:
+            raise ValueError("add_trucks needs at least one valid depot edge")
+        self.Scheduler.add_insertion_edges(depots)
+
+        truck_ids = []
+        for depot, release_time in stagger(n, depots, self.sim_step, interval):
+            truck_id = f"{prefix}_{self._queued_trucks}"
+            self._queued_trucks += 1
+            self.insertion_queue.push(truck_id, depot, release_time)
+            truck_ids.append(truck_id)
+        logging.info(f"Queue {n} trucks at depots {depots}, {len(self.insertion_queue)} trucks waiting to enter")
+        return truck_ids
+
+    def _insert_trucks(self):
+        for truck_id, depot, task in self.insertion_queue.pop_ready(self.sim_step):
+            try:
+                self._add_truck(truck_id, task, depot)
+            except Exception as ex:
+                logging.warning(f"Fail to insert truck {truck_id} at depot {depot}: {ex}")
+                self.insertion_queue.cancel(truck_id)
+
     def get_current_vehicles(self):
         vehicle_ids = self.sumo.vehicle.getIDList()
         print(f"------------------------ Time = { self.sumo.simulation.getTime()},"
@@ -281,6 +320,33 @@ class SumoEnvironment(gym.Env):
 
     def _sumo_step(self):
         self.sumo.simulationStep()
+        self.vehicle_state.update()
+        self.waiting_time_tracker.update()
+        self.lane_snapshot.update()
+        self.Scheduler.observe_traffic(self.vehicle_state)
+
+    def _handle_stop_events(self):
+        """Start/finish truck tasks from the stops that started/ended in the last simulation step.
+
+        Only trucks with an actual stop event are touched; finished trucks are given a new task. Trucks left
+        without a task (no valid task, failed routing) get no further stop event, so they are retried here at
+        every simulation step until a task is applied or they leave the network.
+        """
+        for vehicle_id in self.vehicle_state.stop_starting:
+            if vehicle_id in self.trucks:
+                self.trucks[vehicle_id]._on_stop_start()
+        for vehicle_id in self.vehicle_state.stop_ending:
+            if vehicle_id in self.trucks and self.trucks[vehicle_id]._on_stop_end():
+                self._idle_trucks.add(vehicle_id)
+        self._idle_trucks.difference_update(self.vehicle_state.arrived)
+        if not self._idle_trucks:
+            return
+        idle = [self.trucks[vehicle_id] for vehicle_id in self._idle_trucks]
+        tasks = self.Scheduler.dispatch_many(idle)
+        for truck in idle:
+            truck._apply_task(task=tasks[truck.vehicle_id])
+            if not truck.idle:
+                self._idle_trucks.discard(truck.vehicle_id)
 
     def _apply_actions(self, actions):
         """
@@ -291,31 +357,43 @@ class SumoEnvironment(gym.Env):
     def step(self, action = Union[dict, int]):
         """Apply the action(s) and then step the simulation for delta_time seconds.
             action (Union[dict, int]): action(s) to be applied to the environment.
+
+        The info holds the batched truck observation for policy inference: ``fleet_observation`` (float32, one row
+        per truck), ``fleet_mask`` (rows holding a truck) and ``fleet_vehicle_ids`` (truck of every row). The arrays
+        are reused by the next step, copy them to keep them.
         """
+        self.profiler.begin_step()
         logging.info(f"------------------------ Time = { self.sumo.simulation.getTime()}, sumoEnv step with action {action} ------------------------")
-        self._apply_actions(action)
+        with self.profiler.phase("act"):
+            self._apply_actions(action)
 
         for _ in range(self.delta_time):
-            for id in self.sumo.vehicle.getIDList():
-                #
-                self.trucks[id]._check_task_start()
-                task_finished = self.trucks[id]._check_task_finish()
-                if task_finished:
-                    self.trucks[id]._apply_task(task=None)
-                self.trucks[id].\
-                    _get_observation_()
-            #
-        # self.intersection_controller.step()
-        self._sumo_step()
-
-        self._sumo_step()
-
-        observations = self._compute_observations()
-        rewards = self._compute_rewards()
+            with self.profiler.phase("simulate"):
+                self._sumo_step()
+            if self.intersection_controller is not None:
+                with self.profiler.phase("junction"):
+                    self.intersection_controller.step()
+            with self.profiler.phase("dispatch"):
+                self._handle_stop_events()
+                self._insert_trucks()
+        if self.reroute_period > 0 and self.sim_step >= self._next_reroute:
+            self._next_reroute = self.sim_step + self.reroute_period
+            with self.profiler.phase("reroute"):
+                self.Scheduler.reroute_congested(self.trucks, self.vehicle_state, self.congestion_factor)
+        with self.profiler.phase("observe"):
+            fleet_observation, fleet_mask = self.compute_fleet_observation()
+            observations = self._compute_observations()
+        with self.profiler.phase("reward"):
+            rewards = self._compute_rewards()
         dones = self._compute_dones()
         terminated = False  # there are no 'terminal' states in this environment
         truncated = dones["__all__"]  # episode ends when sim_step >= max_steps
-        info = self._compute_info()
+        with self.profiler.phase("info"):
+            info = self._compute_info()
+        info["fleet_observation"] = fleet_observation
+        info["fleet_mask"] = fleet_mask
+        info["fleet_vehicle_ids"] = self.fleet_observation.vehicle_ids
+        info.update(self.profiler.end_step(self.sim_step))
         return observations, rewards, dones, info
 
     def _compute_dones(self):
@@ -329,7 +407,8 @@ class SumoEnvironment(gym.Env):
             info.update(self._get_system_info())
         if self.add_per_agent_info:
             info.update(self._get_per_agent_info())
-        self.metrics.append(info.copy())
+        if self.metrics_writer is not None:
+            self.metrics_writer.append(info)
         return info
 
     def _compute_observations(self):
@@ -344,6 +423,16 @@ class SumoEnvironment(gym.Env):
         )
         return {ts: self.rewards[ts] for ts in self.rewards.keys() if self.traffic_signals[ts].time_to_act}
 
+    def compute_fleet_observation(self):
+        """Compute the observation of every truck in one batch.
+
+        Returns:
+            observation (np.ndarray): float32 array of shape (capacity, n_features), rows aligned with
+                ``self.fleet_observation.vehicle_ids``.
+            mask (np.ndarray): bool array of shape (capacity,), True for rows holding a truck.
+        """
+        return self.fleet_observation.build()
+
     @property
     def observation_space(self):
         """Return the observation space of a traffic signal.
@@ -370,15 +459,14 @@ class SumoEnvironment(gym.Env):
 
 
     def _get_system_info(self):
-        vehicles = self.sumo.vehicle.getIDList()
-        speeds = [self.sumo.vehicle.getSpeed(vehicle) for vehicle in vehicles]
-        waiting_times = [self.sumo.vehicle.getWaitingTime(vehicle) for vehicle in vehicles]
+        speeds = self.vehicle_state.speeds
+        waiting_times = self.vehicle_state.waiting_times
         return {
             # In SUMO, a vehicle is considered halting if its speed is below 0.1 m/s
-            "system_total_stopped": sum(int(speed < 0.1) for speed in speeds),
-            "system_total_waiting_time": sum(waiting_times),
-            "system_mean_waiting_time": 0.0 if len(vehicles) == 0 else np.mean(waiting_times),
-            "system_mean_speed": 0.0 if len(vehicles) == 0 else np.mean(speeds),
+            "system_total_stopped": int(np.sum(speeds < 0.1)),
+            "system_total_waiting_time": float(np.sum(waiting_times)),
+            "system_mean_waiting_time": 0.0 if len(speeds) == 0 else float(np.mean(waiting_times)),
+            "system_mean_speed": 0.0 if len(speeds) == 0 else float(np.mean(speeds)),
         }
 
     def _get_per_agent_info(self):
@@ -389,32 +477,14 @@ class SumoEnvironment(gym.Env):
         average_speed = [self.traffic_signals[ts].get_average_speed() for ts in self.ts_ids]
         info = {}
         for i, ts in enumerate(self.ts_ids):
-            info[f"{ts}_stopped"] = stopped[i]
-            info[f"{ts}_accumulated_waiting_time"] = accumulated_waiting_time[i]
-            info[f"{ts}_average_speed"] = average_speed[i]
+            stopped_key, waiting_time_key, speed_key = self._agent_info_keys[ts]
+            info[stopped_key] = stopped[i]
+            info[waiting_time_key] = accumulated_waiting_time[i]
+            info[speed_key] = average_speed[i]
         info["agents_total_stopped"] = sum(stopped)
         info["agents_total_accumulated_waiting_time"] = sum(accumulated_waiting_time)
         return info
 
-    def close(self):
-        """Close the environment and stop the SUMO simulation."""
-        if self.sumo is None:
-            return
-
-        if not LIBSUMO:
-            traci.switch(self.label)
-        traci.close()
-
-        if self.disp is not None:
-            self.disp.stop()
-            self.disp = None
-
-        self.sumo = None
-
-    def __del__(self):
-        """Close the environment and stop the SUMO simulation."""
-        self.close()
-
     def render(self):
         """Render the environment.
 
@@ -429,28 +499,3 @@ class SumoEnvironment(gym.Env):
             #                          height=self.virtual_display[1])
             img = self.disp.grab()
             return np.array(img)
-
-    def save_csv(self, out_csv_name, episode):
-        """Save metrics of the simulation to a .csv file.
-
-        Args:
-            out_csv_name (str): Path to the output .csv file. E.g.: "results/my_results
-            episode (int): Episode number to be appended to the output file name.
-        """
-        if out_csv_name is not None:
-            df = pd.DataFrame(self.metrics)
-            Path(Path(out_csv_name).parent).mkdir(parents=True, exist_ok=True)
-            df.to_csv(out_csv_name + f"_conn{self.label}_ep{episode}" + ".csv", index=False)
-
-    # Below functions are for discrete state space
-
-    def encode(self, state, ts_id):
-        """Encode the state of the traffic signal into a hashable object."""
-        phase = int(np.where(state[: self.traffic_signals[ts_id].num_green_phases] == 1)[0])
-        min_green = state[self.traffic_signals[ts_id].num_green_phases]
-        density_queue = [self._discretize_density(d) for d in state[self.traffic_signals[ts_id].num_green_phases + 1 :]]
-        # tuples are hashable and can be used as key in python dictionary
-        return tuple([phase, min_green] + density_queue)
-
-    def _discretize_density(self, density):
-        return min(int(density * 10), 9)
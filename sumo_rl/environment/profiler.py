@@ -0,0 +1,227 @@
+"""Opt-in profiling of the environment steps and of the TraCI calls they make."""
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+
+class _ProfiledDomain:
+    """Proxy of a TraCI domain (``vehicle``, ``lane``, ...) timing every method call."""
+
+    def __init__(self, domain, name: str, profiler: "StepProfiler"):
+        self._domain = domain
+        self._name = name
+        self._profiler = profiler
+
+    def __getattr__(self, command: str):
+        attribute = getattr(self._domain, command)
+        if not callable(attribute) or isinstance(attribute, type):
+            return attribute  # constants and classes such as trafficlight.Phase
+        wrapped = self._profiler._timed(attribute, self._name, command)
+        setattr(self, command, wrapped)  # later lookups skip __getattr__
+        return wrapped
+
+
+class ProfiledConnection:
+    """Proxy of a TraCI connection (or of the libsumo module) counting calls and latency per domain and command.
+
+    Top-level functions such as ``simulationStep`` are accounted to the "simulation" domain.
+    """
+
+    def __init__(self, sumo, profiler: "StepProfiler"):
+        self._sumo = sumo
+        self._profiler = profiler
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._sumo, name)
+        if hasattr(attribute, "subscribe"):  # a domain: an object for traci, a class for libsumo
+            wrapped = _ProfiledDomain(attribute, name, self._profiler)
+        elif callable(attribute) and not isinstance(attribute, type):
+            wrapped = self._profiler._timed(attribute, "simulation", name)
+        else:
+            return attribute
+        setattr(self, name, wrapped)
+        return wrapped
+
+
+class StepProfiler:
+    """Times the phases of every environment step and the TraCI calls made during it.
+
+    Phases are timed with :meth:`phase` and TraCI calls through the connection returned by :meth:`wrap`. At the
+    end of every step :meth:`end_step` returns the step breakdown (added to the info dict by the environments),
+    and logs it as a warning when the step took longer than ``slow_step_threshold``. :meth:`end_episode` builds
+    the report of the whole episode.
+
+    When disabled, :meth:`wrap` returns the connection itself and :meth:`phase` a no-op context, so profiling
+    costs nothing unless it is turned on.
+    """
+
+    def __init__(self, enabled: bool = False, slow_step_threshold: Optional[float] = None, top_commands: int = 10):
+        """Initialize the profiler.
+
+        Args:
+            enabled (bool): Whether steps and TraCI calls are profiled.
+            slow_step_threshold (Optional[float]): Steps longer than this many (wall clock) seconds are logged with
+                their breakdown. Default: None (never).
+            top_commands (int): Number of TraCI commands listed in slow step logs and episode reports.
+        """
+        self.enabled = enabled
+        self.slow_step_threshold = slow_step_threshold
+        self.top_commands = top_commands
+        self.last_report: Optional[dict] = None
+        self._null = nullcontext()
+        self._reset_episode()
+        self._reset_step()
+
+    def _reset_episode(self):
+        self.steps = 0
+        self.slow_steps = 0
+        self.step_time = 0.0
+        self.phase_times: Dict[str, float] = {}
+        self.calls: Dict[Tuple[str, str], List[float]] = {}  # (domain, command) -> [count, seconds]
+        self._slowest: List[Tuple[float, float]] = []  # (seconds, simulation time)
+
+    def _reset_step(self):
+        self._step_start = time.perf_counter()
+        self._step_phases: Dict[str, float] = {}
+        self._step_calls: Dict[Tuple[str, str], List[float]] = {}
+
+    def wrap(self, sumo):
+        """Return ``sumo`` wrapped to account every TraCI call, or ``sumo`` itself when disabled."""
+        if not self.enabled or sumo is None:
+            return sumo
+        return ProfiledConnection(sumo, self)
+
+    def _timed(self, function, domain: str, command: str):
+        key = (domain, command)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stats = self._step_calls.get(key)
+                if stats is None:
+                    self._step_calls[key] = [1, elapsed]
+                else:
+                    stats[0] += 1
+                    stats[1] += elapsed
+
+        return timed
+
+    def phase(self, name: str):
+        """Context timing one phase of the current step; a phase entered several times per step accumulates."""
+        if not self.enabled:
+            return self._null
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._step_phases[name] = self._step_phases.get(name, 0.0) + time.perf_counter() - start
+
+    def begin_step(self):
+        """Start timing a new step."""
+        if self.enabled:
+            self._reset_step()
+
+    def end_step(self, sim_time: float) -> Dict[str, float]:
+        """Finish the current step and return its breakdown (empty when disabled).
+
+        Args:
+            sim_time (float): Simulation time at the end of the step, used in the slow step log.
+
+        Returns:
+            dict: ``profile_step_time``, ``profile_<phase>_time`` per phase, ``profile_traci_calls`` and
+                ``profile_traci_time``, all times in seconds.
+        """
+        if not self.enabled:
+            return {}
+        elapsed = time.perf_counter() - self._step_start
+        traci_calls = sum(int(count) for count, _ in self._step_calls.values())
+        traci_time = sum(seconds for _, seconds in self._step_calls.values())
+        stats = {"profile_step_time": elapsed}
+        stats.update({f"profile_{name}_time": seconds for name, seconds in self._step_phases.items()})
+        stats["profile_traci_calls"] = traci_calls
+        stats["profile_traci_time"] = traci_time
+
+        self.steps += 1
+        self.step_time += elapsed
+        for name, seconds in self._step_phases.items():
+            self.phase_times[name] = self.phase_times.get(name, 0.0) + seconds
+        for key, (count, seconds) in self._step_calls.items():
+            totals = self.calls.setdefault(key, [0, 0.0])
+            totals[0] += count
+            totals[1] += seconds
+        self._slowest = sorted(self._slowest + [(elapsed, sim_time)], reverse=True)[: self.top_commands]
+
+        if self.slow_step_threshold is not None and elapsed > self.slow_step_threshold:
+            self.slow_steps += 1
+            phases = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self._step_phases.items())
+            commands = ", ".join(
+                f"{domain}.{command} x{int(count)} {seconds * 1000:.1f}ms"
+                for (domain, command), (count, seconds) in self._top(self._step_calls)
+            )
+            logging.warning(
+                f"Slow step at {sim_time}: {elapsed * 1000:.1f}ms (phases: {phases}; "
+                f"traci {traci_calls} calls {traci_time * 1000:.1f}ms: {commands})"
+            )
+        self._reset_step()
+        return stats
+
+    def _top(self, calls: Dict[Tuple[str, str], List[float]]):
+        return sorted(calls.items(), key=lambda item: item[1][1], reverse=True)[: self.top_commands]
+
+    def report(self) -> dict:
+        """Return the profile of the episode so far.
+
+        Returns:
+            dict: ``steps``, ``slow_steps``, ``step_time`` (total seconds), ``phases`` (phase -> total seconds),
+                ``traci`` ("domain.command" -> {"calls", "time", "mean"}, slowest first) and ``slowest_steps``
+                (list of (seconds, simulation time)).
+        """
+        return {
+            "steps": self.steps,
+            "slow_steps": self.slow_steps,
+            "step_time": self.step_time,
+            "phases": dict(self.phase_times),
+            "traci": {
+                f"{domain}.{command}": {"calls": int(count), "time": seconds, "mean": seconds / count}
+                for (domain, command), (count, seconds) in sorted(
+                    self.calls.items(), key=lambda item: item[1][1], reverse=True
+                )
+            },
+            "slowest_steps": list(self._slowest),
+        }
+
+    def format_report(self, report: Optional[dict] = None) -> str:
+        """Return a report (default: the episode so far) as readable text."""
+        report = report or self.report()
+        steps = max(report["steps"], 1)
+        lines = [
+            f"{report['steps']} steps, {report['step_time']:.2f}s, {report['step_time'] / steps * 1000:.2f}ms/step, "
+            f"{report['slow_steps']} slow"
+        ]
+        for name, seconds in sorted(report["phases"].items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {name:<12} {seconds:9.3f}s {seconds / steps * 1000:8.2f}ms/step")
+        for command, stats in list(report["traci"].items())[: self.top_commands]:
+            lines.append(
+                f"  {command:<40} {stats['calls']:9d} calls {stats['time']:9.3f}s {stats['mean'] * 1e6:8.1f}us/call"
+            )
+        return "\n".join(lines)
+
+    def end_episode(self) -> Optional[dict]:
+        """Log and return the report of the episode, stored as :attr:`last_report`, then start a new one.
+
+        Returns None (and keeps :attr:`last_report`) when no step was profiled since the last call.
+        """
+        if not self.enabled or self.steps == 0:
+            return None
+        self.last_report = self.report()
+        logging.info(f"Step profile:\n{self.format_report(self.last_report)}")
+        self._reset_episode()
+        return self.last_report
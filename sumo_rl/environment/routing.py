@@ -0,0 +1,354 @@
+"""Route caching and in-process routing for truck dispatching."""
+import heapq
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx
+import numpy as np
+
+
+def build_route_graph(network_index, weights: Optional[Dict[str, float]] = None) -> networkx.DiGraph:
+    """Build the edge graph of a network for routing.
+
+    Nodes are (non-internal) edge ids; an arc ``u -> v`` exists when a connection leads from ``u`` to ``v`` and
+    weighs the travel time of ``v``, as in SUMO's router.
+
+    Args:
+        network_index (NetworkIndex): The static network metadata.
+        weights (Optional[Dict[str, float]]): Travel time per edge. Default: free-flow travel time.
+    """
+    graph = networkx.DiGraph()
+    graph.add_nodes_from(network_index.edge_successors.keys())
+    for edge_id, successors in network_index.edge_successors.items():
+        for successor in successors:
+            weight = weights[successor] if weights and successor in weights else network_index.free_flow_time(successor)
+            graph.add_edge(edge_id, successor, weight=weight)
+    return graph
+
+
+class RouteCache:
+    """Bounded LRU cache of routes keyed by (start_edge, end_edge).
+
+    Routes precomputed with :meth:`precompute` are kept in a separate table that is never evicted, only
+    invalidated. Whenever edge weights change the affected routes must be dropped with :meth:`invalidate`.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """Initialize an empty cache holding at most ``maxsize`` routes besides the precomputed ones."""
+        self.maxsize = maxsize
+        self._routes: "OrderedDict[Tuple[str, str], Tuple[str, ...]]" = OrderedDict()
+        self._precomputed: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._routes) + len(self._precomputed)
+
+    def get(self, start_edge: str, end_edge: str) -> Optional[Tuple[str, ...]]:
+        """Return the cached route from ``start_edge`` to ``end_edge``, or None."""
+        key = (start_edge, end_edge)
+        route = self._precomputed.get(key)
+        if route is None:
+            route = self._routes.get(key)
+            if route is not None:
+                self._routes.move_to_end(key)
+        if route is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return route
+
+    def put(self, start_edge: str, end_edge: str, route: Iterable[str]):
+        """Store a route, evicting the least recently used one when the cache is full."""
+        if self.maxsize <= 0:
+            return
+        key = (start_edge, end_edge)
+        self._routes[key] = tuple(route)
+        self._routes.move_to_end(key)
+        while len(self._routes) > self.maxsize:
+            self._routes.popitem(last=False)
+
+    def precompute(self, network_index, edges: Iterable[str], weights: Optional[Dict[str, float]] = None):
+        """Compute the shortest route between every ordered pair of ``edges`` with networkx.
+
+        Args:
+            network_index (NetworkIndex): The static network metadata.
+            edges (Iterable[str]): Edges whose pairwise routes are precomputed, e.g. task and insertion edges.
+            weights (Optional[Dict[str, float]]): Travel time per edge. Default: free-flow travel time.
+        """
+        edges = list(dict.fromkeys(edges))
+        graph = build_route_graph(network_index, weights)
+        for source in edges:
+            if source not in graph:
+                logging.warning(f"Skip route precomputation from unknown edge {source}")
+                continue
+            _, paths = networkx.single_source_dijkstra(graph, source, weight="weight")
+            for target in edges:
+                if target != source and target in paths:
+                    self._precomputed[(source, target)] = tuple(paths[target])
+        logging.info(f"Precompute {len(self._precomputed)} routes between {len(edges)} edges")
+
+    def invalidate(self, edges: Optional[Iterable[str]] = None):
+        """Drop every route crossing one of ``edges``, or every route if ``edges`` is None."""
+        if edges is None:
+            self._routes.clear()
+            self._precomputed.clear()
+            return
+        edges = set(edges)
+        for table in (self._routes, self._precomputed):
+            stale = [key for key, route in table.items() if not edges.isdisjoint(route)]
+            for key in stale:
+                del table[key]
+
+
+def _dijkstra(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, source: int, reverse: bool) -> np.ndarray:
+    """Travel time from ``source`` to every node (to ``source`` from every node if ``reverse``) on a CSR graph
+    whose arcs ``u -> v`` weigh ``weights[v]``. ``indptr``/``indices`` hold the predecessors when ``reverse``."""
+    dist = np.full(len(indptr) - 1, np.inf)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for v in indices[indptr[u] : indptr[u + 1]]:
+            nd = d + (weights[u] if reverse else weights[v])
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+class LandmarkRouter:
+    """A* router over the edge graph of a network, with a landmark (ALT) heuristic and live travel times.
+
+    Nodes are the routable edges of the :class:`~sumo_rl.environment.network_index.NetworkIndex`; an arc ``u -> v``
+    weighs the current travel time of ``v``, as in :func:`build_route_graph`. Distances from and to a few landmarks
+    are precomputed once at free-flow speed; since travel times never drop below free flow, the triangle
+    inequality on these distances gives an admissible heuristic and queries stay exact while expanding only a
+    small part of the graph. No TraCI call is made.
+
+    Travel times are estimated from the mean speed of the vehicles on every edge, read from the
+    :class:`~sumo_rl.environment.vehicle_state.VehicleStateTable` by :meth:`observe` (once per simulation step)
+    and smoothed exponentially; edges without vehicles relax back to their base travel time.
+    """
+
+    def __init__(
+        self, network_index, num_landmarks: int = 8, smoothing: float = 0.1, max_delay_factor: float = 20.0
+    ):
+        """Build the graph and precompute the landmark distances.
+
+        Args:
+            network_index (NetworkIndex): The static network metadata.
+            num_landmarks (int): Number of landmarks, chosen by farthest point selection.
+            smoothing (float): Weight of a new observation in the exponential smoothing of travel times.
+            max_delay_factor (float): Observed travel times are capped at this multiple of the free-flow time
+                (vehicles standing still, e.g. at a stop, would otherwise make their edge impassable).
+        """
+        self.network_index = network_index
+        self.smoothing = smoothing
+        self.max_delay_factor = max_delay_factor
+        self.node_ids: List[str] = list(network_index.edge_successors.keys())
+        self.node_index: Dict[str, int] = {edge_id: i for i, edge_id in enumerate(self.node_ids)}
+        n = len(self.node_ids)
+        edge_idx = np.asarray([network_index.edge_index[edge_id] for edge_id in self.node_ids], dtype=np.int64)
+        # NetworkIndex edge index -> router node, -1 for internal edges
+        self._node_of_edge = np.full(len(network_index.edge_ids), -1, dtype=np.int64)
+        self._node_of_edge[edge_idx] = np.arange(n)
+        self.length = network_index.edge_length[edge_idx]
+        self.free_flow = self.length / np.maximum(network_index.edge_max_speed[edge_idx], 1e-3)
+
+        successors = [[self.node_index[s] for s in network_index.edge_successors[edge_id]] for edge_id in self.node_ids]
+        predecessors = [[] for _ in range(n)]
+        for u, targets in enumerate(successors):
+            for v in targets:
+                predecessors[v].append(u)
+        self._succ_ptr, self._succ = self._csr(successors)
+        self._pred_ptr, self._pred = self._csr(predecessors)
+
+        self.base = self.free_flow.copy()  # travel time without traffic, see set_base_travel_times
+        self.weights = self.base.copy()
+        self.landmarks, self._from_landmark, self._to_landmark = self._select_landmarks(min(num_landmarks, n))
+        self._heuristics: Dict[int, List[float]] = {}
+        self._successors = successors
+
+    @staticmethod
+    def _csr(adjacency: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        indptr = np.zeros(len(adjacency) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(targets) for targets in adjacency])
+        indices = np.asarray([v for targets in adjacency for v in targets], dtype=np.int64)
+        return indptr, indices
+
+    def _select_landmarks(self, k: int):
+        landmarks, from_landmark, to_landmark = [], [], []
+        nearest = np.full(len(self.node_ids), np.inf)
+        candidate = 0
+        for _ in range(k):
+            landmarks.append(candidate)
+            from_landmark.append(_dijkstra(self._succ_ptr, self._succ, self.free_flow, candidate, reverse=False))
+            to_landmark.append(_dijkstra(self._pred_ptr, self._pred, self.free_flow, candidate, reverse=True))
+            # next landmark: the node farthest from the chosen ones (unreachable nodes count as far)
+            both = np.minimum(from_landmark[-1], to_landmark[-1])
+            nearest = np.minimum(nearest, np.where(np.isfinite(both), both, 1e12))
+            nearest[landmarks] = -1.0
+            candidate = int(np.argmax(nearest))
+        return landmarks, np.asarray(from_landmark), np.asarray(to_landmark)
+
+    def _heuristic(self, target: int) -> List[float]:
+        # only depends on the free-flow landmark distances, and trucks share a handful of destinations
+        h = self._heuristics.get(target)
+        if h is not None:
+            return h
+        with np.errstate(invalid="ignore"):
+            forward = self._from_landmark[:, target][:, None] - self._from_landmark
+            backward = self._to_landmark - self._to_landmark[:, target][:, None]
+            h = np.fmax(forward, backward).max(axis=0)
+        h[np.isnan(h)] = 0.0
+        h = np.maximum(h, 0.0).tolist()  # python floats, read element-wise in the search loop
+        self._heuristics[target] = h
+        return h
+
+    def route(self, start_edge: str, end_edge: str) -> Tuple[str, ...]:
+        """Return the fastest route from ``start_edge`` to ``end_edge`` under the current travel times, or ()."""
+        source, target = self.node_index.get(start_edge), self.node_index.get(end_edge)
+        if source is None or target is None:
+            logging.warning(f"Fail to route from {start_edge} to {end_edge}: unknown edge")
+            return ()
+        if source == target:
+            return (start_edge,)
+        h = self._heuristic(target)
+        if h[source] == np.inf:
+            return ()
+        weights, successors = self.weights, self._successors
+        dist = {source: 0.0}
+        parent = {source: -1}
+        heap = [(h[source], source)]
+        closed = set()
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if u in closed:
+                continue
+            closed.add(u)
+            du = dist[u]
+            for v in successors[u]:
+                nd = du + weights[v]
+                if nd < dist.get(v, np.inf):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + h[v], v))
+        if target not in parent:
+            return ()
+        path = [target]
+        while parent[path[-1]] != -1:
+            path.append(parent[path[-1]])
+        return tuple(self.node_ids[i] for i in reversed(path))
+
+    def route_time(self, route: Iterable[str]) -> float:
+        """Return the current travel time of a route, the first edge excluded (as route costs are counted)."""
+        nodes = [self.node_index[edge_id] for edge_id in route]
+        return float(self.weights[nodes[1:]].sum())
+
+    def observe(self, vehicle_state):
+        """Update the smoothed travel times from the vehicles of the last simulation step.
+
+        Only edges holding vehicles, or still slower than their base travel time, are updated.
+        """
+        n = len(vehicle_state)
+        road_idx = vehicle_state.road_idx[:n]
+        known = road_idx < len(self._node_of_edge)
+        nodes = self._node_of_edge[road_idx[known]]
+        routable = nodes >= 0
+        nodes = nodes[routable]
+        speeds = vehicle_state.speed[:n][known][routable]
+
+        count = np.bincount(nodes, minlength=len(self.node_ids))
+        total_speed = np.bincount(nodes, weights=speeds, minlength=len(self.node_ids))
+        update = np.flatnonzero((count > 0) | (self.weights != self.base))
+        if len(update) == 0:
+            return
+        observed = self.base[update].copy()
+        occupied = count[update] > 0
+        mean_speed = total_speed[update][occupied] / count[update][occupied]
+        observed[occupied] = np.clip(
+            self.length[update][occupied] / np.maximum(mean_speed, 1e-3),
+            self.base[update][occupied],
+            self.base[update][occupied] * self.max_delay_factor,
+        )
+        weights = self.weights[update] + self.smoothing * (observed - self.weights[update])
+        # snap back to the base time once the congestion is gone, so the edge leaves the update set
+        settled = np.abs(weights - self.base[update]) < 1e-3 * self.base[update]
+        weights[settled] = self.base[update][settled]
+        self.weights[update] = weights
+
+    def congested_edges(self, factor: float) -> Set[str]:
+        """Return the edges whose smoothed travel time exceeds ``factor`` times their base travel time."""
+        return {self.node_ids[i] for i in np.flatnonzero(self.weights > factor * self.base)}
+
+    def set_base_travel_times(self, travel_times: Dict[str, float]):
+        """Override the travel time of edges without traffic, e.g. closed or slowed down edges.
+
+        Base times below free flow make the landmark heuristic inadmissible, routes may then be slightly suboptimal.
+        """
+        for edge_id, travel_time in travel_times.items():
+            node = self.node_index.get(edge_id)
+            if node is None:
+                logging.warning(f"Ignore travel time of unknown edge {edge_id}")
+                continue
+            self.base[node] = travel_time
+            self.weights[node] = max(self.weights[node], travel_time)
+
+    def reset(self):
+        """Forget the observed and overridden travel times, e.g. at the start of an episode."""
+        self.base = self.free_flow.copy()
+        self.weights = self.base.copy()
+
+
+class RouteIndex:
+    """Current route of every vehicle, indexed by edge.
+
+    Finding the vehicles whose route crosses some edges costs the number of such vehicles, not a scan of every
+    route.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.routes: Dict[str, Tuple[str, ...]] = {}
+        self._vehicles: Dict[str, Set[str]] = {}  # edge -> vehicles whose route crosses it
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def assign(self, vehicle_id: str, route: Iterable[str]):
+        """Set the route of a vehicle, replacing its previous one."""
+        self.remove(vehicle_id)
+        route = tuple(route)
+        self.routes[vehicle_id] = route
+        for edge_id in route:
+            self._vehicles.setdefault(edge_id, set()).add(vehicle_id)
+
+    def remove(self, vehicle_id: str):
+        """Forget the route of a vehicle, if any."""
+        route = self.routes.pop(vehicle_id, None)
+        if route is None:
+            return
+        for edge_id in route:
+            vehicles = self._vehicles.get(edge_id)
+            if vehicles is not None:
+                vehicles.discard(vehicle_id)
+                if not vehicles:
+                    del self._vehicles[edge_id]
+
+    def vehicles_on(self, edges: Iterable[str]) -> Set[str]:
+        """Return the vehicles whose route crosses one of ``edges``."""
+        vehicles = set()
+        for edge_id in edges:
+            vehicles |= self._vehicles.get(edge_id, set())
+        return vehicles
+
+    def clear(self):
+        """Forget every route."""
+        self.routes.clear()
+        self._vehicles.clear()
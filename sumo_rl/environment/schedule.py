@@ -4,39 +4,80 @@ import traci
 import networkx
 import random
 
+from .routing import LandmarkRouter, RouteCache, RouteIndex
+from .task_pool import TaskPool
 
-def set_positions_on_edge(sumo, lane_id, num):
+
+def set_positions_on_edge(network_index, lane_id, num):
     """
     在某个lane上生成等间隔任务位点
+    :return: 位点坐标列表, 位点在lane上的偏移(lane position)列表
     """
-    points = sumo.lane.getShape(lane_id)
+    points = network_index.shape(lane_id)
+    length = network_index.length(lane_id)
     interval_x = (points[-1][0] - points[0][0]) / (num + 1)
     interval_y = (points[-1][1] - points[0][1]) / (num + 1)
     positions = []
+    lane_positions = []
 
     for i in range(1, num + 1):
         position = ( points[0][0] + i * interval_x,
                      points[0][1] + i * interval_y)  # 获取位置坐标
         positions.append(position)
-    return positions
+        lane_positions.append(i * length / (num + 1))
+    return positions, lane_positions
 
 
 class Scheduler():
     def __init__(self, env):
         self.sumo = env.sumo
+        self.network_index = env.network_index
+        self.route_cache = RouteCache(maxsize = env.route_cache_size)
+        self.precompute_routes = env.precompute_routes
+        self.insertion_edges = env.edges_start_default
+        self.edge_weights = {} # { edge_id: travel_time } 通过 update_edge_weights 修改过的边权
+        # 进程内路由(A* + landmark启发, 实时平滑通行时间), "sumo"时使用simulation.findRoute
+        self.router = LandmarkRouter(self.network_index, num_landmarks = env.router_landmarks,
+                                     smoothing = env.router_smoothing) if env.router == "local" else None
+        self.route_index = RouteIndex() # 在途集卡的当前路由, 按边索引
+        self.congested = set() # 上次重路由时的拥堵边
         self.destination = {"crane": {},
                             "gantry": {},
-                            "other": {} } # { id: { "edge": str_edgeid, "position": tuple_2Dpos } , "serlog":[end_simtime,vehid]}
+                            "other": {} } # { id: { "edge": str_edgeid, "position": tuple_2Dpos, "lane_pos": float } , "serlog":[end_simtime,vehid]}
+
+        self.generate_destinations()
+        self._reset_tasks()
+        self._precompute_routes()
 
-        self.tasks_pending = {"crane": [],  # list of des_id
-                              "gantry": [],
-                              "other": []} # todo: 初步不考虑other的存在
+    def _reset_tasks(self):
+        self.tasks_pending = {"crane": TaskPool(),  # pool of des_id
+                              "gantry": TaskPool(),
+                              "other": TaskPool()} # todo: 初步不考虑other的存在
         self.tasks_ongoing = {"crane": {}, # { des_id: [ vehicle_id ]}
                               "gantry": {},
                               "other": {} }
-        self.generate_destinations()
+        for destinations in self.destination.values():
+            for destination in destinations.values():
+                destination["serlog"] = [-1, -1]
         self.generate_tasks()
 
+    def reset(self, sumo):
+        """
+        新episode(同一路网, 仿真在原进程内重置)时重新初始化: 保留任务终点与路由缓存, 只重置任务状态
+        :param sumo: 新episode的sumo连接
+        :return:
+        """
+        self.sumo = sumo
+        self._reset_tasks()
+        self.route_index.clear()
+        self.congested = set()
+        if self.router is not None:
+            self.router.reset()
+        if self.edge_weights: # 重置后sumo中的边权恢复默认, 经过修改边权的缓存路由不再有效
+            self.route_cache.invalidate()
+            self.edge_weights = {}
+            self._precompute_routes()
+
     def generate_destinations(self):
         """
         生成任务终点(装/卸/停...位点)
@@ -50,13 +91,12 @@ class Scheduler():
         self.bridge_edge = ["D2D1"] # todo: 根据实际路网填写edge（lane）, 在net/env处定义
 
         des_id = 1
-        all_lanes = self.sumo.lane.getIDList()
         for type, edges in self.task_edge.items():
             for edge in edges:
-                lanes_in_edge = [lane_id for lane_id in all_lanes if self.sumo.lane.getEdgeID(lane_id) == edge]
-                positions = set_positions_on_edge(self.sumo, lane_id = lanes_in_edge[0],  num = 3)
-                for pos in positions:
-                    self.destination[type][des_id] = { "edge": edge, "position": pos , "serlog":[-1,-1]}
+                lanes_in_edge = self.network_index.lanes_of(edge)
+                positions, lane_positions = set_positions_on_edge(self.network_index, lane_id = lanes_in_edge[0],  num = 3)
+                for pos, lane_pos in zip(positions, lane_positions):
+                    self.destination[type][des_id] = { "edge": edge, "position": pos, "lane_pos": lane_pos, "serlog":[-1,-1]}
                     logging.info(f"Generate destination {type}_{des_id}: {self.destination[type][des_id]}")
                     des_id += 1
 
@@ -72,15 +112,14 @@ class Scheduler():
             logging.info(f"Generate {len(newtask)} tasks for {type} done")
 
 
-    def dispatch_task(self, vehicle, invalid_task = None):
+    def dispatch_task(self, vehicle, invalid_tasks = ()):
         """
         给特定车辆指派任务
-        :param vehicle_id:
-        :return:
+        :param vehicle:
+        :param invalid_tasks: 对该车无效的des_id集合, 不会被指派
+        :return: destination, 没有可执行任务时返回 None
         """
-        lasttype = vehicle.destination.get("type", "gantry")
-        # curtype = random.choice([type for type in self.destination.keys() if type != lasttype] )# todo: 把other考虑进来
-        curtype = "gantry" if lasttype == "crane" else "crane"
+        curtype = self._next_type(vehicle)
 
         if len(self.tasks_pending[curtype]) == 0:
             self.generate_tasks()
@@ -89,27 +128,57 @@ class Scheduler():
         # ======== 按序分配 FIFO
         # task = self.tasks_pending[type].pop(0)
 
-        # ======== 随机指派
-        # random_index = random.randrange(len(self.tasks_pending[type]))
-        # task = self.tasks_pending[type].pop(random_index)
-
-        # ======== 随机指派, 但是排除上次无效的任务
-        tasks_pending = [task for task in self.tasks_pending[curtype] if task != invalid_task] if invalid_task else self.tasks_pending[curtype]
-        if len(tasks_pending):
-            task = random.choice(tasks_pending)
-            self.tasks_pending[curtype].remove(task)
-        else:
+        # ======== 随机指派, 但是排除无效的任务
+        task = self.tasks_pending[curtype].pop_random(exclude = invalid_tasks)
+        if task is None:
             # todo: 没有可执行任务时，也可以考虑指派到某些停车点等待（net待扩充）
             # 生成新的task供选择
             self.generate_tasks(expand = 2)
-            task = self.dispatch_task(vehicle, invalid_task)
-        destination = {"type": curtype,
-                       "des_id": task,
-                       "edge": self.destination[curtype][task]["edge"],
-                       "position": self.destination[curtype][task]["position"]
-                       }
+            task = self.tasks_pending[curtype].pop_random(exclude = invalid_tasks)
+        if task is None:
+            logging.warning(f"No valid {curtype} task for {vehicle.vehicle_id}")
+            return None
         logging.info(f"Dispatch {vehicle.vehicle_id} to {curtype}_{task}: {len(self.tasks_pending[curtype])} tasks pending")
-        return destination
+        return self._task_destination(curtype, task)
+
+    def dispatch_many(self, vehicles):
+        """
+        一次性给多辆空闲车辆指派任务: 按下一任务类型分组, 每个任务池只抽取一次所需数量的任务
+        :param vehicles: list of Vehicle
+        :return: { vehicle_id: destination }, 没有可执行任务的车辆为 None
+        """
+        groups = {}
+        for vehicle in vehicles:
+            groups.setdefault(self._next_type(vehicle), []).append(vehicle)
+        dispatched = {}
+        for curtype, group in groups.items():
+            if len(self.tasks_pending[curtype]) < len(group):
+                self.generate_tasks()
+            if len(self.tasks_pending[curtype]) < len(group):
+                self.generate_tasks(expand = 2)
+            tasks = self.tasks_pending[curtype].pop_random_many(len(group))
+            for i, vehicle in enumerate(group):
+                dispatched[vehicle.vehicle_id] = self._task_destination(curtype, tasks[i]) if i < len(tasks) else None
+            if len(tasks) < len(group):
+                logging.warning(f"No valid {curtype} task for {len(group) - len(tasks)} vehicles")
+            logging.info(f"Dispatch {len(tasks)} vehicles to {curtype} tasks: {len(self.tasks_pending[curtype])} tasks pending")
+        return dispatched
+
+    def _next_type(self, vehicle):
+        """
+        车辆下一任务的类型: crane与gantry交替
+        """
+        lasttype = vehicle.destination.get("type", "gantry")
+        # curtype = random.choice([type for type in self.destination.keys() if type != lasttype] )# todo: 把other考虑进来
+        return "gantry" if lasttype == "crane" else "crane"
+
+    def _task_destination(self, curtype, task):
+        return {"type": curtype,
+                "des_id": task,
+                "edge": self.destination[curtype][task]["edge"],
+                "position": self.destination[curtype][task]["position"],
+                "lane_pos": self.destination[curtype][task]["lane_pos"]
+                }
 
 
     def set_route(self, vehicle_id, start_edge, end_edge):
@@ -122,8 +191,115 @@ class Scheduler():
         :return:
         Route: tuple of edge_ids
         """
-        # ======== sumo内置算法寻找最短路
-        Route = self.sumo.simulation.findRoute(start_edge, end_edge)
-        Route = Route.edges
+        if self.router is not None:
+            # ======== 进程内A*, 按实时通行时间避开拥堵边, 不经过TraCI; 通行时间每步变化, 不缓存
+            Route = self.router.route(start_edge, end_edge)
+            if Route:
+                self.route_index.assign(vehicle_id, Route)
+                return Route
+        Route = self.route_cache.get(start_edge, end_edge)
+        if Route is None:
+            # ======== sumo内置算法寻找最短路
+            Route = self.sumo.simulation.findRoute(start_edge, end_edge).edges
+            if Route:
+                self.route_cache.put(start_edge, end_edge, Route)
+        if Route:
+            self.route_index.assign(vehicle_id, Route)
         return Route
 
+    def reroute_congested(self, trucks, vehicle_state, factor = 2.0):
+        """
+        一次性重新规划剩余路由经过新出现拥堵边的在途集卡, 路由未受影响的集卡没有任何开销
+        (需要local路由器的实时通行时间)
+        :param trucks: { vehicle_id: Vehicle }
+        :param vehicle_state: VehicleStateTable
+        :param factor: 平滑通行时间超过基准通行时间factor倍的边视为拥堵
+        :return: 重新规划了路由的vehicle_id列表
+        """
+        if self.router is None:
+            return []
+        congested = self.router.congested_edges(factor)
+        new_congested = congested - self.congested
+        self.congested = congested
+        if not new_congested:
+            return []
+        rerouted = []
+        for vehicle_id in self.route_index.vehicles_on(new_congested):
+            truck = trucks.get(vehicle_id)
+            if truck is None or truck.start_task or truck.finish_task or not truck.destination:
+                continue
+            cur_edge = vehicle_state.road_id(vehicle_id)
+            route = self.route_index.routes[vehicle_id]
+            if cur_edge not in route: # 未出发或位于路口内部边, 下次拥堵变化时再处理
+                continue
+            remaining = route[route.index(cur_edge):]
+            if new_congested.isdisjoint(remaining[1:]):
+                continue
+            Route = self.router.route(cur_edge, truck.destination["edge"])
+            if not Route or Route == remaining:
+                continue
+            try:
+                self.sumo.vehicle.setRoute(vehicle_id, Route)
+            except Exception as ex:
+                logging.warning(f"Fail to reroute {vehicle_id} along {Route}: {ex}")
+                continue
+            self.route_index.assign(vehicle_id, Route)
+            rerouted.append(vehicle_id)
+        logging.info(f"Reroute {len(rerouted)} trucks around newly congested edges {sorted(new_congested)}")
+        return rerouted
+
+    def _precompute_routes(self, edges=None):
+        """
+        预计算任务边与车辆插入边之间的全部路由
+        只在 router = "sumo" 且开启 precompute_routes 时生效: 默认的进程内路由器不读取 route_cache
+        :param edges: 参与预计算的边, 默认全部任务边与插入边
+        :return:
+        """
+        if self.router is not None or not self.precompute_routes:
+            return
+        if edges is None:
+            edges = [edge for edges in self.task_edge.values() for edge in edges] + list(self.insertion_edges)
+        self.route_cache.precompute(self.network_index, edges, self.edge_weights)
+
+    def observe_traffic(self, vehicle_state):
+        """
+        每个仿真步根据车辆状态表更新路由器的实时通行时间, 并移除已离开路网车辆的路由
+        :param vehicle_state: VehicleStateTable
+        :return:
+        """
+        for vehicle_id in vehicle_state.arrived:
+            self.route_index.remove(vehicle_id)
+        if self.router is not None:
+            self.router.observe(vehicle_state)
+
+    def add_insertion_edges(self, edges):
+        """
+        新增车辆插入边(depot); router = "sumo" 且开启 precompute_routes 时一次性预计算其与任务边之间的路由
+        :param edges: 插入边列表
+        :return:
+        """
+        new_edges = [edge for edge in dict.fromkeys(edges) if edge not in self.insertion_edges]
+        if not new_edges:
+            return
+        self.insertion_edges = list(self.insertion_edges) + new_edges
+        task_edges = [edge for edges in self.task_edge.values() for edge in edges]
+        self._precompute_routes(new_edges + task_edges)
+
+    def update_edge_weights(self, weights):
+        """
+        修改边的通行时间, 并使受影响的缓存路由失效
+        边权变大时只丢弃经过这些边的路由; 任一边权变小时其他路由也可能不再最短, 丢弃全部缓存
+        :param weights: { edge_id: travel_time }
+        :return:
+        """
+        decreased = False
+        for edge, travel_time in weights.items():
+            previous = self.edge_weights.get(edge, self.network_index.free_flow_time(edge))
+            decreased = decreased or travel_time < previous
+            self.edge_weights[edge] = travel_time
+            self.sumo.edge.adaptTraveltime(edge, travel_time)
+        if self.router is not None:
+            self.router.set_base_travel_times(weights)
+        self.route_cache.invalidate(None if decreased else weights.keys())
+        self._precompute_routes()
+
@@ -0,0 +1,150 @@
+"""Simulation lifecycle shared by the SUMO environments: launching, restoring and closing SUMO, and state encoding."""
+import logging
+import os
+import tempfile
+
+import traci
+
+from .state_encoder import StateEncoder, encode_all
+from .traffic_signal import TrafficSignal
+
+
+class SimulationMixin:
+    """Methods common to the traffic signal and the port environments.
+
+    The environment provides the SUMO options (``_net``, ``_route``, ``sumo_seed``, ...), its ``backend``, ``profiler``,
+    ``reset_mode`` and ``_snapshot_file``, the traffic signal settings and ``save_csv``.
+    """
+
+    def _sumo_cmd(self):
+        sumo_cmd = [
+            self._sumo_binary,
+            "-n",
+            self._net,
+            "-r",
+            self._route,
+            "--max-depart-delay",
+            str(self.max_depart_delay),
+            "--waiting-time-memory",
+            str(self.waiting_time_memory),
+            "--time-to-teleport",
+            str(self.time_to_teleport),
+        ]
+        if self.begin_time > 0:
+            sumo_cmd.append(f"-b {self.begin_time}")
+        if self.sumo_seed == "random":
+            sumo_cmd.append("--random")
+        else:
+            sumo_cmd.extend(["--seed", str(self.sumo_seed)])
+        if not self.sumo_warnings:
+            sumo_cmd.append("--no-warnings")
+        if self.additional_sumo_cmd is not None:
+            sumo_cmd.extend(self.additional_sumo_cmd.split())
+        if self.use_gui or self.render_mode is not None:
+            sumo_cmd.extend(["--start", "--quit-on-end"])
+            if self.render_mode == "rgb_array":
+                sumo_cmd.extend(["--window-size", f"{self.virtual_display[0]},{self.virtual_display[1]}"])
+        return sumo_cmd
+
+    def _start_simulation(self):
+        sumo_cmd = self._sumo_cmd()
+        if self.render_mode == "rgb_array":
+            from pyvirtualdisplay.smartdisplay import SmartDisplay
+
+            print("Creating a virtual display.")
+            self.disp = SmartDisplay(size=self.virtual_display)
+            self.disp.start()
+            print("Virtual display started.")
+
+        self.sumo = self.profiler.wrap(self.backend.start(sumo_cmd))
+
+        if self.use_gui or self.render_mode is not None:
+            self.sumo.gui.setSchema(traci.gui.DEFAULT_VIEW, "real world")
+
+    def _restore_simulation(self):
+        """Bring the running simulation back to the start of an episode without launching a new SUMO process."""
+        if self.reset_mode == "reload":
+            self.sumo.load(self._sumo_cmd()[1:])
+        else:
+            self.sumo.simulation.loadState(self._snapshot_file)
+            logging.info(f"Restore simulation state from {self._snapshot_file}")
+
+    def _save_snapshot(self):
+        if self._snapshot_file is None:
+            fd, self._snapshot_file = tempfile.mkstemp(prefix=f"sumo_rl_{self.label}_", suffix=".state.xml")
+            os.close(fd)
+        self.sumo.simulation.saveState(self._snapshot_file)
+        logging.info(f"Save simulation state to {self._snapshot_file}")
+
+    def _build_traffic_signals(self, sumo):
+        if isinstance(self.reward_fn, dict):
+            traffic_signals = {
+                ts: TrafficSignal(
+                    self,
+                    ts,
+                    self.delta_time,
+                    self.yellow_time,
+                    self.min_green,
+                    self.max_green,
+                    self.begin_time,
+                    self.reward_fn[ts],
+                    sumo,
+                )
+                for ts in self.reward_fn.keys()
+            }
+        else:
+            traffic_signals = {
+                ts: TrafficSignal(
+                    self,
+                    ts,
+                    self.delta_time,
+                    self.yellow_time,
+                    self.min_green,
+                    self.max_green,
+                    self.begin_time,
+                    self.reward_fn,
+                    sumo,
+                )
+                for ts in self.ts_ids
+            }
+        return traffic_signals
+
+    def close(self):
+        """Close the environment and stop the SUMO simulation, even if the metrics file fails to be written."""
+        try:
+            self.save_csv(self.out_csv_name, self.episode)
+        finally:
+            if getattr(self, "profiler", None) is not None:
+                self.profiler.end_episode()
+            if self.sumo is not None:
+                self.backend.close()
+
+                if self.disp is not None:
+                    self.disp.stop()
+                    self.disp = None
+
+                self.sumo = None
+
+    def __del__(self):
+        """Close the environment and stop the SUMO simulation."""
+        self.close()
+        if getattr(self, "_snapshot_file", None) is not None and os.path.exists(self._snapshot_file):
+            os.remove(self._snapshot_file)
+
+    # Below functions are for discrete state space
+    def state_encoder(self, ts_id) -> StateEncoder:
+        """Return the state encoder of a traffic signal; signals with the same observation layout share one."""
+        encoder = self._state_encoders.get(ts_id)
+        if encoder is None:
+            layout = (self.traffic_signals[ts_id].num_green_phases, self.observation_spaces(ts_id).shape[0])
+            encoder = self._state_encoders.setdefault(layout, StateEncoder(*layout))
+            self._state_encoders[ts_id] = encoder
+        return encoder
+
+    def encode(self, state, ts_id):
+        """Encode the state of the traffic signal into a hashable key (an int packing the discretized state)."""
+        return self.state_encoder(ts_id).encode(state)
+
+    def encode_all(self, states: dict) -> dict:
+        """Encode the states of several traffic signals, batching the signals that share an observation layout."""
+        return encode_all({ts_id: self.state_encoder(ts_id) for ts_id in states}, states)
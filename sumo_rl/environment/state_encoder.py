@@ -0,0 +1,78 @@
+"""Discretization of traffic signal observations into compact Q-table keys."""
+from typing import Dict, Hashable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class StateEncoder:
+    """Discretizes default observations (phase one-hot, min-green flag, lane densities and queues) into one key.
+
+    The phase index, the min-green flag and every density/queue bin (``min(int(x * bins), bins - 1)``) are computed
+    with one NumPy expression and packed into a single int: ``bins_bits`` bits per bin, one bit for the min-green
+    flag and enough bits for the phase. Integer keys hash much faster than the former tuples. Observations with
+    too many lanes to fit in 63 bits are encoded as the ``bytes`` of their fields instead.
+
+    :meth:`encode_batch` encodes the observations of several traffic signals sharing the same layout at once.
+    """
+
+    def __init__(self, num_green_phases: int, observation_size: int, bins: int = 10):
+        """Initialize the encoder of observations of ``observation_size`` values with ``num_green_phases`` phases."""
+        self.num_green_phases = num_green_phases
+        self.num_bins = observation_size - num_green_phases - 1
+        self.bins = bins
+        self.bin_bits = (bins - 1).bit_length()
+        self.phase_bits = max(1, (num_green_phases - 1).bit_length())
+        self.packed = self.phase_bits + 1 + self.bin_bits * self.num_bins <= 63
+        # field k is shifted by shifts[k]: phase in the highest bits, the last bin in the lowest
+        bits = [self.phase_bits, 1] + [self.bin_bits] * self.num_bins
+        shifts = np.cumsum(bits[::-1])[::-1] - np.asarray(bits)
+        self._multipliers = np.left_shift(np.int64(1), shifts.astype(np.int64)) if self.packed else None
+
+    def fields(self, states: np.ndarray) -> np.ndarray:
+        """Return the discrete fields (phase, min-green, bins...) of a (n, observation_size) array of observations."""
+        g = self.num_green_phases
+        fields = np.empty((len(states), 2 + self.num_bins), dtype=np.int64)
+        fields[:, 0] = np.argmax(states[:, :g], axis=1)
+        fields[:, 1] = states[:, g]
+        fields[:, 2:] = np.clip((states[:, g + 1 :] * self.bins).astype(np.int64), 0, self.bins - 1)
+        return fields
+
+    def encode_batch(self, states: Union[np.ndarray, Sequence[np.ndarray]]) -> List[Union[int, bytes]]:
+        """Encode several observations of this layout, one key per row."""
+        fields = self.fields(np.asarray(states).reshape(len(states), -1))
+        if self.packed:
+            return (fields @ self._multipliers).tolist()
+        return [row.tobytes() for row in fields.astype(np.uint8)]
+
+    def encode(self, state: np.ndarray) -> Union[int, bytes]:
+        """Encode one observation."""
+        return self.encode_batch(np.asarray(state)[None])[0]
+
+    def decode(self, key: Union[int, bytes]) -> Tuple[int, ...]:
+        """Return the fields (phase, min-green, bins...) of a key, e.g. to inspect a Q-table."""
+        if not self.packed:
+            return tuple(int(value) for value in np.frombuffer(key, dtype=np.uint8))
+        fields = []
+        bits = [self.bin_bits] * self.num_bins + [1, self.phase_bits]
+        for width in bits:
+            fields.append(key & ((1 << width) - 1))
+            key >>= width
+        return tuple(reversed(fields))
+
+
+def encode_all(encoders: Dict[str, StateEncoder], observations: Dict[str, np.ndarray]) -> Dict[str, Hashable]:
+    """Encode the observations of several traffic signals, one batch per distinct encoder.
+
+    Args:
+        encoders (Dict[str, StateEncoder]): Encoder of every traffic signal; signals with the same layout should
+            share one encoder to be encoded together.
+        observations (Dict[str, np.ndarray]): Observation of every traffic signal to encode.
+    """
+    groups: Dict[int, Tuple[StateEncoder, List[str]]] = {}
+    for ts_id in observations:
+        encoder = encoders[ts_id]
+        groups.setdefault(id(encoder), (encoder, []))[1].append(ts_id)
+    keys = {}
+    for encoder, ts_ids in groups.values():
+        keys.update(zip(ts_ids, encoder.encode_batch(np.stack([observations[ts_id] for ts_id in ts_ids]))))
+    return keys
@@ -0,0 +1,81 @@
+import random
+
+
+class TaskPool():
+    """
+    待执行任务池: 支持重复des_id, O(1)随机抽取/删除, 以及排除若干无效任务后的随机抽取
+    """
+    def __init__(self, tasks = ()):
+        self._items = []  # list of des_id
+        self._positions = {}  # { des_id: set(index in self._items) }
+        self.extend(tasks)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, des_id):
+        return des_id in self._positions
+
+    def count(self, des_id):
+        return len(self._positions.get(des_id, ()))
+
+    def append(self, des_id):
+        self._positions.setdefault(des_id, set()).add(len(self._items))
+        self._items.append(des_id)
+
+    def extend(self, tasks):
+        for des_id in tasks:
+            self.append(des_id)
+
+    def _pop_at(self, i):
+        """
+        用末尾元素填补位置i, O(1)
+        """
+        item = self._items[i]
+        last_idx = len(self._items) - 1
+        self._positions[item].discard(i)
+        if i != last_idx:
+            last = self._items[last_idx]
+            self._positions[last].discard(last_idx)
+            self._positions[last].add(i)
+            self._items[i] = last
+        self._items.pop()
+        if not self._positions[item]:
+            del self._positions[item]
+        return item
+
+    def remove(self, des_id):
+        self._pop_at(next(iter(self._positions[des_id])))
+
+    def pop_random(self, exclude = ()):
+        """
+        随机取出一个不在exclude中的任务, 开销只与被排除任务的个数有关
+        :param exclude: 无效的des_id集合
+        :return: des_id, 没有可执行任务时返回 None
+        """
+        excluded = sorted(i for des_id in exclude for i in self._positions.get(des_id, ()))
+        n = len(self._items) - len(excluded)
+        if n <= 0:
+            return None
+        # 第r个有效位置: 依次跳过排在它之前的无效位置
+        i = random.randrange(n)
+        for p in excluded:
+            if p > i:
+                break
+            i += 1
+        return self._pop_at(i)
+
+    def pop_random_many(self, k):
+        """
+        一次随机取出k个任务(不足k个时全部取出)
+        按位置从大到小取出, 被移到空位的末尾元素不会是尚未取出的被选元素
+        :param k: 任务个数
+        :return: list of des_id, 随机顺序
+        """
+        k = min(k, len(self._items))
+        tasks = [self._pop_at(i) for i in sorted(random.sample(range(len(self._items)), k), reverse=True)]
+        random.shuffle(tasks)
+        return tasks
@@ -67,7 +67,7 @@ class TrafficSignal:
             max_green (int): The maximum time in seconds of the green phase.
             begin_time (int): The time in seconds when the traffic signal starts operating.
             reward_fn (Union[str, Callable]): The reward function. Can be a string with the name of the reward function or a callable function.
-            sumo (Sumo): The Sumo instance.
+            sumo (Sumo): The Sumo instance, None until the simulation is started (see :meth:`reset`).
         """
         self.id = ts_id
         self.env = env
@@ -78,6 +78,7 @@ class TrafficSignal:
         self.green_phase = 0
         self.is_yellow = False
         self.time_since_last_phase_change = 0
+        self.begin_time = begin_time
         self.next_action_time = begin_time
         self.last_measure = 0.0
         self.last_reward = None
@@ -94,51 +95,59 @@ class TrafficSignal:
 
         self._build_phases()
 
-        self.lanes = list(
-            dict.fromkeys(self.sumo.trafficlight.getControlledLanes(self.id))
-        )  # Remove duplicates and keep order
-        self.out_lanes = [link[0][1] for link in self.sumo.trafficlight.getControlledLinks(self.id) if link]
-        self.out_lanes = list(set(self.out_lanes))
-        self.lanes_length = {lane: self.sumo.lane.getLength(lane) for lane in self.lanes + self.out_lanes}
+        self.lanes = list(self.env.network_index.tls_lanes[self.id])
+        self.out_lanes = list(self.env.network_index.tls_out_lanes[self.id])
+        self.lanes_length = {lane: self.env.network_index.length(lane) for lane in self.lanes + self.out_lanes}
+        # indices into the per-step LaneSnapshot / NetworkIndex lane arrays
+        self.lanes_idx = np.asarray([self.env.network_index.lane_index[lane] for lane in self.lanes], dtype=np.int64)
+        self.out_lanes_idx = np.asarray(
+            [self.env.network_index.lane_index[lane] for lane in self.out_lanes], dtype=np.int64
+        )
 
         self.observation_space = self.observation_fn.observation_space()
         self.action_space = spaces.Discrete(self.num_green_phases)
 
     def _build_phases(self):
-        phases = self.sumo.trafficlight.getAllProgramLogics(self.id)[0].phases
+        phases = self.env.network_index.tls_phases[self.id]
         if self.env.fixed_ts:
             self.num_green_phases = len(phases) // 2  # Number of green phases == number of phases (green+yellow) divided by 2
             return
 
-        self.green_phases = []
-        self.yellow_dict = {}
-        for phase in phases:
-            state = phase.state
-            if "y" not in state and (state.count("r") + state.count("s") != len(state)):
-                self.green_phases.append(self.sumo.trafficlight.Phase(60, state))
+        # the transition table only depends on the net and the yellow time, it is computed once and shared
+        self.green_phases, self.all_phases, self.yellow_dict = self.env.network_index.phase_table(
+            self.id, self.yellow_time
+        )
         self.num_green_phases = len(self.green_phases)
-        self.all_phases = self.green_phases.copy()
-
-        for i, p1 in enumerate(self.green_phases):
-            for j, p2 in enumerate(self.green_phases):
-                if i == j:
-                    continue
-                yellow_state = ""
-                for s in range(len(p1.state)):
-                    if (p1.state[s] == "G" or p1.state[s] == "g") and (p2.state[s] == "r" or p2.state[s] == "s"):
-                        yellow_state += "y"
-                    else:
-                        yellow_state += p1.state[s]
-                self.yellow_dict[(i, j)] = len(self.all_phases)
-                self.all_phases.append(self.sumo.trafficlight.Phase(self.yellow_time, yellow_state))
-
-        programs = self.sumo.trafficlight.getAllProgramLogics(self.id)
-        logic = programs[0]
-        logic.type = 0
-        logic.phases = self.all_phases
+
+    def _set_program(self):
+        logic = self.sumo.trafficlight.Logic(
+            self.env.network_index.tls_program_id[self.id],
+            0,
+            0,
+            [self.sumo.trafficlight.Phase(phase.duration, phase.state) for phase in self.all_phases],
+        )
         self.sumo.trafficlight.setProgramLogic(self.id, logic)
         self.sumo.trafficlight.setRedYellowGreenState(self.id, self.all_phases[0].state)
 
+    def reset(self, sumo):
+        """Prepares the traffic signal for a new episode.
+
+        Lanes and phases are read from the network index at construction; this only resets the dynamic state and
+        sets the green/yellow program in the simulation.
+
+        Args:
+            sumo (Sumo): The Sumo instance of the new episode.
+        """
+        self.sumo = sumo
+        self.green_phase = 0
+        self.is_yellow = False
+        self.time_since_last_phase_change = 0
+        self.next_action_time = self.begin_time
+        self.last_measure = 0.0
+        self.last_reward = None
+        if not self.env.fixed_ts:
+            self._set_program()
+
     @property
     def time_to_act(self):
         """Returns True if the traffic signal should act in the current step."""
@@ -215,83 +224,56 @@ class TrafficSignal:
         Returns:
             List[float]: List of accumulated waiting time of each intersection lane.
         """
-        wait_time_per_lane = []
-        for lane in self.lanes:
-            veh_list = self.sumo.lane.getLastStepVehicleIDs(lane)
-            wait_time = 0.0
-            for veh in veh_list:
-                veh_lane = self.sumo.vehicle.getLaneID(veh)
-                acc = self.sumo.vehicle.getAccumulatedWaitingTime(veh)
-                if veh not in self.env.vehicles:
-                    self.env.vehicles[veh] = {veh_lane: acc}
-                else:
-                    self.env.vehicles[veh][veh_lane] = acc - sum(
-                        [self.env.vehicles[veh][lane] for lane in self.env.vehicles[veh].keys() if lane != veh_lane]
-                    )
-                wait_time += self.env.vehicles[veh][veh_lane]
-            wait_time_per_lane.append(wait_time)
-        return wait_time_per_lane
+        return self.env.waiting_time_tracker.lane_waiting_time(self.lanes_idx)
 
     def get_average_speed(self) -> float:
         """Returns the average speed normalized by the maximum allowed speed of the vehicles in the intersection.
 
         Obs: If there are no vehicles in the intersection, it returns 1.0.
         """
-        avg_speed = 0.0
-        vehs = self._get_veh_list()
-        if len(vehs) == 0:
+        state = self.env.vehicle_state
+        on_lanes = np.isin(state.lane_idx[: len(state)], self.lanes_idx)
+        if not on_lanes.any():
             return 1.0
-        for v in vehs:
-            avg_speed += self.sumo.vehicle.getSpeed(v) / self.sumo.vehicle.getAllowedSpeed(v)
-        return avg_speed / len(vehs)
+        return float(np.mean(state.speeds[on_lanes] / state.allowed_speeds[on_lanes]))
 
     def get_pressure(self):
         """Returns the pressure (#veh leaving - #veh approaching) of the intersection."""
-        return sum(self.sumo.lane.getLastStepVehicleNumber(lane) for lane in self.out_lanes) - sum(
-            self.sumo.lane.getLastStepVehicleNumber(lane) for lane in self.lanes
-        )
+        snapshot = self.env.lane_snapshot
+        return int(snapshot.vehicle_number[self.out_lanes_idx].sum() - snapshot.vehicle_number[self.lanes_idx].sum())
 
     def get_out_lanes_density(self) -> List[float]:
         """Returns the density of the vehicles in the outgoing lanes of the intersection."""
-        lanes_density = [
-            self.sumo.lane.getLastStepVehicleNumber(lane)
-            / (self.lanes_length[lane] / (self.MIN_GAP + self.sumo.lane.getLastStepLength(lane)))
-            for lane in self.out_lanes
-        ]
-        return [min(1, density) for density in lanes_density]
+        snapshot = self.env.lane_snapshot
+        lanes_density = snapshot.vehicle_number[self.out_lanes_idx] / snapshot.capacity(self.out_lanes_idx, self.MIN_GAP)
+        return np.minimum(1, lanes_density).tolist()
 
     def get_lanes_density(self) -> List[float]:
         """Returns the density [0,1] of the vehicles in the incoming lanes of the intersection.
 
         Obs: The density is computed as the number of vehicles divided by the number of vehicles that could fit in the lane.
         """
-        lanes_density = [
-            self.sumo.lane.getLastStepVehicleNumber(lane)
-            / (self.lanes_length[lane] / (self.MIN_GAP + self.sumo.lane.getLastStepLength(lane)))
-            for lane in self.lanes
-        ]
-        return [min(1, density) for density in lanes_density]
+        snapshot = self.env.lane_snapshot
+        lanes_density = snapshot.vehicle_number[self.lanes_idx] / snapshot.capacity(self.lanes_idx, self.MIN_GAP)
+        return np.minimum(1, lanes_density).tolist()
 
     def get_lanes_queue(self) -> List[float]:
         """Returns the queue [0,1] of the vehicles in the incoming lanes of the intersection.
 
         Obs: The queue is computed as the number of vehicles halting divided by the number of vehicles that could fit in the lane.
         """
-        lanes_queue = [
-            self.sumo.lane.getLastStepHaltingNumber(lane)
-            / (self.lanes_length[lane] / (self.MIN_GAP + self.sumo.lane.getLastStepLength(lane)))
-            for lane in self.lanes
-        ]
-        return [min(1, queue) for queue in lanes_queue]
+        snapshot = self.env.lane_snapshot
+        lanes_queue = snapshot.halting_number[self.lanes_idx] / snapshot.capacity(self.lanes_idx, self.MIN_GAP)
+        return np.minimum(1, lanes_queue).tolist()
 
     def get_total_queued(self) -> int:
         """Returns the total number of vehicles halting in the intersection."""
-        return sum(self.sumo.lane.getLastStepHaltingNumber(lane) for lane in self.lanes)
+        return int(self.env.lane_snapshot.halting_number[self.lanes_idx].sum())
 
     def _get_veh_list(self):
         veh_list = []
         for lane in self.lanes:
-            veh_list += self.sumo.lane.getLastStepVehicleIDs(lane)
+            veh_list += self.env.lane_snapshot.vehicle_ids(lane)
         return veh_list
 
     @classmethod
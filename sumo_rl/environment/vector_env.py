@@ -0,0 +1,263 @@
+"""Run several single-agent SUMO environments in worker processes and step them concurrently."""
+import logging
+import multiprocessing as mp
+from functools import partial
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import gymnasium as gym
+import numpy as np
+from gymnasium.vector.utils import batch_space
+
+
+def _worker(index: int, env_fn: Callable[[], gym.Env], pipe, parent_pipe):
+    parent_pipe.close()
+    env = None
+    buffers, arrays = [], []
+    try:
+        env = env_fn()
+        pipe.send(((env.observation_space, env.action_space), True))
+        layout = pipe.recv()
+        buffers = [shared_memory.SharedMemory(name=name) for name, _, _ in layout]
+        arrays = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm, (_, shape, dtype) in zip(buffers, layout)]
+        observations, rewards, terminated, truncated = arrays
+
+        while True:
+            command, data = pipe.recv()
+            if command == "reset":
+                observation, info = env.reset(seed=data)
+                observations[index] = observation
+                pipe.send((info, True))
+            elif command == "step":
+                observation, reward, term, trunc, info = env.step(data)
+                if term or trunc:
+                    # same-step autoreset, the last observation and info of the episode are returned in the info
+                    final_observation, final_info = observation, info
+                    observation, info = env.reset()
+                    info = dict(info, final_obs=final_observation, final_info=final_info)
+                observations[index] = observation
+                rewards[index] = reward
+                terminated[index] = term
+                truncated[index] = trunc
+                pipe.send((info, True))
+            elif command == "call":
+                name, args, kwargs = data
+                attribute = getattr(env, name)
+                pipe.send((attribute(*args, **kwargs) if callable(attribute) else attribute, True))
+            elif command == "close":
+                pipe.send((None, True))
+                break
+            else:
+                raise RuntimeError(f"Unknown command {command}")
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception as ex:
+        logging.warning(f"SumoVectorEnv worker {index} failed: {ex}")
+        pipe.send((ex, False))
+    finally:
+        # views must be released before their shared memory block can be closed
+        observations = rewards = terminated = truncated = None
+        arrays.clear()
+        for shm in buffers:
+            shm.close()
+        if env is not None:
+            env.close()
+
+
+class SumoVectorEnv(gym.vector.VectorEnv):
+    """Gymnasium vector environment running N single-agent environments in worker processes.
+
+    Every environment lives in its own process (with its own SUMO instance and TraCI connection), so all of them
+    are stepped concurrently. Observations, rewards and termination flags are written by the workers into shared
+    memory arrays of shape ``(num_envs, ...)``; only the (small) info dicts go through the pipes.
+
+    Episodes are reset automatically in the same step (gymnasium's ``AutoresetMode.SAME_STEP``): when an
+    environment terminates or truncates, the returned observation and info are the first ones of the next episode,
+    and the last ones are available as ``infos["final_obs"]`` and ``infos["final_info"]``.
+
+    Example:
+        >>> from functools import partial
+        >>> env = SumoVectorEnv([partial(SumoEnvironment, net_file=net, route_file=route, single_agent=True)] * 4)
+        >>> observations, infos = env.reset(seed=42)
+        >>> observations, rewards, terminated, truncated, infos = env.step(env.action_space.sample())
+    """
+
+    # AutoresetMode only exists since gymnasium 1.0, whose vector wrappers otherwise assume next-step autoreset
+    metadata = {"autoreset_mode": gym.vector.AutoresetMode.SAME_STEP} if hasattr(gym.vector, "AutoresetMode") else {}
+
+    def __init__(self, env_fns: Sequence[Callable[[], gym.Env]], context: Optional[str] = None):
+        """Start one worker per environment.
+
+        Args:
+            env_fns (Sequence[Callable[[], gym.Env]]): Functions creating the (single-agent) environments. They are
+                sent to the workers, so they must be picklable when the start method is not fork, e.g.
+                ``functools.partial(SumoEnvironment, ...)``.
+            context (Optional[str]): Start method of the worker processes. Default: the platform's default.
+        """
+        self.num_envs = len(env_fns)
+        self.closed = False
+        ctx = mp.get_context(context)
+        # start the resource tracker first so the workers share it instead of each unlinking the blocks on exit
+        resource_tracker.ensure_running()
+        self.parent_pipes, self.processes = [], []
+        for index, env_fn in enumerate(env_fns):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                name=f"SumoVectorEnv-{index}",
+                args=(index, env_fn, child_pipe, parent_pipe),
+                daemon=True,
+            )
+            process.start()
+            child_pipe.close()
+            self.parent_pipes.append(parent_pipe)
+            self.processes.append(process)
+
+        spaces = self._receive()
+        self.single_observation_space, self.single_action_space = spaces[0]
+        for observation_space, action_space in spaces[1:]:
+            if observation_space != self.single_observation_space or action_space != self.single_action_space:
+                self.close(terminate=True)
+                raise ValueError("All environments of a SumoVectorEnv must have the same spaces")
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+
+        shapes = [
+            (self.observation_space.shape, self.single_observation_space.dtype),
+            ((self.num_envs,), np.float64),
+            ((self.num_envs,), np.bool_),
+            ((self.num_envs,), np.bool_),
+        ]
+        self._buffers = [
+            shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            for shape, dtype in shapes
+        ]
+        self.observations, self.rewards, self.terminated, self.truncated = [
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm, (shape, dtype) in zip(self._buffers, shapes)
+        ]
+        layout = [(shm.name, shape, np.dtype(dtype).str) for shm, (shape, dtype) in zip(self._buffers, shapes)]
+        for pipe in self.parent_pipes:
+            pipe.send(layout)
+
+    def _receive(self) -> List[Any]:
+        results = [pipe.recv() for pipe in self.parent_pipes]
+        errors = [result for result, success in results if not success]
+        if errors:
+            self.close(terminate=True)
+            raise errors[0]
+        return [result for result, _ in results]
+
+    def reset(self, seed: Optional[Union[int, Sequence[int]]] = None, options: Optional[dict] = None):
+        """Reset every environment.
+
+        Args:
+            seed (Optional[Union[int, Sequence[int]]]): One seed per environment, or a base seed ``s`` giving
+                ``s + i`` to environment ``i``.
+        """
+        if seed is None or isinstance(seed, int):
+            seed = [None if seed is None else seed + i for i in range(self.num_envs)]
+        for pipe, env_seed in zip(self.parent_pipes, seed):
+            pipe.send(("reset", env_seed))
+        infos = self._receive()
+        return self.observations.copy(), self._merge_infos(infos)
+
+    def step_async(self, actions):
+        """Send one action to every environment without waiting for the results."""
+        for pipe, action in zip(self.parent_pipes, actions):
+            pipe.send(("step", action))
+
+    def step_wait(self):
+        """Wait for the environments stepped by :meth:`step_async`."""
+        infos = self._receive()
+        return (
+            self.observations.copy(),
+            self.rewards.copy(),
+            self.terminated.copy(),
+            self.truncated.copy(),
+            self._merge_infos(infos),
+        )
+
+    def step(self, actions):
+        """Step every environment concurrently and return batched results."""
+        self.step_async(actions)
+        return self.step_wait()
+
+    def call(self, name: str, *args, **kwargs) -> tuple:
+        """Call a method (or read an attribute) of every environment and return the results."""
+        for pipe in self.parent_pipes:
+            pipe.send(("call", (name, args, kwargs)))
+        return tuple(self._receive())
+
+    def _merge_infos(self, infos: List[dict]) -> Dict[str, Any]:
+        merged = {}
+        for i, info in enumerate(infos):
+            self._merge_info(merged, info, i)
+        return merged
+
+    def _merge_info(self, merged: Dict[str, Any], info: dict, i: int):
+        # vector info convention: infos[key][i] is the value of env i, infos["_" + key][i] whether env i has it;
+        # dict values (e.g. final_info) are merged recursively
+        for key, value in info.items():
+            if isinstance(value, dict):
+                self._merge_info(merged.setdefault(key, {}), value, i)
+            else:
+                if key not in merged:
+                    merged[key] = np.full(self.num_envs, None, dtype=object)
+                merged[key][i] = value
+            if f"_{key}" not in merged:
+                merged[f"_{key}"] = np.zeros(self.num_envs, dtype=bool)
+            merged[f"_{key}"][i] = True
+
+    def close(self, terminate: bool = False):
+        """Stop the workers (and their SUMO instances) and release the shared memory."""
+        if self.closed:
+            return
+        self.closed = True
+        if not terminate:
+            for pipe, process in zip(self.parent_pipes, self.processes):
+                if process.is_alive():
+                    try:
+                        pipe.send(("close", None))
+                        pipe.recv()
+                    except (BrokenPipeError, EOFError):
+                        pass
+        for process in self.processes:
+            if terminate:
+                process.terminate()
+            process.join()
+        for pipe in self.parent_pipes:
+            pipe.close()
+        self.observations = self.rewards = self.terminated = self.truncated = None
+        for shm in getattr(self, "_buffers", []):
+            shm.close()
+            shm.unlink()
+
+    def __del__(self):
+        """Stop the workers."""
+        if not getattr(self, "closed", True):
+            self.close()
+
+
+class LibsumoPool(SumoVectorEnv):
+    """SumoVectorEnv whose workers each host exactly one libsumo simulation.
+
+    libsumo only runs one simulation per process, but its calls avoid the TraCI socket round trip. Running one
+    simulation per worker, stepped with one batched command per :meth:`step`, combines both: libsumo speed
+    inside every simulation and one core per simulation.
+
+    Example:
+        >>> pool = LibsumoPool(SumoEnvironment, 8, net_file=net, route_file=route, single_agent=True)
+    """
+
+    def __init__(self, env_cls: Callable[..., gym.Env], num_envs: int, context: Optional[str] = "spawn", **env_kwargs):
+        """Start ``num_envs`` workers, each creating ``env_cls(sumo_backend="libsumo", **env_kwargs)``.
+
+        Args:
+            env_cls (Callable[..., gym.Env]): Environment class (or factory) accepting a ``sumo_backend`` argument.
+            num_envs (int): Number of simulations, one per worker process.
+            context (Optional[str]): Start method of the workers. Default: "spawn", so no worker inherits a libsumo
+                simulation started in the parent process.
+            env_kwargs: Arguments of ``env_cls``.
+        """
+        env_fn = partial(env_cls, sumo_backend="libsumo", **env_kwargs)
+        super().__init__([env_fn] * num_envs, context=context)
@@ -6,22 +6,33 @@ import traci
 import networkx
 
 class Vehicle():
-    def __init__(self, env,  vehicle_id, task: Union[str, list, None]):
+    def __init__(self, env,  vehicle_id, task: Union[str, list, None], depot: Optional[str] = None):
+        self.env = env
         self.sumo = env.sumo
         self.Scheduler = env.Scheduler
+        self.state = env.vehicle_state
         self.vehicle_id = vehicle_id
         self.priority = 2 # feature1 优先级
+        self.depot = depot # 插入边, None则从route_default插入
 
         ## ======== 任务状态
         self.start_task = False
         self.finish_task = False
-        self.pause_ontask = False
         self.destination: dict = {}
 
         ## ======== 创建车辆
-        self.sumo.vehicle.add(vehicle_id, "route_default")
-        self.speed = self.sumo.vehicle.getSpeed(self.vehicle_id)
-        self._apply_task(task)
+        self.sumo.vehicle.add(vehicle_id, env.depot_route(depot) if depot else "route_default")
+        try:
+            self._apply_task(task)
+        except Exception as ex: # 指派失败的车辆保持空闲, 由env在之后的仿真步重新指派
+            logging.warning(f"Fail to apply the first task of {vehicle_id}: {ex}")
+
+    @property
+    def idle(self) -> bool:
+        """
+        没有进行中的任务: 任务已完成, 或从未成功指派
+        """
+        return self.finish_task or not self.destination
 
     def _get_info(self):
         try:
@@ -53,8 +64,8 @@ class Vehicle():
         """
         try:
             if isinstance(route, str):
-                start_edge, end_edge = self.sumo.vehicle.getRoadID(self.vehicle_id), route
-                start_edge = start_edge if start_edge else random.choice(self.sumo.route.getEdges("route_default"))
+                start_edge, end_edge = self.state.road_id(self.vehicle_id), route
+                start_edge = start_edge or self.depot or random.choice(self.sumo.route.getEdges("route_default"))
             else:
                 start_edge, end_edge = route[0], route[1]
             if start_edge == end_edge: # 无效任务, 单载集卡不能执行多次装/卸
@@ -68,161 +79,96 @@ class Vehicle():
             logging.warning(f"Fail to route {self.vehicle_id} to {start_edge, end_edge}: {ex}")
             return None
 
-    def _pause_vehicle(self):
+    def _set_task_stop(self, destination: dict):
         """
-        暂停车辆
+        在任务终点设置SUMO stop, 停车时长即装卸服务时长
+        :param destination:
         :return:
         """
-        self.sumo.vehicle.setSpeed(self.vehicle_id, 0) # todo: 车辆将会开始减速, 但是不能立马停下来
-        self.pause_ontask = True
-        logging.info(f"""{self.vehicle_id} pause at destination {self.destination["id"]} edge {self.sumo.vehicle.getRoadID(self.vehicle_id)} on schedule """)
+        self.sumo.vehicle.setStop(self.vehicle_id, destination["edge"], pos=destination["lane_pos"],
+                                  laneIndex=0, duration=self.env.service_time)
 
-    def _check_task_start(self, threshold = 10) -> bool:
+    def _on_stop_start(self, threshold = 10) -> bool:
         """
-        判断是否到达路由终点
-        todo: 如果设置的[delta_time较大/速度较快/threshold小]会捕捉不到到达终点附近
+        车辆开始停车事件: 若停在任务终点则开始装卸任务
+        (路口控制等其他stop也会触发该事件, 通过edge与lane position区分)
         :param threshold:
         :return:
         """
-        self.cur_edge = self.sumo.vehicle.getRoadID(self.vehicle_id)
-        if self.finish_task == False and self.cur_edge == self.destination["edge"]:
-            self.position = self.sumo.vehicle.getPosition(self.vehicle_id)
-            distance = self.sumo.simulation.getDistance2D(self.position[0], self.position[1],
-                                                          self.destination["position"][0],self.destination["position"][1])
+        self.cur_edge = self.state.road_id(self.vehicle_id)
+        if self.finish_task == False and self.destination and self.cur_edge == self.destination["edge"]:
+            distance = abs(self.state.get_lane_position(self.vehicle_id) - self.destination["lane_pos"])
             if distance < threshold:
-                self.start_task = True # 车完全停下后distance可能超过了threshold范围, 但是依然 self.start_task = True
-                self._pause_vehicle()
-            # print(f"distance of {self.vehicle_id} = {distance}, "
-            #           f"finish_task = {self.finish_task}, "
-            #           f"pause_ontask = {self.pause_ontask} "
-            #           f"start_task = {self.start_task}")
+                self.start_task = True
+                logging.info(f"""{self.vehicle_id} arrive at destination {self.destination["id"]} edge {self.cur_edge} on schedule """)
         return self.start_task
 
-    def _check_task_finish(self, pause_steps = 10):
+    def _on_stop_end(self) -> bool:
         """
-        判断装卸任务是否完成
-        :param pause_steps:
+        车辆结束停车事件: 若正在执行装卸任务则任务完成
         :return:
         """
-        WaitingTime = self.sumo.vehicle.getWaitingTime(self.vehicle_id) # todo: 车辆完全停止才开始计算, 不包括减速的时间
-        if self.pause_ontask and self.start_task and  WaitingTime >= pause_steps:
+        if self.start_task:
             self.finish_task = True
-            self.pause_ontask = False
             self.start_task = False
             self.Scheduler.tasks_ongoing[self.destination["type"]][self.destination["des_id"]].remove(self.vehicle_id)
             self.Scheduler.destination[self.destination["type"]][self.destination["des_id"]]["serlog"] = [self.sumo.simulation.getTime(), self.vehicle_id]
-            logging.info(f"""{self.vehicle_id} finish task in {WaitingTime} steps at destination {self.destination["id"]} edge {self.sumo.vehicle.getRoadID(self.vehicle_id)}""")
-        # if  WaitingTime:
-        #     print(f"WaitingTime of {self.vehicle_id} = {WaitingTime}, "
-        #       f"finish_task = {self.finish_task}, "
-        #       f"pause_ontask = { self.pause_ontask} "
-        #       f"start_task = {self.start_task}")
-        return self.finish_task
-
-    def _apply_task(self, task: Union[dict, None], invalid_task = None):
+            logging.info(f"""{self.vehicle_id} finish task at destination {self.destination["id"]} edge {self.state.road_id(self.vehicle_id)}""")
+            return True
+        return False
+
+    def _apply_task(self, task: Union[dict, None]):
         """
-        执行一次运输任务
-        :param des:
-        :return:
+        执行一次运输任务, 路由失败时排除该任务重新指派(循环, 不递归)
+        :param task: 指定的任务, None则由Scheduler指派
+        :return: 是否成功
         """
-        Task = task if task else self.Scheduler.dispatch_task(self, invalid_task)
-        try:
-            route = Task["edge"]  # todo: 从task中解析route（起）始点
-            end_edge = self._route_vehicle(route)
-            if end_edge:
-                self.sumo.vehicle.setSpeed(self.vehicle_id, self.speed)
-                # end_lanes = [lane_id for lane_id in self.sumo.lane.getIDList() if
-                #              self.sumo.lane.getEdgeID(lane_id) == end_edge]
-                # lane = self.sumo.lane.getShape(end_lanes[0])
-                self.destination = {"id": 0,
-                                    "type": Task["type"],
-                                    "des_id": Task["des_id"],
-                                    "edge": end_edge,
-                                    "position": Task["position"]
-                                    }
-                # self.Scheduler.tasks_ongoing[Task["type"]].setdefault([Task["des_id"]], []).append(self.vehicle_id)
-                if Task["des_id"] in self.Scheduler.tasks_ongoing[Task["type"]]:
-                    self.Scheduler.tasks_ongoing[Task["type"]][Task["des_id"]].append(self.vehicle_id)
-                else:
-                    self.Scheduler.tasks_ongoing[Task["type"]][Task["des_id"]] = [self.vehicle_id]
-                self.finish_task = False
-            else:
+        invalid_tasks = set()
+        Task = task if task else self.Scheduler.dispatch_task(self, invalid_tasks)
+        while Task is not None:
+            try:
+                route = Task["edge"]  # todo: 从task中解析route（起）始点
+                end_edge = self._route_vehicle(route)
+                if end_edge:
+                    destination = {"id": 0,
+                                   "type": Task["type"],
+                                   "des_id": Task["des_id"],
+                                   "edge": end_edge,
+                                   "position": Task["position"],
+                                   "lane_pos": Task["lane_pos"]
+                                   }
+                    self._set_task_stop(destination)
+                    self.destination = destination
+                    # self.Scheduler.tasks_ongoing[Task["type"]].setdefault([Task["des_id"]], []).append(self.vehicle_id)
+                    if Task["des_id"] in self.Scheduler.tasks_ongoing[Task["type"]]:
+                        self.Scheduler.tasks_ongoing[Task["type"]][Task["des_id"]].append(self.vehicle_id)
+                    else:
+                        self.Scheduler.tasks_ongoing[Task["type"]][Task["des_id"]] = [self.vehicle_id]
+                    self.finish_task = False
+                    return True
                 logging.warning(f"""Fail to dispatch {self.vehicle_id} to {Task["type"]}_{Task["des_id"]}, try to apply task again""")
                 self.Scheduler.tasks_pending[Task["type"]].append(Task["des_id"])
-                self._apply_task(task = None, invalid_task = Task["des_id"])
-        except Exception as ex:
-            logging.warning(f"Fail to apply_task {Task} to {self.vehicle_id}: {ex}")
-            self.Scheduler.tasks_pending[Task["type"]].append(Task["des_id"])
+                invalid_tasks.add(Task["des_id"])
+                Task = self.Scheduler.dispatch_task(self, invalid_tasks)
+            except Exception as ex:
+                logging.warning(f"Fail to apply_task {Task} to {self.vehicle_id}: {ex}")
+                self.Scheduler.tasks_pending[Task["type"]].append(Task["des_id"])
+                return False
+        return False
 
 
     # 获取车辆距离路口的距离
     def get_vehicle_distance_to_junction(vehicle_id):
         return traci.vehicle.getDistanceToNextJunction(vehicle_id)
 
-    def _get_observation_(self):
-        destype_map = {"crane": 0, "gantry": 1, "other": 2} # todo
-        self.cur_Lane = self.sumo.vehicle.getLaneID(self.vehicle_id)
-        self.position = self.sumo.vehicle.getPosition(self.vehicle_id)
-        self.cur_edge = self.sumo.vehicle.getRoadID(self.vehicle_id)
-        next_junc = self.sumo.lane.getShape(self.cur_Lane)[-1] # todo
-        vehicle_in_bridge = set([vehicle for edge in self.Scheduler.bridge_edge
-                                 for vehicle in self.sumo.edge.getLastStepVehicleIDs(edge)]) # todo
-        # ========= priority_feature
-        cargo_precedence_feature = self.priority  # feature1 优先级
-
-        # ========= target_feature
-        target_waiting_feature = self.sumo.simulation.getTime() \
-                                 - self.Scheduler.destination[self.destination["type"]][self.destination["des_id"]]["serlog"][0] # feature2 目标点处于空闲状态的时间 # todo
-        vehicle_target_type = destype_map[self.destination["type"]]  # feature3 目的地类型  crane / gantry / other [0,1,2]
-
-        # ========= crane_feature
-        crane_related_vehicle_list = self.Scheduler.tasks_ongoing[self.destination["type"]][self.destination["des_id"]] # feature4 crane相关的vehlist # todo
-        crane_related_igv_in_bridge = len(set(crane_related_vehicle_list).intersection(vehicle_in_bridge)) \
-            if self.destination["type"] == "crane" else 0  # feature5 目标为当前crane在引桥上的车辆数 todo: 目的地是岸桥呢?
-
-        # ========= vehicle_feature
-        vehicle_current_road_length = self.sumo.lane.getLength(self.cur_Lane) # feature6 当前车辆所在车道的长度 # todo
-        vehicle_is_valid = 1 # feature8 当前车辆是否有效
-        vehicle_is_arrived_target = int(self._check_task_start(threshold = 10) ) # feature9 当前车辆是否到达目标点
-        vehicle_waiting_time = self.sumo.vehicle.getWaitingTime(self.vehicle_id) # feature11 当前车辆处于等待的时长
-        vehicle_current_speed = self.sumo.vehicle.getSpeed(self.vehicle_id) # feature12 当前车速
-        vehicle_distance_to_junction = self.sumo.simulation.getDistance2D(self.position[0], self.position[1],
-                                                                          next_junc[0], next_junc[1]) # feature13 当前车辆距离junc的dis
-        vehicle_is_in_junction = 1 if vehicle_distance_to_junction < 2 else 0 # feature10 当前车辆是否在junc
-
-        # ========= road/lane_feature
-        road_vehicle_num = self.sumo.edge.getLastStepVehicleNumber(self.cur_edge)  # feature7 当前edge车辆数 # todo
-        lane_vehicle_num = self.sumo.lane.getLastStepVehicleNumber(self.cur_Lane)  # feature14 当前lane车辆数 # todo
-        lane_limit_speed = self.sumo.lane.getMaxSpeed(self.cur_Lane) # feature15 当前lane的限速 # todo
-        road_length = vehicle_current_road_length # feature16 当前road的长度 = feature6
-
-        feature = [cargo_precedence_feature,
-                   target_waiting_feature,
-                   vehicle_target_type,
-                   crane_related_vehicle_list,
-                   crane_related_igv_in_bridge,
-                   vehicle_current_road_length,
-                   road_vehicle_num,
-                   vehicle_is_valid,
-                   vehicle_is_arrived_target,
-                   vehicle_is_in_junction,
-                   vehicle_waiting_time,
-                   vehicle_current_speed,
-                   vehicle_distance_to_junction,
-                   lane_vehicle_num,
-                   lane_limit_speed,
-                   road_length]
-        print(self.vehicle_id, feature)
-        return feature
-
     def _set_priority(self, priority):
         self.priority = priority
         logging.info(f"Set {self.vehicle_id} at priority {self.priority}")
 
 
 class Truck(Vehicle):
-    def __init__(self, env, vehicle_id, task):
-        super(Truck, self).__init__(env, vehicle_id,task)
+    def __init__(self, env, vehicle_id, task, depot=None):
+        super(Truck, self).__init__(env, vehicle_id, task, depot)
 
 
 class Crane(Vehicle):
@@ -0,0 +1,180 @@
+"""Per-step vehicle state table filled from TraCI variable subscriptions."""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import traci.constants as tc
+
+
+class VehicleStateTable:
+    """Snapshot of every running vehicle, refreshed once per simulation step.
+
+    Each departed vehicle is subscribed to the variables below, so a whole step is read back with a single
+    ``getAllSubscriptionResults`` round trip instead of one TraCI call per vehicle and variable. The simulation
+    domain is subscribed as well, so the vehicles that departed, arrived or started/ended a stop in the last step
+    are available as :attr:`departed`, :attr:`arrived`, :attr:`stop_starting` and :attr:`stop_ending`.
+
+    Rows are re-assigned on every :meth:`update`; ``ids[i]`` is the vehicle stored in row ``i`` of every array.
+    Road and lane ids are interned into integer indices (``road_idx`` / ``lane_idx``) that stay stable for the
+    lifetime of the table, ``road_ids[road_idx[i]]`` gives back the string id. When seeded with the ids of a
+    :class:`~sumo_rl.environment.network_index.NetworkIndex`, these indices coincide with the index numbering,
+    so static lane/edge arrays can be gathered directly with ``lane_idx`` / ``road_idx``.
+    """
+
+    VARIABLES = (
+        tc.VAR_ROAD_ID,
+        tc.VAR_LANE_ID,
+        tc.VAR_LANEPOSITION,
+        tc.VAR_POSITION,
+        tc.VAR_SPEED,
+        tc.VAR_WAITING_TIME,
+        tc.VAR_ALLOWED_SPEED,
+        tc.VAR_ACCUMULATED_WAITING_TIME,
+    )
+    SIMULATION_VARIABLES = (
+        tc.VAR_DEPARTED_VEHICLES_IDS,
+        tc.VAR_ARRIVED_VEHICLES_IDS,
+        tc.VAR_STOP_STARTING_VEHICLES_IDS,
+        tc.VAR_STOP_ENDING_VEHICLES_IDS,
+    )
+
+    def __init__(self, sumo, capacity: int = 256, road_ids: Sequence[str] = (), lane_ids: Sequence[str] = ()):
+        """Initialize an empty table.
+
+        Args:
+            sumo: The TraCI connection (or libsumo module) of the simulation.
+            capacity (int): Initial number of preallocated rows. Grows automatically.
+            road_ids (Sequence[str]): Edge ids interned first, e.g. ``NetworkIndex.edge_ids``.
+            lane_ids (Sequence[str]): Lane ids interned first, e.g. ``NetworkIndex.lane_ids``.
+        """
+        self.sumo = sumo
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.departed: Tuple[str, ...] = ()
+        self.arrived: Tuple[str, ...] = ()
+        self.stop_starting: Tuple[str, ...] = ()
+        self.stop_ending: Tuple[str, ...] = ()
+        self.road_ids: List[str] = list(road_ids)
+        self.lane_ids: List[str] = list(lane_ids)
+        self._road_index: Dict[str, int] = {road_id: i for i, road_id in enumerate(self.road_ids)}
+        self._lane_index: Dict[str, int] = {lane_id: i for i, lane_id in enumerate(self.lane_ids)}
+        self._allocate(capacity)
+        self.sumo.simulation.subscribe(self.SIMULATION_VARIABLES)
+
+    def _allocate(self, capacity: int):
+        self.capacity = capacity
+        self.position = np.zeros((capacity, 2), dtype=np.float64)
+        self.lane_position = np.zeros(capacity, dtype=np.float64)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        self.waiting_time = np.zeros(capacity, dtype=np.float64)
+        self.allowed_speed = np.zeros(capacity, dtype=np.float64)
+        self.accumulated_waiting_time = np.zeros(capacity, dtype=np.float64)
+        self.road_idx = np.zeros(capacity, dtype=np.int32)
+        self.lane_idx = np.zeros(capacity, dtype=np.int32)
+
+    def _intern(self, value: str, index: Dict[str, int], names: List[str]) -> int:
+        idx = index.get(value)
+        if idx is None:
+            idx = len(names)
+            index[value] = idx
+            names.append(value)
+        return idx
+
+    def subscribe(self, vehicle_ids):
+        """Subscribe vehicles to the table variables. Already subscribed vehicles are simply refreshed."""
+        for vehicle_id in vehicle_ids:
+            self.sumo.vehicle.subscribe(vehicle_id, self.VARIABLES)
+
+    def update(self):
+        """Refresh the table from the subscription results of the last simulation step."""
+        simulation = self.sumo.simulation.getSubscriptionResults()
+        self.departed = simulation[tc.VAR_DEPARTED_VEHICLES_IDS]
+        self.arrived = simulation[tc.VAR_ARRIVED_VEHICLES_IDS]
+        self.stop_starting = simulation[tc.VAR_STOP_STARTING_VEHICLES_IDS]
+        self.stop_ending = simulation[tc.VAR_STOP_ENDING_VEHICLES_IDS]
+        self.subscribe(self.departed)
+        results = self.sumo.vehicle.getAllSubscriptionResults()
+
+        n = len(results)
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+
+        self.ids = list(results.keys())
+        self.rows = {vehicle_id: row for row, vehicle_id in enumerate(self.ids)}
+        for row, values in enumerate(results.values()):
+            self.position[row] = values[tc.VAR_POSITION]
+            self.lane_position[row] = values[tc.VAR_LANEPOSITION]
+            self.speed[row] = values[tc.VAR_SPEED]
+            self.waiting_time[row] = values[tc.VAR_WAITING_TIME]
+            self.allowed_speed[row] = values[tc.VAR_ALLOWED_SPEED]
+            self.accumulated_waiting_time[row] = values[tc.VAR_ACCUMULATED_WAITING_TIME]
+            self.road_idx[row] = self._intern(values[tc.VAR_ROAD_ID], self._road_index, self.road_ids)
+            self.lane_idx[row] = self._intern(values[tc.VAR_LANE_ID], self._lane_index, self.lane_ids)
+
+    def clear(self):
+        """Forget every vehicle, e.g. after the simulation was restarted."""
+        self.ids = []
+        self.rows = {}
+        self.departed = self.arrived = self.stop_starting = self.stop_ending = ()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, vehicle_id) -> bool:
+        return vehicle_id in self.rows
+
+    def road_index(self, road_id: str) -> int:
+        """Return the interned index of an edge id, interning it if it was never seen."""
+        return self._intern(road_id, self._road_index, self.road_ids)
+
+    def lane_index(self, lane_id: str) -> int:
+        """Return the interned index of a lane id, interning it if it was never seen."""
+        return self._intern(lane_id, self._lane_index, self.lane_ids)
+
+    def row(self, vehicle_id: str) -> Optional[int]:
+        """Return the row of a vehicle, or None if it is not running in the current step."""
+        return self.rows.get(vehicle_id)
+
+    def road_id(self, vehicle_id: str) -> str:
+        """Return the current edge of a vehicle ("" if it is not running)."""
+        row = self.rows.get(vehicle_id)
+        return "" if row is None else self.road_ids[self.road_idx[row]]
+
+    def lane_id(self, vehicle_id: str) -> str:
+        """Return the current lane of a vehicle ("" if it is not running)."""
+        row = self.rows.get(vehicle_id)
+        return "" if row is None else self.lane_ids[self.lane_idx[row]]
+
+    def get_position(self, vehicle_id: str) -> Tuple[float, float]:
+        row = self.rows[vehicle_id]
+        return float(self.position[row, 0]), float(self.position[row, 1])
+
+    def get_lane_position(self, vehicle_id: str) -> float:
+        return float(self.lane_position[self.rows[vehicle_id]])
+
+    def get_speed(self, vehicle_id: str) -> float:
+        return float(self.speed[self.rows[vehicle_id]])
+
+    def get_waiting_time(self, vehicle_id: str) -> float:
+        return float(self.waiting_time[self.rows[vehicle_id]])
+
+    def within(self, x: float, y: float, radius: float) -> List[str]:
+        """Return the running vehicles within ``radius`` of (x, y), nearest first."""
+        n = len(self.ids)
+        dist2 = np.sum((self.position[:n] - (x, y)) ** 2, axis=1)
+        inside = np.flatnonzero(dist2 <= radius**2)
+        return [self.ids[i] for i in inside[np.argsort(dist2[inside], kind="stable")]]
+
+    @property
+    def speeds(self) -> np.ndarray:
+        """Speeds of the running vehicles (view, valid until the next update)."""
+        return self.speed[: len(self.ids)]
+
+    @property
+    def allowed_speeds(self) -> np.ndarray:
+        """Speed limits (lane limit and vehicle max speed) of the running vehicles (view, valid until the next update)."""
+        return self.allowed_speed[: len(self.ids)]
+
+    @property
+    def waiting_times(self) -> np.ndarray:
+        """Waiting times of the running vehicles (view, valid until the next update)."""
+        return self.waiting_time[: len(self.ids)]
@@ -0,0 +1,83 @@
+"""Incremental per-lane accumulated waiting time."""
+from typing import Dict, List
+
+import numpy as np
+
+
+class _VehicleWaiting:
+    __slots__ = ("lane", "base", "lanes")
+
+    def __init__(self, lane: int):
+        self.lane = lane
+        self.base = 0.0  # waiting time attributed to the other lanes when the vehicle entered ``lane``
+        self.lanes: Dict[int, float] = {}  # lane index -> waiting time attributed to that lane
+
+
+class WaitingTimeTracker:
+    """Splits the accumulated waiting time of every vehicle over the lanes it waited on.
+
+    The waiting time attributed to the current lane of a vehicle is its accumulated waiting time minus what was
+    attributed to the lanes it visited before, as SUMO only reports the total. The split is updated once per
+    simulation step from the :class:`~sumo_rl.environment.vehicle_state.VehicleStateTable` subscription data, in
+    time linear in the number of running vehicles, and vehicles are forgotten as soon as they arrive.
+
+    :meth:`lane_totals` sums the attributed waiting time of the vehicles currently on each lane; it is computed at
+    most once per step and shared by the rewards and the info metrics.
+    """
+
+    def __init__(self, vehicle_state):
+        """Initialize an empty tracker reading ``vehicle_state``."""
+        self.state = vehicle_state
+        self._vehicles: Dict[str, _VehicleWaiting] = {}
+        self.value = np.zeros(0, dtype=np.float64)  # waiting time on the current lane, by vehicle table row
+        self._lane_totals = None
+
+    def __len__(self) -> int:
+        return len(self._vehicles)
+
+    def update(self):
+        """Attribute the waiting time of the last step. Call after every ``VehicleStateTable.update``."""
+        state = self.state
+        for vehicle_id in state.arrived:
+            self._vehicles.pop(vehicle_id, None)
+
+        n = len(state)
+        if len(self.value) < state.capacity:
+            self.value = np.zeros(state.capacity, dtype=np.float64)
+        lane_idx = state.lane_idx[:n].tolist()
+        accumulated = state.accumulated_waiting_time[:n].tolist()
+        for row, vehicle_id in enumerate(state.ids):
+            lane = lane_idx[row]
+            vehicle = self._vehicles.get(vehicle_id)
+            if vehicle is None:
+                vehicle = self._vehicles[vehicle_id] = _VehicleWaiting(lane)
+            elif vehicle.lane != lane:
+                vehicle.base = sum(vehicle.lanes.values()) - vehicle.lanes.get(lane, 0.0)
+                vehicle.lane = lane
+            value = accumulated[row] - vehicle.base
+            vehicle.lanes[lane] = value
+            self.value[row] = value
+        self._lane_totals = None
+
+    def lane_totals(self) -> np.ndarray:
+        """Return the waiting time of the vehicles currently on each lane, indexed like ``VehicleStateTable.lane_ids``."""
+        if self._lane_totals is None:
+            n = len(self.state)
+            self._lane_totals = np.bincount(
+                self.state.lane_idx[:n], weights=self.value[:n], minlength=len(self.state.lane_ids)
+            )
+        return self._lane_totals
+
+    def lane_waiting_time(self, lane_idx: np.ndarray) -> List[float]:
+        """Return the waiting time of the vehicles currently on the given lanes."""
+        totals = self.lane_totals()
+        lane_idx = np.asarray(lane_idx, dtype=np.int64)
+        result = np.zeros(len(lane_idx), dtype=np.float64)
+        known = lane_idx < len(totals)
+        result[known] = totals[lane_idx[known]]
+        return result.tolist()
+
+    def clear(self):
+        """Forget every vehicle, e.g. after the simulation was restarted."""
+        self._vehicles = {}
+        self._lane_totals = None
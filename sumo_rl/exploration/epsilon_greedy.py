@@ -2,6 +2,18 @@
 import numpy as np
 
 
+def rng_state() -> list:
+    """Return the state of the global NumPy generator drawing the exploration, as a JSON-serializable list."""
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return [name, keys.tolist(), int(pos), int(has_gauss), float(cached_gaussian)]
+
+
+def set_rng_state(state: list):
+    """Restore the global NumPy generator from a state returned by :func:`rng_state`."""
+    name, keys, pos, has_gauss, cached_gaussian = state
+    np.random.set_state((name, np.asarray(keys, dtype=np.uint32), pos, has_gauss, cached_gaussian))
+
+
 class EpsilonGreedy:
     """Epsilon Greedy Exploration Strategy."""
 
@@ -23,6 +35,48 @@ class EpsilonGreedy:
         # print(self.epsilon)
         return action
 
+    def choose_batch(self, q_values, n_actions):
+        """Choose the actions of several agents at once, with one exploration draw per agent.
+
+        Args:
+            q_values (np.ndarray): Action values of shape (n_agents, max_actions), invalid actions set to -inf.
+            n_actions (np.ndarray): Number of actions of every agent, random actions are drawn below it.
+
+        Returns:
+            np.ndarray: int64 array with the action of every agent.
+        """
+        n_agents = len(q_values)
+        actions = np.argmax(q_values, axis=1)
+        explore = np.random.rand(n_agents) < self.epsilon
+        if explore.any():
+            actions[explore] = (np.random.rand(int(explore.sum())) * n_actions[explore]).astype(np.int64)
+
+        self.epsilon = max(self.epsilon * self.decay, self.min_epsilon)
+        return actions
+
     def reset(self):
         """Reset epsilon to initial value."""
         self.epsilon = self.initial_epsilon
+
+    def state_dict(self):
+        """Return the exploration state, e.g. to checkpoint it with a Q-table.
+
+        It includes the state of the global NumPy generator (``np.random``) the exploration draws come from, so a
+        resumed run makes the same draws as an uninterrupted one.
+        """
+        return {
+            "initial_epsilon": self.initial_epsilon,
+            "epsilon": self.epsilon,
+            "min_epsilon": self.min_epsilon,
+            "decay": self.decay,
+            "rng": rng_state(),
+        }
+
+    def load_state_dict(self, state):
+        """Restore the exploration state returned by :meth:`state_dict`, and the generator state if it has one."""
+        self.initial_epsilon = state["initial_epsilon"]
+        self.epsilon = state["epsilon"]
+        self.min_epsilon = state["min_epsilon"]
+        self.decay = state["decay"]
+        if "rng" in state:  # missing in checkpoints written before it was saved
+            set_rng_state(state["rng"])
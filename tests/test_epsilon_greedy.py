@@ -0,0 +1,42 @@
+import importlib.util
+import json
+import os
+
+import numpy as np
+
+
+# loaded from its file: importing the sumo_rl package needs SUMO, the exploration does not
+_spec = importlib.util.spec_from_file_location(
+    "epsilon_greedy", os.path.join(os.path.dirname(__file__), "..", "sumo_rl", "exploration", "epsilon_greedy.py")
+)
+epsilon_greedy = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(epsilon_greedy)
+EpsilonGreedy = epsilon_greedy.EpsilonGreedy
+
+
+def draws(exploration, n=50):
+    q_values = np.zeros((4, 3))
+    return np.stack([exploration.choose_batch(q_values, np.full(4, 3)) for _ in range(n)])
+
+
+def test_state_dict_restores_the_exploration_draws():
+    np.random.seed(7)
+    exploration = EpsilonGreedy(initial_epsilon=0.5, min_epsilon=0.1, decay=0.99)
+    draws(exploration)
+    state = json.loads(json.dumps(exploration.state_dict()))  # as stored in the checkpoint metadata
+    expected = draws(exploration)
+
+    np.random.seed(7)  # a resumed job seeds again before restoring
+    resumed = EpsilonGreedy()
+    resumed.load_state_dict(state)
+    assert resumed.epsilon == state["epsilon"]
+    np.testing.assert_array_equal(draws(resumed), expected)
+
+
+def test_load_state_dict_without_rng_keeps_the_generator():
+    np.random.seed(3)
+    state = EpsilonGreedy(initial_epsilon=0.2).state_dict()
+    del state["rng"]
+    before = np.random.get_state()[1].copy()
+    EpsilonGreedy().load_state_dict(state)
+    np.testing.assert_array_equal(np.random.get_state()[1], before)
@@ -0,0 +1,70 @@
+import importlib.util
+import os
+import random
+from collections import Counter
+
+import pytest
+
+
+# loaded from its file: importing the sumo_rl package needs SUMO, the task pool does not
+_spec = importlib.util.spec_from_file_location(
+    "task_pool", os.path.join(os.path.dirname(__file__), "..", "sumo_rl", "environment", "task_pool.py")
+)
+task_pool = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(task_pool)
+TaskPool = task_pool.TaskPool
+
+
+def assert_consistent(pool):
+    positions = {}
+    for i, des_id in enumerate(pool._items):
+        positions.setdefault(des_id, set()).add(i)
+    assert pool._positions == positions
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_pop_random_skips_excluded_tasks(seed):
+    random.seed(seed)
+    tasks = [random.randrange(8) for _ in range(30)]
+    pool = TaskPool(tasks)
+    exclude = set(random.sample(range(8), 3))
+    remaining = Counter(tasks)
+    while True:
+        task = pool.pop_random(exclude=exclude)
+        if task is None:
+            break
+        assert task not in exclude
+        remaining[task] -= 1
+        assert_consistent(pool)
+    assert sorted(pool) == sorted(des_id for des_id, count in remaining.items() for _ in range(count))
+    assert set(pool) <= exclude
+
+
+def test_pop_random_draws_every_valid_position_uniformly():
+    random.seed(0)
+    counts = Counter()
+    for _ in range(6000):
+        # excluded tasks at the start, in the middle and at the end of the item list
+        pool = TaskPool(["x", "a", "x", "b", "y", "c", "y"])
+        counts[pool.pop_random(exclude={"x", "y"})] += 1
+    assert set(counts) == {"a", "b", "c"}
+    assert all(1700 < count < 2300 for count in counts.values())
+
+
+def test_pop_random_returns_none_when_everything_is_excluded():
+    pool = TaskPool([1, 1, 2])
+    assert pool.pop_random(exclude={1, 2}) is None
+    assert len(pool) == 3
+    assert TaskPool().pop_random() is None
+
+
+def test_pop_random_many():
+    random.seed(1)
+    tasks = [1, 2, 2, 3, 3, 3, 4]
+    pool = TaskPool(tasks)
+    popped = pool.pop_random_many(4)
+    assert len(popped) == 4
+    assert_consistent(pool)
+    assert sorted(popped + list(pool)) == tasks
+    assert sorted(pool.pop_random_many(10) + popped) == tasks
+    assert len(pool) == 0